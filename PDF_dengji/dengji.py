@@ -4,6 +4,14 @@ import re
 import os
 import shutil
 import sys
+import io
+import traceback
+import contextlib
+import time
+import hashlib
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 try:
     import pdfplumber
@@ -200,7 +208,6 @@ def extract_pdf_tables(pdf_path):
     
     except Exception as e:
         print(f"提取PDF表格时出错: {str(e)}")
-        import traceback
         traceback.print_exc()
         return None
 
@@ -299,10 +306,10 @@ def get_cell_style_from_template(rb, sheet_idx, ref_row, col_idx):
         return create_default_style()
 
 def write_json_to_excel(excel_path, json_data, row=3):
-    """将JSON数据写入Excel模板，从指定行开始写入（row=3对应Excel第4行）"""
+    """将JSON数据写入Excel模板，从指定行开始写入（row=3对应Excel第4行），返回是否成功"""
     if not HAS_XL_LIBS:
         print("错误: 缺少必要的库，请安装: pip install xlrd xlwt xlutils")
-        return
+        return False
     
     try:
         # 使用xlrd读取文件（保留格式信息）
@@ -374,43 +381,54 @@ def write_json_to_excel(excel_path, json_data, row=3):
         
         wb.save(output_path)
         print(f"数据已写入: {output_path}")
+        return True
         
     except Exception as e:
         print(f"写入Excel时出错: {str(e)}")
-        import traceback
         traceback.print_exc()
+        return False
 
-def main(pdf_path):
-    """主函数：提取PDF表格数据"""
+def clean_tables_data(tables_data):
+    """去掉所有单元格内容中的空格（直接修改tables_data），返回tables_data"""
+    for table_info in tables_data:
+        if "rows" in table_info:
+            for row in table_info["rows"]:
+                for i in range(len(row)):
+                    if isinstance(row[i], str):
+                        row[i] = row[i].replace(" ", "")
+    return tables_data
+
+def main(pdf_path, json_path="提取的表格数据.json"):
+    """主函数：提取PDF表格数据，返回提取的表格数据；json_path不为None时同时保存到该文件"""
     # 按PDF表格结构提取数据
     print("\n开始提取PDF表格数据...")
     tables_data = extract_pdf_tables(pdf_path)
     if tables_data:
         # 去掉所有单元格内容中的空格
-        for table_info in tables_data:
-            if "rows" in table_info:
-                for row in table_info["rows"]:
-                    for i in range(len(row)):
-                        if isinstance(row[i], str):
-                            row[i] = row[i].replace(" ", "")
+        clean_tables_data(tables_data)
         
         # 保存到JSON文件
-        with open("提取的表格数据.json", "w", encoding="utf-8") as f:
-            json.dump(tables_data, f, ensure_ascii=False, indent=2)
-        print("已保存提取的表格数据到: 提取的表格数据.json")
+        if json_path:
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(tables_data, f, ensure_ascii=False, indent=2)
+            print(f"已保存提取的表格数据到: {json_path}")
     else:
         print("未能提取到表格数据")
+    return tables_data
 
 def parse_tables_json(json_path="提取的表格数据.json"):
     """读取提取的表格数据.json，解析为七个部分的数据"""
-    from datetime import datetime
-    
     try:
         with open(json_path, "r", encoding="utf-8") as f:
             tables_data = json.load(f)
     except Exception as e:
         print(f"读取表格数据JSON文件失败: {str(e)}")
         return None
+    return parse_tables(tables_data)
+
+def parse_tables(tables_data):
+    """将提取的表格数据（extract_pdf_tables的结果）解析为七个部分的数据，不修改tables_data"""
+    from datetime import datetime
     
     # 将所有表格的行合并成一个列表，便于查找
     all_rows = []
@@ -1108,6 +1126,358 @@ def parse_tables_json(json_path="提取的表格数据.json"):
     
     return result
 
+def get_worker_count(value, file_count):
+    """进程数：配置为空或0时使用CPU核数，1为逐个处理；不超过PDF文件数"""
+    try:
+        workers = int(value) if str(value).strip() else 0
+    except ValueError:
+        print(f"⚠ 警告: workers 配置不是有效的整数: {value}，使用CPU核数")
+        workers = 0
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, file_count))
+
+# 提取器版本：修改 extract_pdf_tables 或 clean_tables_data 的提取结果后加1，旧版本的缓存不再使用
+EXTRACTOR_VERSION = 1
+CACHE_STATS_FILE = "stats.jsonl"
+
+def extractor_version():
+    """提取缓存的版本目录名（提取器版本和pdfplumber版本，任一变化都使用新的缓存）"""
+    plumber_version = getattr(pdfplumber, "__version__", "unknown") if HAS_PDFPLUMBER else "none"
+    return f"v{EXTRACTOR_VERSION}-pdfplumber{plumber_version}"
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """PDF文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """
+    PDF表格提取结果缓存：按PDF内容的SHA-256和提取器版本保存 extract_pdf_tables 的结果（已去掉空格）
+    
+    只修改了解析（parse_tables）或写入Excel的逻辑后重新处理同一批PDF时，不再用pdfplumber识别表格；
+    PDF改名或移动到其他文件夹后仍然命中。文件结构：<缓存文件夹>/<版本>/<哈希前2位>/<哈希>.json
+    """
+    
+    def __init__(self, folder, version=None):
+        self.folder = folder
+        self.version = version or extractor_version()
+    
+    def path_for(self, digest):
+        return os.path.join(self.folder, self.version, digest[:2], f"{digest}.json")
+    
+    def get(self, digest):
+        """返回缓存的表格数据，没有缓存或缓存文件损坏时返回None；命中时更新文件时间（清理时按最近使用时间判断）"""
+        path = self.path_for(digest)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                tables_data = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return tables_data
+    
+    def put(self, digest, tables_data):
+        path = self.path_for(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return _write_json_file(path, tables_data)
+
+def record_cache_stats(cache_folder, hits, total):
+    """记录本次运行的缓存命中情况（追加到 <缓存文件夹>/stats.jsonl）"""
+    try:
+        os.makedirs(cache_folder, exist_ok=True)
+        with open(os.path.join(cache_folder, CACHE_STATS_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "version": extractor_version(),
+                                "hits": hits, "total": total}, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠ 警告: 记录缓存统计失败: {str(e)}")
+
+def _cache_entries(cache_folder):
+    """缓存中的所有条目，返回 {版本: [(路径, 大小, 修改时间)]}"""
+    entries = {}
+    if not os.path.isdir(cache_folder):
+        return entries
+    for version in sorted(os.listdir(cache_folder)):
+        version_dir = os.path.join(cache_folder, version)
+        if not os.path.isdir(version_dir):
+            continue
+        items = entries.setdefault(version, [])
+        for root, _, files in os.walk(version_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                items.append((path, stat.st_size, stat.st_mtime))
+    return entries
+
+def cache_report(cache_folder, recent_runs=10):
+    """输出缓存报告：各版本的条目数和大小，最近几次运行和累计的命中率"""
+    current = extractor_version()
+    print(f"提取缓存: {cache_folder}（当前版本 {current}）")
+    print("-" * 60)
+    entries = _cache_entries(cache_folder)
+    if not entries:
+        print("缓存为空")
+    for version, items in entries.items():
+        size = sum(item[1] for item in items) / 1024 / 1024
+        mark = "（当前）" if version == current else "（过期，可清理）"
+        print(f"  {version}{mark}: {len(items)} 个条目，{size:.1f} MB")
+    
+    runs = []
+    stats_path = os.path.join(cache_folder, CACHE_STATS_FILE)
+    if os.path.exists(stats_path):
+        with open(stats_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    continue
+    if runs:
+        print("\n最近的运行:")
+        for run in runs[-recent_runs:]:
+            rate = run["hits"] / run["total"] * 100 if run["total"] else 0
+            print(f"  {run['time']}  命中 {run['hits']}/{run['total']}（{rate:.0f}%）")
+        hits = sum(run["hits"] for run in runs)
+        total = sum(run["total"] for run in runs)
+        print(f"累计 {len(runs)} 次运行，命中 {hits}/{total}（{hits / total * 100 if total else 0:.0f}%）")
+
+def prune_cache(cache_folder, max_age_days=None):
+    """
+    清理缓存：删除其他版本（提取器或pdfplumber已更新）的条目和写了一半的临时文件，
+    max_age_days 不为空时同时删除超过该天数未使用的条目；返回 (删除的条目数, 释放的字节数)
+    """
+    current = extractor_version()
+    cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+    removed = 0
+    freed = 0
+    for version, items in _cache_entries(cache_folder).items():
+        for path, size, mtime in items:
+            stale = version != current or path.endswith(".tmp") or (cutoff is not None and mtime < cutoff)
+            if stale:
+                os.remove(path)
+                removed += 1
+                freed += size
+        if version != current:
+            shutil.rmtree(os.path.join(cache_folder, version), ignore_errors=True)
+    # 删除清理后留下的空文件夹
+    for root, dirs, files in os.walk(os.path.join(cache_folder, current), topdown=False):
+        if not dirs and not files and root != os.path.join(cache_folder, current):
+            os.rmdir(root)
+    return removed, freed
+
+def process_pdf(pdf_file_path, cache_folder=None):
+    """
+    第一步和第二步：提取PDF表格数据并解析（在内存中传递，不写文件）
+    
+    cache_folder 不为空时先按PDF内容查找提取缓存，命中时不再用pdfplumber识别表格
+    返回 (提取的表格数据, 解析后的数据, 是否命中缓存)
+    """
+    # 第一步：处理PDF文件，提取表格数据
+    print("第一步：处理PDF文件，提取表格数据...")
+    cache = ExtractionCache(cache_folder) if cache_folder else None
+    tables_data = None
+    if cache is not None:
+        digest = file_sha256(pdf_file_path)
+        tables_data = cache.get(digest)
+        if tables_data is not None:
+            print(f"使用提取缓存（{digest[:12]}），跳过PDF表格识别")
+    cache_hit = tables_data is not None
+    if not cache_hit:
+        tables_data = main(pdf_file_path, json_path=None)
+        if cache is not None and tables_data:
+            try:
+                cache.put(digest, tables_data)
+            except OSError as e:
+                print(f"⚠ 警告: 保存提取缓存失败: {str(e)}")
+    if not tables_data:
+        return tables_data, None, cache_hit
+    
+    # 第二步：解析提取的表格数据
+    print("\n第二步：解析表格数据，生成解析后的数据...")
+    return tables_data, parse_tables(tables_data), cache_hit
+
+def _process_pdf_worker(pdf_file_path, cache_folder=None):
+    """
+    工作进程中处理一个PDF，输出先记录下来，由主进程按文件顺序打印
+    
+    返回 (提取的表格数据, 解析后的数据, 是否命中缓存, 输出, 错误)
+    """
+    output = io.StringIO()
+    tables_data = parsed_data = None
+    cache_hit = False
+    error = None
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            tables_data, parsed_data, cache_hit = process_pdf(pdf_file_path, cache_folder)
+        except Exception as e:
+            error = f"处理出错: {str(e)}"
+            traceback.print_exc()
+    return tables_data, parsed_data, cache_hit, output.getvalue(), error
+
+def _write_json_file(path, data):
+    """先写入同一文件夹中的临时文件再替换，其他程序不会读到写了一半的文件"""
+    fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".json.tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+class JsonArchive:
+    """
+    在后台线程中保存JSON存档（提取的表格数据、解析后的数据），不阻塞后面的处理
+    
+    每个PDF的存档文件名包含PDF文件名，不使用固定的文件名；
+    保存的数据在提交后不能再修改（解析和写入Excel只读取数据）
+    """
+    
+    def __init__(self, folder):
+        self.folder = folder
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = []
+    
+    def save(self, pdf_name, kind, data):
+        """提交保存 <PDF文件名>_<kind>.json，返回文件路径"""
+        path = os.path.join(self.folder, f"{pdf_name}_{kind}.json")
+        self._futures.append((path, self._executor.submit(_write_json_file, path, data)))
+        return path
+    
+    def close(self):
+        """等待所有存档写完，返回 (保存的文件数, 失败列表 [(路径, 原因)])"""
+        self._executor.shutdown(wait=True)
+        errors = []
+        for path, future in self._futures:
+            error = future.exception()
+            if error is not None:
+                errors.append((path, str(error)))
+        return len(self._futures) - len(errors), errors
+
+def finish_pdf(pdf_file, input_folder, parsed_data, output_folder, template_path, processed_folder):
+    """第三步：写入Excel模板，成功后把PDF移动到已处理文件夹，返回失败原因（成功时返回None）"""
+    pdf_file_path = os.path.join(input_folder, pdf_file)
+    pdf_name = os.path.splitext(pdf_file)[0]
+    
+    # 第三步：将解析后的数据写入Excel模板
+    if template_path:
+        print("\n第三步：将解析后的数据写入Excel模板...")
+        
+        # 获取员工姓名
+        employee_name = parsed_data.get("人员基本信息", {}).get("姓名", "")
+        if not employee_name:
+            employee_name = parsed_data.get("职称申报基础信息", {}).get("姓名", "")
+        
+        # 如果还是没有姓名，使用PDF文件名
+        if not employee_name:
+            employee_name = pdf_name
+        
+        # 以员工姓名重命名文件，保存到输出文件夹
+        output_excel_path = os.path.join(output_folder, f"{employee_name}.xls")
+        
+        # 如果文件已存在，添加序号（主进程按文件顺序依次写入，序号与逐个处理时相同）
+        counter = 1
+        while os.path.exists(output_excel_path):
+            output_excel_path = os.path.join(output_folder, f"{employee_name}_{counter}.xls")
+            counter += 1
+        
+        # 复制模板
+        shutil.copy2(template_path, output_excel_path)
+        print(f"已复制模板到: {output_excel_path}")
+        
+        # 写入JSON数据到第四行
+        if not write_json_to_excel(output_excel_path, parsed_data, row=3):
+            return "写入Excel失败"
+        print(f"✓ 已将解析后的数据写入Excel第4行（文件名: {os.path.basename(output_excel_path)}）")
+    
+    # 处理成功后，将PDF文件移动到已处理文件夹
+    if processed_folder:
+        try:
+            processed_pdf_path = os.path.join(processed_folder, pdf_file)
+            # 如果目标文件已存在，添加时间戳
+            if os.path.exists(processed_pdf_path):
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                name, ext = os.path.splitext(pdf_file)
+                processed_pdf_path = os.path.join(processed_folder, f"{name}_{timestamp}{ext}")
+            
+            shutil.move(pdf_file_path, processed_pdf_path)
+            print(f"✓ 已将PDF文件移动到已处理文件夹: {os.path.basename(processed_pdf_path)}")
+        except Exception as e:
+            print(f"⚠ 警告: 移动PDF文件到已处理文件夹失败: {str(e)}")
+    return None
+
+def run_batch(pdf_files, input_folder, output_folder, template_path, processed_folder, workers=1, archive=None,
+              cache_folder=None):
+    """
+    处理所有PDF文件，返回 (失败列表 [(文件名, 原因)], 命中提取缓存的文件数)
+    
+    workers > 1 时在进程池中并行提取和解析（pdfplumber识别表格只能使用一个CPU核）；
+    写入Excel和移动PDF仍由主进程按文件顺序完成，输出文件名和已处理文件夹中的文件名与逐个处理时相同；
+    archive 为 JsonArchive 时在后台保存每个PDF的JSON存档；cache_folder 为提取缓存文件夹（为空时不使用缓存）
+    """
+    failures = []
+    cache_hits = 0
+    
+    def handle(pdf_file, tables_data, parsed_data, cache_hit, error):
+        nonlocal cache_hits
+        cache_hits += 1 if cache_hit else 0
+        pdf_name = os.path.splitext(pdf_file)[0]
+        if archive is not None and tables_data:
+            path = archive.save(pdf_name, "提取的表格数据", tables_data)
+            print(f"提取的表格数据保存到: {path}")
+        if error:
+            failures.append((pdf_file, error))
+        elif not parsed_data:
+            print("✗ 未能提取或解析表格数据")
+            print("⚠ PDF文件保留在原文件夹，可重新处理")
+            failures.append((pdf_file, "未能提取或解析表格数据"))
+        else:
+            if archive is not None:
+                path = archive.save(pdf_name, "解析后的数据", parsed_data)
+                print(f"✓ 解析后的数据保存到: {path}")
+            try:
+                reason = finish_pdf(pdf_file, input_folder, parsed_data, output_folder,
+                                    template_path, processed_folder)
+            except Exception as e:
+                traceback.print_exc()
+                reason = f"写入Excel出错: {str(e)}"
+            if reason:
+                failures.append((pdf_file, reason))
+    
+    if workers <= 1:
+        for pdf_file in pdf_files:
+            print(f"\n正在处理: {pdf_file}")
+            print("-" * 60)
+            try:
+                tables_data, parsed_data, cache_hit = process_pdf(os.path.join(input_folder, pdf_file), cache_folder)
+                error = None
+            except Exception as e:
+                traceback.print_exc()
+                tables_data, parsed_data, cache_hit, error = None, None, False, f"处理出错: {str(e)}"
+            handle(pdf_file, tables_data, parsed_data, cache_hit, error)
+        return failures, cache_hits
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_process_pdf_worker, os.path.join(input_folder, pdf_file), cache_folder)
+                   for pdf_file in pdf_files]
+        # 按提交顺序取结果，后面的文件在工作进程中继续处理
+        for pdf_file, future in zip(pdf_files, futures):
+            print(f"\n正在处理: {pdf_file}")
+            print("-" * 60)
+            try:
+                tables_data, parsed_data, cache_hit, output, error = future.result()
+                print(output, end="")
+            except Exception as e:
+                # 工作进程异常退出（内存不足等）
+                tables_data, parsed_data, cache_hit, error = None, None, False, f"工作进程出错: {str(e)}"
+                print(f"✗ {error}")
+            handle(pdf_file, tables_data, parsed_data, cache_hit, error)
+    return failures, cache_hits
+
 def load_config_from_txt(config_path):
     """从TXT配置文件读取配置，格式：key=value，支持#注释和空行"""
     config = {}
@@ -1136,6 +1506,9 @@ def load_config_from_txt(config_path):
 
 # 运行示例（从配置文件读取路径）
 if __name__ == "__main__":
+    # 打包后的exe使用进程池时需要
+    multiprocessing.freeze_support()
+    
     # 获取exe或脚本所在目录
     if getattr(sys, 'frozen', False):
         # 如果是打包后的exe
@@ -1154,6 +1527,9 @@ if __name__ == "__main__":
         print('template_path=Excel模板文件路径（可选，不填则跳过Excel写入）')
         print('processed_folder=已处理PDF文件夹路径（可选，不填则不移动PDF文件）')
         print('json_output_folder=JSON输出文件夹路径（可选，不填则保存到exe同级目录）')
+        print('workers=并行处理的进程数（可选，不填或0为CPU核数，1为逐个处理）')
+        print('save_json=是否保存JSON存档（可选，不填为保存，填 否 则只在内存中处理）')
+        print('cache_folder=提取缓存文件夹（可选，不填则使用exe同级目录下的 提取缓存 文件夹，填 否 不使用缓存）')
         print('')
         print('说明：')
         print('  - 每行一个配置项，格式为 key=value')
@@ -1167,11 +1543,29 @@ if __name__ == "__main__":
             print("✗ 错误: 读取配置文件失败")
             exit(1)
         
+        # 提取缓存：dengji.exe --cache-report 查看命中率，--cache-prune [--days=90] 清理过期条目
+        cache_folder = config.get("cache_folder", "").strip()
+        if cache_folder.lower() in ("否", "no", "false", "0", "off"):
+            cache_folder = None
+        elif not cache_folder:
+            cache_folder = os.path.join(base_dir, "提取缓存")
+        if "--cache-report" in sys.argv or "--cache-prune" in sys.argv:
+            if not cache_folder:
+                print("✗ 配置文件中已关闭提取缓存 (cache_folder=否)")
+                exit(1)
+            if "--cache-prune" in sys.argv:
+                days = next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--days=")), None)
+                removed, freed = prune_cache(cache_folder, float(days) if days else None)
+                print(f"✓ 已清理 {removed} 个缓存条目，释放 {freed / 1024 / 1024:.1f} MB")
+            cache_report(cache_folder)
+            exit(0)
+        
         input_folder = config.get("input_folder", "").strip()
         output_folder = config.get("output_folder", "").strip()
         template_path = config.get("template_path", "").strip()
         processed_folder = config.get("processed_folder", "").strip()
         json_output_folder = config.get("json_output_folder", "").strip()
+        save_json = config.get("save_json", "").strip().lower() not in ("否", "no", "false", "0", "off")
         
         if not input_folder or not output_folder:
             print("✗ 错误: 配置文件中缺少必要的路径配置")
@@ -1187,7 +1581,10 @@ if __name__ == "__main__":
             print(f"✓ 已处理文件夹: {processed_folder}")
         
         # 确定JSON输出文件夹路径
-        if json_output_folder:
+        if not save_json:
+            json_output_dir = None
+            print("✓ 不保存JSON存档 (save_json=否)")
+        elif json_output_folder:
             # 使用配置的JSON输出文件夹
             json_output_dir = json_output_folder
             os.makedirs(json_output_dir, exist_ok=True)
@@ -1213,105 +1610,44 @@ if __name__ == "__main__":
         else:
             print(f"✓ 模板文件路径: {template_path}")
         
-        # 获取输入文件夹中的所有PDF文件
-        pdf_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.pdf')]
+        # 获取输入文件夹中的所有PDF文件（按文件名排序，保证输出文件名的序号每次都相同）
+        pdf_files = sorted(f for f in os.listdir(input_folder) if f.lower().endswith('.pdf'))
         
         if not pdf_files:
             print(f"✗ 在输入文件夹中未找到PDF文件: {input_folder}")
             exit(0)
         
-        print(f"找到 {len(pdf_files)} 个PDF文件，开始处理...")
+        workers = get_worker_count(config.get("workers", ""), len(pdf_files))
+        print(f"找到 {len(pdf_files)} 个PDF文件，开始处理..."
+              + (f"（{workers} 个进程并行提取）" if workers > 1 else ""))
         print("=" * 60)
         
-        # 处理每个PDF文件
-        for pdf_file in pdf_files:
-            pdf_file_path = os.path.join(input_folder, pdf_file)
-            pdf_name = os.path.splitext(pdf_file)[0]  # 获取PDF文件名（不含扩展名）
-            
-            print(f"\n正在处理: {pdf_file}")
-            print("-" * 60)
-            
-            # 第一步：处理PDF文件，生成"提取的表格数据.json"
-            print("第一步：处理PDF文件，提取表格数据...")
-            # JSON文件保存到配置的路径或默认路径
-            extracted_json_path = os.path.join(json_output_dir, f"{pdf_name}_提取的表格数据.json")
-            main(pdf_file_path)
-            
-            # 将提取的表格数据移动到配置的路径
-            if os.path.exists("提取的表格数据.json"):
-                shutil.move("提取的表格数据.json", extracted_json_path)
-                print(f"已保存提取的表格数据到: {extracted_json_path}")
-            
-            # 第二步：解析"提取的表格数据.json"，生成"解析后的数据.json"
-            print("\n第二步：解析表格数据JSON，生成解析后的数据...")
-            
-            # 等待一下，确保文件已写入
-            import time
-            time.sleep(0.5)
-            
-            # JSON文件保存到配置的路径或默认路径
-            parsed_json_path = os.path.join(json_output_dir, f"{pdf_name}_解析后的数据.json")
-            
-            parsed_data = parse_tables_json(extracted_json_path)
-            if parsed_data:
-                with open(parsed_json_path, "w", encoding="utf-8") as f:
-                    json.dump(parsed_data, f, ensure_ascii=False, indent=2)
-                print(f"✓ 已将解析后的数据保存为: {parsed_json_path}")
-                
-                # 第三步：将解析后的数据写入Excel模板
-                if template_path:
-                    print("\n第三步：将解析后的数据写入Excel模板...")
-                    
-                    # 获取员工姓名
-                    employee_name = parsed_data.get("人员基本信息", {}).get("姓名", "")
-                    if not employee_name:
-                        employee_name = parsed_data.get("职称申报基础信息", {}).get("姓名", "")
-                    
-                    # 如果还是没有姓名，使用PDF文件名
-                    if not employee_name:
-                        employee_name = pdf_name
-                    
-                    # 以员工姓名重命名文件，保存到输出文件夹
-                    output_excel_path = os.path.join(output_folder, f"{employee_name}.xls")
-                    
-                    # 如果文件已存在，添加序号
-                    counter = 1
-                    while os.path.exists(output_excel_path):
-                        output_excel_path = os.path.join(output_folder, f"{employee_name}_{counter}.xls")
-                        counter += 1
-                    
-                    # 复制模板
-                    shutil.copy2(template_path, output_excel_path)
-                    print(f"已复制模板到: {output_excel_path}")
-                    
-                    # 写入JSON数据到第四行
-                    write_json_to_excel(output_excel_path, parsed_data, row=3)
-                    print(f"✓ 已将解析后的数据写入Excel第4行（文件名: {os.path.basename(output_excel_path)}）")
-                
-                # 处理成功后，将PDF文件移动到已处理文件夹
-                if processed_folder:
-                    try:
-                        processed_pdf_path = os.path.join(processed_folder, pdf_file)
-                        # 如果目标文件已存在，添加时间戳
-                        if os.path.exists(processed_pdf_path):
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            name, ext = os.path.splitext(pdf_file)
-                            processed_pdf_path = os.path.join(processed_folder, f"{name}_{timestamp}{ext}")
-                        
-                        shutil.move(pdf_file_path, processed_pdf_path)
-                        print(f"✓ 已将PDF文件移动到已处理文件夹: {os.path.basename(processed_pdf_path)}")
-                    except Exception as e:
-                        print(f"⚠ 警告: 移动PDF文件到已处理文件夹失败: {str(e)}")
-            else:
-                print("✗ 解析失败，请检查提取的表格数据文件是否存在")
-                print("⚠ PDF文件保留在原文件夹，可重新处理")
+        # JSON存档在后台线程中保存，处理完所有PDF后等待写完
+        archive = JsonArchive(json_output_dir) if json_output_dir else None
+        try:
+            failures, cache_hits = run_batch(pdf_files, input_folder, output_folder, template_path,
+                                             processed_folder, workers, archive, cache_folder)
+        finally:
+            if archive is not None:
+                saved_count, archive_errors = archive.close()
         
         print("\n" + "=" * 60)
-        print(f"✓ 处理完成！共处理 {len(pdf_files)} 个文件")
+        print(f"✓ 处理完成！共处理 {len(pdf_files)} 个文件，成功 {len(pdf_files) - len(failures)} 个，"
+              f"失败 {len(failures)} 个")
+        for pdf_file, reason in failures:
+            print(f"  ✗ {pdf_file}: {reason}")
+        if failures:
+            print("⚠ 失败的PDF文件保留在原文件夹，可重新处理")
+        if cache_folder:
+            record_cache_stats(cache_folder, cache_hits, len(pdf_files))
+            print(f"提取缓存: 命中 {cache_hits}/{len(pdf_files)}（{cache_folder}）")
+        if archive is not None:
+            print(f"JSON存档: 保存 {saved_count} 个文件到 {json_output_dir}")
+            for path, reason in archive_errors:
+                print(f"  ⚠ 保存失败 {os.path.basename(path)}: {reason}")
         print(f"输出文件夹: {output_folder}")
         
     except Exception as e:
         print(f"✗ 错误: {str(e)}")
-        import traceback
         traceback.print_exc()
         exit(1)
\ No newline at end of file
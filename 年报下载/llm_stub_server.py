@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟的大模型接口（OpenAI兼容的 /v1/chat/completions），用于在不联网、不消耗额度的情况下试运行 年报下载.py
+
+1. 从问题中读取图书馆名称（"- 名称" 开头的行），返回 {图书馆: 本服务器上的PDF链接} 的JSON；
+   名称中包含 --missing 指定的文字时返回 null
+2. 同时提供这些PDF链接（GET /reports/...），年报下载.py 可以完整走完查找和下载流程
+3. 记录收到的请求数，--delay 模拟接口的响应时间
+
+用法:
+    python llm_stub_server.py --port 8765 --delay 1
+    config.txt 中设置:
+        llm_base_url=http://127.0.0.1:8765/v1
+        llm_api_key=stub
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from urllib.parse import quote, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 最小的有效PDF（一页空白页）
+STUB_PDF = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+            b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+            b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n"
+            b"trailer<</Root 1 0 R>>\n" + b"%" + b"0" * 2048 + b"\n%%EOF\n")
+
+_request_count = 0
+_count_lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    delay = 0.0
+    missing = ()
+
+    def log_message(self, format, *args):
+        print(f"  [{self.address_string()}] {format % args}")
+
+    def _send(self, status, body, content_type, head=False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def do_POST(self):
+        global _request_count
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send(404, b'{"error": "not found"}', 'application/json')
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            prompt = payload['messages'][-1]['content']
+        except (ValueError, KeyError, IndexError):
+            self._send(400, b'{"error": "bad request"}', 'application/json')
+            return
+        with _count_lock:
+            _request_count += 1
+            count = _request_count
+        if self.delay:
+            time.sleep(self.delay)
+
+        year_match = re.search(r'(20\d{2})年', prompt)
+        year = year_match.group(1) if year_match else ''
+        host = self.headers.get('Host') or '127.0.0.1'
+        answer = {}
+        for name in re.findall(r'^- (.+)$', prompt, re.M):
+            name = name.strip()
+            if any(word in name for word in self.missing):
+                answer[name] = None
+            else:
+                answer[name] = f"http://{host}/reports/{quote(name)}{year}.pdf"
+        content = "```json\n" + json.dumps(answer, ensure_ascii=False, indent=2) + "\n```"
+        body = json.dumps({
+            'id': f'stub-{count}',
+            'object': 'chat.completion',
+            'model': payload.get('model', 'stub'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+        }, ensure_ascii=False).encode('utf-8')
+        print(f"  第 {count} 次询问: {len(answer)} 个图书馆")
+        self._send(200, body, 'application/json; charset=utf-8')
+
+    def do_GET(self, head=False):
+        if self.path.startswith('/reports/') and unquote(self.path).endswith('.pdf'):
+            self._send(200, STUB_PDF, 'application/pdf', head)
+        else:
+            self._send(404, b'not found', 'text/plain', head)
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的大模型接口')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help='每次询问的模拟响应时间（秒）')
+    parser.add_argument('--missing', default='', help='名称中包含这些文字（逗号分隔）的图书馆返回null')
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay
+    StubHandler.missing = tuple(word for word in args.missing.split(',') if word)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), StubHandler)
+    print(f"模拟接口: http://127.0.0.1:{args.port}/v1  （Ctrl+C 结束）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"共收到 {_request_count} 次询问")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,23 @@
 # -*- coding: utf-8 -*-
 """
 从Excel文件读取图书馆信息，下载去年的年报，并更新Excel
+
+config.txt 中设置 max_workers 后多个图书馆同时处理（同一网站不同时处理，间隔 host_interval 秒）；
+每处理完一行写入断点记录（<Excel文件名>.进度.db），Excel每 excel_flush_every 行保存一次，
+中断后再次运行从未处理的行继续
 """
 
 import os
+import io
 import re
+import sys
+import mmap
 import time
 import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 import requests
 from urllib.parse import urlparse, urljoin
@@ -210,8 +221,39 @@ def clean_filename(filename):
         cleaned = "unnamed_file"
     return cleaned
 
+def quick_check_pdf(file_path):
+    """
+    只检查PDF结构（内存映射读取，不完整解析）：%PDF 文件头、%%EOF 结尾、startxref 指向的交叉引用表
+    
+    返回 (是否正常, 说明)；结构不规范但不能确定已损坏时返回 (None, 说明)，由调用方完整解析
+    """
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return False, "文件为空"
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        head = data[:1024]
+        if b'%PDF-' not in head:
+            if any(marker in head.lower() for marker in (b'<html', b'<!doctype', b'<head', b'<script')):
+                return False, "文件内容是网页，不是PDF"
+            return False, "不是有效的PDF文件"
+        eof = data.rfind(b'%%EOF', max(0, size - 2048))
+        if eof < 0:
+            return False, "PDF文件不完整（缺少 %%EOF 结尾）"
+        matches = list(re.finditer(rb'startxref\s+(\d+)', data[max(0, eof - 2048):eof]))
+        if not matches:
+            return None, "缺少 startxref"
+        offset = int(matches[-1].group(1))
+        if offset >= size:
+            return False, "PDF文件不完整（startxref 指向文件之外）"
+        window = data[offset:offset + 1024]
+        if window.startswith(b'xref') and b'trailer' in data[offset:offset + 1024 * 1024]:
+            return True, "PDF文件结构完整"
+        if re.match(rb'\d+\s+\d+\s+obj\b', window) and b'/XRef' in window:
+            return True, "PDF文件结构完整（交叉引用流）"
+        return None, "交叉引用表位置不正确"
+
 def validate_file(file_path):
-    """校验文件是否可以正常打开"""
+    """校验文件是否可以正常打开（PDF先检查结构，结构不规范时才完整解析）"""
     if not os.path.exists(file_path):
         return False, "文件不存在"
     
@@ -219,50 +261,38 @@ def validate_file(file_path):
     
     # 校验PDF文件
     if file_ext == '.pdf':
-        # 方法1: 使用PyPDF2
+        try:
+            ok, message = quick_check_pdf(file_path)
+        except (OSError, ValueError) as e:
+            return False, f"读取文件失败: {str(e)}"
+        if ok is not None:
+            return ok, message
+        
+        # 结构不规范：用PDF库完整解析（很多阅读器能自动修复交叉引用表）
         if HAS_PYPDF2:
             try:
                 with open(file_path, 'rb') as f:
                     pdf_reader = PyPDF2.PdfReader(f)
                     if len(pdf_reader.pages) == 0:
                         return False, "PDF文件没有页面"
-                    # 尝试读取第一页
-                    first_page = pdf_reader.pages[0]
-                    text = first_page.extract_text()
                     return True, "PDF文件正常"
             except Exception as e:
                 return False, f"PDF文件损坏: {str(e)}"
         
-        # 方法2: 使用PyMuPDF
         elif HAS_PYMUPDF:
             try:
                 doc = fitz.open(file_path)
-                if doc.page_count == 0:
-                    doc.close()
-                    return False, "PDF文件没有页面"
-                # 尝试读取第一页
-                first_page = doc[0]
-                text = first_page.get_text()
+                page_count = doc.page_count
                 doc.close()
+                if page_count == 0:
+                    return False, "PDF文件没有页面"
                 return True, "PDF文件正常"
             except Exception as e:
                 return False, f"PDF文件损坏: {str(e)}"
         
-        # 方法3: 简单校验（检查文件头）
+        # 没有PDF库：文件头和结尾完整，按正常处理
         else:
-            try:
-                with open(file_path, 'rb') as f:
-                    header = f.read(4)
-                    if header == b'%PDF':
-                        # 检查文件大小是否合理
-                        file_size = os.path.getsize(file_path)
-                        if file_size < 1024:
-                            return False, "PDF文件大小异常小"
-                        return True, "PDF文件格式正确"
-                    else:
-                        return False, "不是有效的PDF文件"
-            except Exception as e:
-                return False, f"读取文件失败: {str(e)}"
+            return True, f"PDF文件格式正确（{message}）"
     
     # 校验其他文件类型（简单检查文件大小）
     else:
@@ -640,6 +670,197 @@ def process_library_row(row, library_name_col, url_col, save_dir, target_year):
     
     return success, downloaded_url, downloaded_file_path
 
+# ---------------------------------------------------------------------------
+# 并发处理与断点记录
+# ---------------------------------------------------------------------------
+
+PROGRESS_SUFFIX = '.进度.db'      # 断点记录文件：<Excel文件名>.进度.db
+
+
+class ProgressStore:
+    """
+    断点记录（SQLite，与Excel文件放在一起）
+
+    每处理完一行立即写入，Excel只按批保存；程序中断后再次运行时继续未完成的那一轮，
+    已处理的行直接使用记录中的结果
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                year TEXT NOT NULL,
+                started TEXT NOT NULL,
+                finished TEXT
+            );
+            CREATE TABLE IF NOT EXISTS progress (
+                library TEXT NOT NULL,
+                year TEXT NOT NULL,
+                run_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                url TEXT,
+                path TEXT,
+                message TEXT,
+                updated TEXT NOT NULL,
+                PRIMARY KEY (library, year)
+            );
+        """)
+        self.conn.commit()
+
+    def begin_run(self, year):
+        """继续该年份未完成的一轮，没有时开始新的一轮，返回 (run_id, 是否为继续)"""
+        row = self.conn.execute(
+            'SELECT run_id FROM runs WHERE year = ? AND finished IS NULL ORDER BY run_id DESC LIMIT 1',
+            (str(year),)).fetchone()
+        if row:
+            return row[0], True
+        cursor = self.conn.execute('INSERT INTO runs (year, started) VALUES (?, ?)',
+                                   (str(year), datetime.now().isoformat(timespec='seconds')))
+        self.conn.commit()
+        return cursor.lastrowid, False
+
+    def finish_run(self, run_id):
+        self.conn.execute('UPDATE runs SET finished = ? WHERE run_id = ?',
+                          (datetime.now().isoformat(timespec='seconds'), run_id))
+        self.conn.commit()
+
+    def load(self, year):
+        """返回 {图书馆: 记录字典}"""
+        records = {}
+        for library, run_id, status, url, path, message in self.conn.execute(
+                'SELECT library, run_id, status, url, path, message FROM progress WHERE year = ?', (str(year),)):
+            records[library] = {'run_id': run_id, 'status': status, 'url': url, 'path': path, 'message': message}
+        return records
+
+    def save(self, library, year, run_id, status, url=None, path=None, message=None):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO progress (library, year, run_id, status, url, path, message, updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (library, str(year), run_id, status, url, path, message, datetime.now().isoformat(timespec='seconds')))
+        self.conn.commit()
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class HostPoliteness:
+    """
+    按网站限制并发：同一网站同时最多处理 per_host 行，
+    一行处理完后至少间隔 interval 秒才开始该网站的下一行（代替每行之后固定等待）
+    """
+
+    def __init__(self, interval=2.0, per_host=1):
+        self.interval = interval
+        self.per_host = max(1, per_host)
+        self._slots = {}
+        self._next = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, host):
+        with self._lock:
+            semaphore = self._slots.setdefault(host, threading.Semaphore(self.per_host))
+        with semaphore:
+            with self._lock:
+                delay = self._next.get(host, 0.0) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._next[host] = time.monotonic() + self.interval
+
+
+class _ThreadOutput:
+    """
+    并发处理时按线程缓存输出，每行处理完后整段打印，避免多个图书馆的输出交错
+
+    没有开始缓存的线程（主线程）直接输出
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.buffer = io.StringIO()
+
+    def end(self):
+        buffer = getattr(self._local, 'buffer', None)
+        self._local.buffer = None
+        return buffer.getvalue() if buffer else ''
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is not None:
+            return buffer.write(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        if getattr(self._local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def process_row_task(row, library_name, library_name_col, url_col, save_dir, target_year, politeness, output=None):
+    """
+    在工作线程中处理一行：查找、下载并校验年报
+
+    返回:
+        {'status': 'success'/'failed', 'url', 'path', 'message', 'log'}
+    """
+    if output is not None:
+        output.begin()
+    outcome = {'status': 'failed', 'url': None, 'path': None, 'message': None}
+    try:
+        print(f"\n📥 开始处理: {library_name}")
+        page_url = str(row[url_col]).strip()
+        host = urlparse(page_url).hostname or library_name
+        with politeness.slot(host):
+            result, downloaded_url, downloaded_file_path = process_library_row(
+                row, library_name_col, url_col, save_dir, target_year)
+            if result and downloaded_file_path:
+                print(f"  🔍 正在校验文件...")
+                is_valid, validation_msg = validate_file(downloaded_file_path)
+                if is_valid:
+                    print(f"  ✅ 文件校验通过: {validation_msg}")
+                    outcome.update(status='success', url=downloaded_url, path=downloaded_file_path,
+                                   message=validation_msg)
+                else:
+                    print(f"  ❌ 文件校验失败: {validation_msg}")
+                    # 删除损坏的文件
+                    try:
+                        if os.path.exists(downloaded_file_path):
+                            os.remove(downloaded_file_path)
+                            print(f"  🗑️  已删除损坏的文件: {os.path.basename(downloaded_file_path)}")
+                    except Exception as e:
+                        print(f"  ⚠️ 删除文件失败: {e}")
+                    outcome['message'] = f"文件校验失败: {validation_msg}"
+            elif result:
+                print(f"  ⚠️ 下载成功但未返回文件路径")
+                outcome['message'] = '下载成功但未返回文件路径'
+            elif pd.isna(row[url_col]) or page_url == 'nan' or not page_url:
+                outcome['message'] = '年报地址为空'
+            else:
+                outcome['message'] = '下载失败'
+    except Exception as e:
+        print(f"  ❌ 处理失败: {e}")
+        outcome['message'] = f"处理失败: {e}"
+    finally:
+        outcome['log'] = output.end() if output is not None else ''
+    return outcome
+
+
 def load_config():
     """加载配置文件"""
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -661,6 +882,20 @@ def load_config():
     
     return config
 
+def get_int_config(config, key, default):
+    """读取整数配置，未设置或格式错误时使用默认值"""
+    try:
+        return int(config.get(key, '').strip() or default)
+    except ValueError:
+        return default
+
+def get_float_config(config, key, default):
+    """读取小数配置，未设置或格式错误时使用默认值"""
+    try:
+        return float(config.get(key, '').strip() or default)
+    except ValueError:
+        return default
+
 def main():
     """主函数"""
     print("=" * 60)
@@ -787,10 +1022,23 @@ def main():
     print(f"\n📅 目标年份: {target_year}年（去年）")
     print("=" * 60)
     
+    # 并发处理设置
+    max_workers = get_int_config(config, 'max_workers', 1)
+    host_interval = get_float_config(config, 'host_interval', 2.0)
+    flush_every = max(1, get_int_config(config, 'excel_flush_every', 10))
+    
+    # 断点记录：上一轮中断时继续，已处理的行直接使用记录中的结果
+    store = ProgressStore(excel_file + PROGRESS_SUFFIX)
+    run_id, resumed = store.begin_run(target_year)
+    checkpoint = store.load(target_year)
+    if resumed:
+        print(f"\n🔁 继续上次中断的处理（断点记录: {os.path.basename(store.db_path)}）")
+    
     # 处理每一行
     success_count = 0
     fail_count = 0
     already_done_count = 0
+    pending = []
     
     for index, row in df.iterrows():
         library_name = str(row[library_name_col]).strip()
@@ -810,89 +1058,89 @@ def main():
             already_done_count += 1
             continue
         
-        # 状态为"否"、空值或其他，都进行抓取
-        print(f"\n📥 开始处理: {library_name}（状态: '{current_status if current_status else '空'}）")
+        # 断点记录中已下载成功（上次未来得及保存到Excel）或本轮已处理过的行
+        record = checkpoint.get(library_name)
+        if record and record['status'] == 'success' and record['path'] and os.path.exists(record['path']):
+            print(f"\n⏭️  跳过: {library_name}（断点记录中已下载）")
+            df.at[index, status_col] = '是'
+            df.at[index, report_url_col] = record['url'] or ''
+            success_count += 1
+            continue
+        if resumed and record and record['run_id'] == run_id:
+            print(f"\n⏭️  跳过: {library_name}（本轮已处理: {record['message'] or record['status']}）")
+            df.at[index, status_col] = '否'
+            df.at[index, report_url_col] = ''
+            fail_count += 1
+            continue
         
+        pending.append((index, row, library_name))
+    
+    print(f"\n待处理 {len(pending)} 个图书馆，并发数 {max_workers}，同一网站间隔 {host_interval} 秒")
+    
+    def flush_excel(done_count):
         try:
-            result, downloaded_url, downloaded_file_path = process_library_row(row, library_name_col, url_col, save_dir, target_year)
-            if result and downloaded_file_path:
-                # 校验文件是否可以正常打开
-                print(f"  🔍 正在校验文件...")
-                is_valid, validation_msg = validate_file(downloaded_file_path)
-                
-                if is_valid:
-                    print(f"  ✅ 文件校验通过: {validation_msg}")
-                    df.at[index, status_col] = '是'
-                    if downloaded_url:
-                        df.at[index, report_url_col] = downloaded_url
-                    success_count += 1
-                else:
-                    print(f"  ❌ 文件校验失败: {validation_msg}")
-                    # 删除损坏的文件
-                    try:
-                        if os.path.exists(downloaded_file_path):
-                            os.remove(downloaded_file_path)
-                            print(f"  🗑️  已删除损坏的文件: {os.path.basename(downloaded_file_path)}")
-                    except Exception as e:
-                        print(f"  ⚠️ 删除文件失败: {e}")
-                    # 更新状态为"否"
-                    df.at[index, status_col] = '否'
-                    df.at[index, report_url_col] = ''
-                    print(f"  📝 已将状态更新为'否'")
-                    fail_count += 1
-                    
-                    # 立即保存Excel，确保状态更新被保存
-                    try:
-                        df.to_excel(excel_file, index=False, engine='openpyxl')
-                        print(f"  💾 已保存状态更新到Excel")
-                    except Exception as e:
-                        print(f"  ⚠️ 保存Excel失败: {e}")
-            elif result:
-                # 下载成功但没有文件路径（不应该发生）
-                print(f"  ⚠️ 下载成功但未返回文件路径")
-                df.at[index, status_col] = '否'
-                df.at[index, report_url_col] = ''
-                fail_count += 1
+            df.to_excel(excel_file, index=False, engine='openpyxl')
+            print(f"\n💾 已保存进度到Excel文件（已处理 {done_count}/{len(pending)} 个）")
+        except Exception as e:
+            print(f"⚠️ 保存Excel失败: {e}（进度已记录在断点记录中）")
+    
+    politeness = HostPoliteness(interval=host_interval)
+    output = _ThreadOutput(sys.stdout) if max_workers > 1 else None
+    if output is not None:
+        sys.stdout = output
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    done_count = 0
+    try:
+        futures = {}
+        for index, row, library_name in pending:
+            future = executor.submit(process_row_task, row, library_name, library_name_col, url_col,
+                                     save_dir, target_year, politeness, output)
+            futures[future] = (index, library_name)
+        
+        for future in as_completed(futures):
+            done_count += 1
+            index, library_name = futures[future]
+            outcome = future.result()
+            if outcome['log']:
+                print(outcome['log'], end='')
+            
+            # 先写断点记录，再更新表格
+            store.save(library_name, target_year, run_id, outcome['status'],
+                       outcome['url'], outcome['path'], outcome['message'])
+            if outcome['status'] == 'success':
+                df.at[index, status_col] = '是'
+                df.at[index, report_url_col] = outcome['url'] or ''
+                success_count += 1
             else:
-                # 下载失败，更新状态为"否"
-                page_url = str(row[url_col]).strip()
                 df.at[index, status_col] = '否'
                 df.at[index, report_url_col] = ''  # 失败时清空地址
-                if pd.isna(row[url_col]) or page_url == 'nan' or not page_url:
-                    print(f"  ⚠️ 年报地址为空，已标记为'否'")
-                else:
-                    print(f"  ❌ 下载失败，已标记为'否'")
+                print(f"  ❌ {library_name}: {outcome['message']}，已标记为'否'")
                 fail_count += 1
-                
-                # 立即保存Excel，确保状态更新被保存
-                try:
-                    df.to_excel(excel_file, index=False, engine='openpyxl')
-                    print(f"  💾 已保存状态更新到Excel")
-                except Exception as e:
-                    print(f"  ⚠️ 保存Excel失败: {e}")
-        except Exception as e:
-            print(f"  ❌ 处理失败: {e}")
-            df.at[index, status_col] = '否'
-            df.at[index, report_url_col] = ''  # 失败时清空地址
-            fail_count += 1
-        
-        # 每个图书馆之间稍作延迟
-        time.sleep(2)
-        
-        # 每处理5个保存一次（防止数据丢失）
-        if (index + 1) % 5 == 0:
-            try:
-                df.to_excel(excel_file, index=False, engine='openpyxl')
-                print(f"\n💾 已保存进度到Excel文件（已处理 {index + 1}/{len(df)} 行）")
-            except Exception as e:
-                print(f"⚠️ 保存Excel失败: {e}")
+            
+            # 每处理 flush_every 个保存一次Excel
+            if done_count % flush_every == 0:
+                flush_excel(done_count)
+    except KeyboardInterrupt:
+        # 取消尚未开始的行，已完成的行都在断点记录中，再次运行时继续
+        executor.shutdown(wait=False, cancel_futures=True)
+        if output is not None:
+            sys.stdout = output.stream
+        flush_excel(done_count)
+        store.close()
+        raise
+    finally:
+        executor.shutdown(wait=False)
+        if output is not None:
+            sys.stdout = output.stream
     
     # 最终保存
     try:
         df.to_excel(excel_file, index=False, engine='openpyxl')
         print(f"\n✅ Excel文件已更新并保存")
+        store.finish_run(run_id)
     except Exception as e:
-        print(f"❌ 保存Excel文件失败: {e}")
+        print(f"❌ 保存Excel文件失败: {e}（再次运行时将从断点记录恢复）")
+    store.close()
     
     # 输出统计
     print("\n" + "=" * 60)
@@ -1,11 +1,13 @@
 import requests
 import os
 import time
-import random
 import re
 import sys
 import json
 from urllib.parse import urlparse, urljoin
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -81,6 +83,53 @@ def get_headers():
         'Cache-Control': 'max-age=0'
     }
 
+# 同一网站两次请求之间的最小间隔（秒），代替每个文件下载前随机等待1-3秒
+HOST_MIN_INTERVAL = 1.0
+
+_session = None
+_host_last_request = {}
+
+def wait_for_host(url):
+    """同一网站的请求至少间隔 HOST_MIN_INTERVAL 秒（不同网站之间不等待）"""
+    host = urlparse(url).hostname or ''
+    elapsed = time.time() - _host_last_request.get(host, 0)
+    if elapsed < HOST_MIN_INTERVAL:
+        delay = HOST_MIN_INTERVAL - elapsed
+        print(f"  等待 {delay:.1f} 秒...")
+        time.sleep(delay)
+    _host_last_request[host] = time.time()
+
+class PoliteAdapter(HTTPAdapter):
+    """发送请求前按网站限速的连接适配器"""
+    
+    def send(self, request, **kwargs):
+        wait_for_host(request.url)
+        return super().send(request, **kwargs)
+
+def get_session():
+    """
+    获取共用的会话：查找和下载复用同一网站的连接（keep-alive），
+    连接失败、429和502/503/504按指数退避自动重试
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers.update(get_headers())
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504),
+                      allowed_methods=frozenset(['GET', 'HEAD']),
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = PoliteAdapter(pool_connections=16, pool_maxsize=4, max_retries=retry)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+def close_session():
+    """关闭共用的会话"""
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+
 def extract_year_from_url(url):
     """从URL中提取年份"""
     # 查找4位数字年份（2000-2099）
@@ -150,15 +199,9 @@ def find_pdf_in_html(html_content, base_url):
 def download_pdf(url, filename, save_dir):
     """下载PDF文件并确保文件名正确"""
     try:
-        session = requests.Session()
-        session.headers.update(get_headers())
-        
-        # 随机延迟
-        delay = random.uniform(1, 3)
-        print(f"  等待 {delay:.1f} 秒...")
-        time.sleep(delay)
+        session = get_session()
         
-        # 下载文件
+        # 下载文件（同一网站的请求间隔由会话控制）
         response = session.get(url, stream=True, timeout=30)
         response.raise_for_status()
         
@@ -218,7 +261,6 @@ def download_pdf(url, filename, save_dir):
         print(f"    文件大小: {file_size:,} 字节 ({file_size/1024/1024:.2f} MB)")
         print(f"    保存路径: {file_path}")
         
-        session.close()
         return True
         
     except requests.exceptions.RequestException as e:
@@ -238,10 +280,8 @@ def process_library(library_name, url, save_dir):
     last_year = current_year - 1
     last_year_str = str(last_year)
     
-    session = None
     try:
-        session = requests.Session()
-        session.headers.update(get_headers())
+        session = get_session()
         
         # 先尝试访问URL（使用HEAD请求检查，如果是PDF则直接下载）
         try:
@@ -417,9 +457,6 @@ def process_library(library_name, url, save_dir):
     except Exception as e:
         print(f"  ✗ 处理失败: {e}")
         return False
-    finally:
-        if session:
-            session.close()
 
 def setup_driver():
     """设置浏览器驱动"""
@@ -1034,6 +1071,216 @@ def get_library_urls_from_doubao():
             except:
                 pass
 
+# ---------------------------------------------------------------------------
+# 通过大模型接口查找年报链接（OpenAI兼容的 /chat/completions 接口）
+# 代替在豆包网页中输入问题、轮询页面等待回答：一次请求询问多个图书馆，
+# 结果按（图书馆, 年份）缓存，有效期内不再重复询问
+# ---------------------------------------------------------------------------
+
+# 未在config.txt中设置 libraries 时查找的图书馆
+DEFAULT_LIBRARIES = ['中国国家图书馆', '上海图书馆', '浙江图书馆']
+
+URL_CACHE_FILE = '年报链接缓存.json'
+DEFAULT_CACHE_TTL_DAYS = 30        # 找到链接的缓存有效期
+NOT_FOUND_CACHE_TTL_DAYS = 3       # 未找到链接的缓存有效期（较短，过几天再问）
+DEFAULT_BATCH_SIZE = 10            # 每次请求询问的图书馆数
+DEFAULT_LLM_CONCURRENCY = 4        # 同时发送的请求数
+LLM_TIMEOUT = 120
+
+_URL_RE = re.compile(r'https?://[^\s"\'<>（）()，,；;]+')
+
+class UrlCache:
+    """年报链接缓存：{"图书馆|年份": {"url": 链接或null, "time": 获取时间}}"""
+    
+    def __init__(self, path, ttl_days=DEFAULT_CACHE_TTL_DAYS):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"⚠️  链接缓存无法读取，将重新获取: {e}")
+                self.entries = {}
+    
+    @staticmethod
+    def _key(library, year):
+        return f"{library}|{year}"
+    
+    def get(self, library, year):
+        """返回 (是否命中, 链接)；未找到的结果也会缓存（有效期较短）"""
+        entry = self.entries.get(self._key(library, year))
+        if not entry:
+            return False, None
+        ttl = self.ttl if entry.get('url') else min(self.ttl, NOT_FOUND_CACHE_TTL_DAYS * 86400)
+        if time.time() - entry.get('time', 0) > ttl:
+            return False, None
+        return True, entry.get('url')
+    
+    def put(self, library, year, url):
+        self.entries[self._key(library, year)] = {'url': url, 'time': time.time()}
+    
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+def extract_url(value):
+    """从回答的值中取出第一个链接（回答中常带有说明文字），没有时返回None"""
+    if not isinstance(value, str):
+        return None
+    match = _URL_RE.search(value)
+    return match.group(0) if match else None
+
+def parse_json_text(text):
+    """从回答文本中解析JSON（可能包在 ```json 代码块中或前后有说明文字）"""
+    if not text:
+        return None
+    fenced = re.search(r'```(?:json)?\s*(.*?)```', text, re.S)
+    if fenced:
+        text = fenced.group(1)
+    for start_char, end_char in (('{', '}'), ('[', ']')):
+        start = text.find(start_char)
+        end = text.rfind(end_char)
+        if start != -1 and end > start:
+            try:
+                return json.loads(text[start:end + 1])
+            except ValueError:
+                continue
+    return None
+
+def build_url_prompt(libraries, year):
+    """生成一次询问多个图书馆的问题"""
+    lines = [
+        f"请查找以下图书馆{year}年年报的下载链接（可以直接下载的PDF，或可以下载年报的页面）。",
+        "只返回一个JSON对象，不要其他文字：键为图书馆名称（与下面列出的名称完全一致），值为链接；找不到时值为null。",
+    ]
+    lines.extend(f"- {name}" for name in libraries)
+    return "\n".join(lines)
+
+def ask_llm_for_urls(libraries, year, api):
+    """
+    发送一次请求询问多个图书馆的年报链接，返回 {图书馆: 链接或None}（只包含回答中出现的图书馆）
+    
+    参数:
+        api: {'base_url', 'api_key', 'model'}
+    """
+    response = requests.post(
+        api['base_url'].rstrip('/') + '/chat/completions',
+        headers={'Authorization': f"Bearer {api['api_key']}", 'Content-Type': 'application/json'},
+        json={
+            'model': api['model'],
+            'temperature': 0,
+            'messages': [
+                {'role': 'system', 'content': '你是图书馆年报检索助手，只回答JSON。'},
+                {'role': 'user', 'content': build_url_prompt(libraries, year)},
+            ],
+        },
+        timeout=LLM_TIMEOUT,
+    )
+    response.raise_for_status()
+    content = response.json()['choices'][0]['message']['content']
+    data = parse_json_text(content)
+    if isinstance(data, list):
+        # 列表格式：[{"图书馆名称": "URL"}, ...]
+        merged = {}
+        for item in data:
+            if isinstance(item, dict):
+                merged.update(item)
+        data = merged
+    if not isinstance(data, dict):
+        raise ValueError(f"回答不是JSON: {content[:200]}")
+    wanted = set(libraries)
+    return {name: extract_url(value) for name, value in data.items() if name in wanted}
+
+def get_library_urls_from_api(libraries, year, api, cache, batch_size=DEFAULT_BATCH_SIZE,
+                              concurrency=DEFAULT_LLM_CONCURRENCY):
+    """
+    通过大模型接口获取图书馆年报链接，返回 {图书馆: 链接}（只包含找到链接的图书馆）
+    
+    缓存中有效的结果直接使用，其余的按 batch_size 个一组并发询问
+    """
+    print("=" * 60)
+    print(f"正在通过接口获取图书馆年报链接（{api['model']}）...")
+    print("=" * 60)
+    
+    library_urls = {}
+    missing = []
+    for name in libraries:
+        hit, url = cache.get(name, year)
+        if hit:
+            if url:
+                library_urls[name] = url
+            print(f"  缓存: {name}: {url or '未找到'}")
+        else:
+            missing.append(name)
+    
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), max(1, batch_size))]
+    if batches:
+        print(f"  询问 {len(missing)} 个图书馆（{len(batches)} 次请求）...")
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as executor:
+            futures = {executor.submit(ask_llm_for_urls, batch, year, api): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    answers = future.result()
+                except Exception as e:
+                    # 请求失败的图书馆不写缓存，下次运行重新询问
+                    print(f"  ✗ 请求失败（{'、'.join(batch)}）: {e}")
+                    continue
+                for name in batch:
+                    url = answers.get(name)
+                    cache.put(name, year, url)
+                    if url:
+                        library_urls[name] = url
+                    print(f"    {name}: {url or '未找到'}")
+        cache.save()
+        print(f"  用时 {time.time() - start:.1f} 秒")
+    
+    print(f"✓ 共获取到 {len(library_urls)} 个图书馆链接")
+    return library_urls
+
+def discover_library_urls(config, script_dir):
+    """
+    按配置选择查找年报链接的方式，返回 {图书馆: 链接}，失败时返回None
+    
+    设置了 llm_base_url 时使用接口（url_backend=doubao 时仍使用豆包网页）
+    """
+    backend = config.get('url_backend', '').strip().lower()
+    base_url = config.get('llm_base_url', '').strip()
+    if backend == 'doubao' or (not base_url and backend != 'api'):
+        return get_library_urls_from_doubao()
+    if not base_url:
+        print("⚠️  未设置 llm_base_url，无法通过接口获取链接")
+        return None
+    
+    api = {
+        'base_url': base_url,
+        'api_key': config.get('llm_api_key', '').strip() or os.environ.get('LLM_API_KEY', ''),
+        'model': config.get('llm_model', '').strip() or 'gpt-4o-mini',
+    }
+    libraries = [name.strip() for name in re.split(r'[,，、]', config.get('libraries', '')) if name.strip()]
+    
+    def int_option(key, default):
+        try:
+            return int(config.get(key, '').strip() or default)
+        except ValueError:
+            return default
+    
+    cache = UrlCache(os.path.join(script_dir, URL_CACHE_FILE),
+                     ttl_days=int_option('url_cache_ttl_days', DEFAULT_CACHE_TTL_DAYS))
+    year = time.localtime().tm_year - 1
+    try:
+        return get_library_urls_from_api(libraries or DEFAULT_LIBRARIES, year, api, cache,
+                                         batch_size=int_option('llm_batch_size', DEFAULT_BATCH_SIZE),
+                                         concurrency=int_option('llm_concurrency', DEFAULT_LLM_CONCURRENCY))
+    except Exception as e:
+        print(f"✗ 通过接口获取链接失败: {e}")
+        return None
+
 def load_config_from_txt(config_path):
     """从TXT配置文件读取配置，格式：key=value，支持#注释和空行"""
     config = {}
@@ -1083,13 +1330,13 @@ def main():
     # 全局变量，用于存储图书馆URL
     global LIBRARY_URLS
     
-    # 首先通过豆包获取图书馆年报链接
-    doubao_urls = get_library_urls_from_doubao()
-    if doubao_urls:
-        # 更新LIBRARY_URLS，保留豆包返回的链接，如果豆包没有返回的则使用默认链接
-        for library_name, url in doubao_urls.items():
+    # 首先获取图书馆年报链接（接口或豆包网页，见 discover_library_urls）
+    discovered_urls = discover_library_urls(config, script_dir)
+    if discovered_urls:
+        # 更新LIBRARY_URLS，保留返回的链接，没有返回的则使用默认链接
+        for library_name, url in discovered_urls.items():
             LIBRARY_URLS[library_name] = url
-        print(f"\n✓ 已更新 {len(doubao_urls)} 个图书馆链接")
+        print(f"\n✓ 已更新 {len(discovered_urls)} 个图书馆链接")
     else:
         print("\n使用默认链接列表")
     
@@ -1104,11 +1351,14 @@ def main():
     fail_count = 0
     
     # 遍历所有图书馆
-    for library_name, url in LIBRARY_URLS.items():
-        if process_library(library_name, url, save_dir):
-            success_count += 1
-        else:
-            fail_count += 1
+    try:
+        for library_name, url in LIBRARY_URLS.items():
+            if process_library(library_name, url, save_dir):
+                success_count += 1
+            else:
+                fail_count += 1
+    finally:
+        close_session()
     
     # 输出统计信息
     print("\n" + "=" * 60)
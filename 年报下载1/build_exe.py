@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 """
 打包脚本：将批量执行.py打包成exe文件
-使用方法：python build_exe.py
+使用方法：
+    python build_exe.py                  打包为单目录（dist/批量执行/，启动快，推荐）
+    python build_exe.py --onefile        打包为单个exe文件（每次启动先解压到临时文件夹，启动慢）
+    python build_exe.py --skip-profile   不检查启动耗时（默认打包前运行 common/import_profile.py）
 """
 
 import os
@@ -27,8 +30,16 @@ def install_pyinstaller():
         print(f"✗ PyInstaller安装失败: {e}")
         return False
 
-def build_exe():
-    """打包exe文件"""
+def check_import_profile(script_dir):
+    """打包前检查启动耗时：超出预算或启动时导入了pandas/selenium等包时不打包"""
+    print("检查启动耗时（python -m common.import_profile）...")
+    print("-" * 60)
+    result = subprocess.run([sys.executable, '-m', 'common.import_profile'], cwd=script_dir)
+    print("-" * 60)
+    return result.returncode == 0
+
+def build_exe(onefile=False):
+    """打包exe文件（onefile=False 时打包为单目录）"""
     script_dir = os.path.dirname(os.path.abspath(__file__))
     script_file = os.path.join(script_dir, '批量执行.py')
     
@@ -41,16 +52,19 @@ def build_exe():
     print("=" * 60)
     
     # PyInstaller命令参数
-    # --onefile: 打包成单个exe文件
+    # --onedir: 打包成文件夹（exe + _internal运行时），启动时直接导入，不需要解压；
+    #           插件模式的工作进程也使用同一个运行时文件夹
+    # --onefile: 打包成单个exe文件，每次启动（包括每个插件工作进程）都要先解压到临时文件夹
     # --windowed 或 -w: 不显示控制台窗口
     # --name: 指定输出文件名
     # --icon: 可以指定图标文件（如果有的话）
     # --add-data: 添加数据文件（如果需要）
     # --hidden-import: 隐藏导入的模块
+    # --collect-submodules: 收集整个包（图书馆脚本在运行时才导入 common 中的模块）
     
     cmd = [
         'pyinstaller',
-        '--onefile',           # 打包成单个文件
+        '--onefile' if onefile else '--onedir',
         '--windowed',          # 不显示控制台窗口
         '--name=批量执行',      # 输出文件名
         '--clean',              # 清理临时文件
@@ -60,6 +74,15 @@ def build_exe():
         '--hidden-import=openpyxl',
         '--hidden-import=xlrd',
         '--hidden-import=xlsxwriter',
+        # 插件模式下图书馆脚本在exe进程内导入，需要打包脚本用到的依赖
+        '--hidden-import=requests',
+        '--hidden-import=urllib3',
+        '--hidden-import=bs4',
+        '--hidden-import=lxml.html',
+        '--hidden-import=selenium',
+        '--hidden-import=PIL',
+        # pandas、selenium 等在函数中按需导入，批量执行.py 本身不导入的 common 模块也需要打包
+        '--collect-submodules=common',
         # 添加数据文件（如果需要）
         # f'--add-data={os.path.join(script_dir, "是否下载.xlsx")};.',
         script_file
@@ -75,13 +98,21 @@ def build_exe():
             print("✓ 打包成功!")
             print("=" * 60)
             dist_dir = os.path.join(script_dir, 'dist')
-            exe_file = os.path.join(dist_dir, '批量执行.exe')
+            if onefile:
+                exe_file = os.path.join(dist_dir, '批量执行.exe')
+            else:
+                dist_dir = os.path.join(dist_dir, '批量执行')
+                exe_file = os.path.join(dist_dir, '批量执行.exe')
             if os.path.exists(exe_file):
                 print(f"exe文件位置: {exe_file}")
-                print(f"文件大小: {os.path.getsize(exe_file) / 1024 / 1024:.2f} MB")
+                print(f"文件大小: {get_size(exe_file if onefile else dist_dir) / 1024 / 1024:.2f} MB")
             print("\n提示:")
-            print("1. exe文件在 dist 文件夹中")
-            print("2. 将exe文件与所有图书馆脚本放在同一目录")
+            if onefile:
+                print("1. exe文件在 dist 文件夹中")
+                print("2. 将exe文件与所有图书馆脚本放在同一目录")
+            else:
+                print("1. exe文件和运行时文件夹 _internal 在 dist/批量执行 文件夹中，需要整个文件夹一起分发")
+                print("2. 将所有图书馆脚本放在exe所在的文件夹中")
             print("3. 确保目录中有'是否下载.xlsx'文件")
             print("4. 运行exe文件，日志会保存在 logs 文件夹中")
             return True
@@ -95,6 +126,16 @@ def build_exe():
         traceback.print_exc()
         return False
 
+def get_size(path):
+    """文件或文件夹的大小（字节）"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
 def main():
     """主函数"""
     print("批量执行脚本打包工具")
@@ -108,8 +149,14 @@ def main():
             print("  pip install pyinstaller")
             return
     
+    # 打包前检查启动耗时
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if '--skip-profile' not in sys.argv and not check_import_profile(script_dir):
+        print("\n✗ 启动耗时检查未通过，请先处理上面的问题（或使用 --skip-profile 跳过检查）")
+        return
+    
     # 打包
-    build_exe()
+    build_exe(onefile='--onefile' in sys.argv)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+年报下载公共模块
+说明：供批量执行.py和各图书馆脚本共用的功能，放在子目录中，
+     不会被批量执行.py当作图书馆脚本执行
+"""
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+异步抓取引擎
+功能：
+1. 基于asyncio的HTTP客户端，带连接池和按主机的并发限制
+   （安装了aiohttp时使用aiohttp，否则在线程中使用requests，接口相同）
+2. first_match()：并发探测多个候选URL / 访问多个子页面，按原有顺序返回第一个找到的结果，
+   与原来逐个尝试的结果一致
+3. 图书馆脚本中通过 run_first_match() 同步调用；批量执行.py 的异步模式下，
+   所有图书馆共用同一个引擎（同一个连接池和主机限制）
+4. run_library_async()：图书馆脚本本身仍是同步代码，在线程池中运行（批量执行.py 在事件循环中同时等待多个图书馆），
+   只有脚本中通过 run_first_match() 发出的探测请求由引擎异步发送
+5. 引擎发出的请求与 common/sessions.py 的连接池共用按主机限速器（host_interval），
+   并记录到当前图书馆的请求统计（common/metrics.py；连接阶段不单独计时，全部计入首字节时间）
+"""
+
+import time
+import asyncio
+import functools
+import contextvars
+import inspect
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from common import metrics, replay
+from common.sessions import get_host_limiter
+
+# aiohttp 在引擎启动时才导入，导入本模块的图书馆脚本启动时不加载aiohttp
+AIOHTTP_AVAILABLE = importlib.util.find_spec('aiohttp') is not None
+
+# 批量执行.py 异步模式下共用的引擎（在协程上下文中传递给图书馆脚本）
+_current_engine = contextvars.ContextVar('nianbao_async_engine', default=None)
+
+MAX_REDIRECTS = 10
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+def _host_of(item):
+    """从候选项（URL字符串或包含url的字典）中获取主机名"""
+    url = item.get('url') if isinstance(item, dict) else item
+    if isinstance(url, str):
+        return urlparse(url).hostname or ''
+    return ''
+
+
+def _build_response(status, headers, url, content, method):
+    """构造 requests.Response，调用方可以照常使用 status_code、headers、text、apparent_encoding"""
+    response = requests.models.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response.url = url
+    response._content = content
+    response.request = requests.Request(method, url).prepare()
+    return response
+
+
+class AsyncEngine:
+    """
+    异步HTTP引擎
+
+    参数:
+        headers: 默认请求头
+        limit: 连接池总连接数
+        per_host_limit: 同一主机的最大并发请求数
+        timeout: 默认超时（秒）
+        verify: 是否校验SSL证书（各图书馆脚本都关闭了校验）
+    """
+
+    def __init__(self, headers=None, limit=16, per_host_limit=4, timeout=30, verify=False):
+        self.headers = dict(headers or {})
+        self.limit = max(1, int(limit))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.timeout = timeout
+        self.verify = verify
+        self.loop = None
+        self._session = None
+        self._host_semaphores = {}
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if AIOHTTP_AVAILABLE:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.per_host_limit, ssl=None if self.verify else False)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+        else:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            adapter = HTTPAdapter(pool_connections=self.limit, pool_maxsize=self.limit)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+
+    async def close(self):
+        if self._session is None:
+            return
+        if AIOHTTP_AVAILABLE:
+            await self._session.close()
+        else:
+            self._session.close()
+        self._session = None
+
+    def _host_semaphore(self, host):
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def fetch(self, method, url, headers=None, timeout=None, allow_redirects=True, read_body=True):
+        """
+        发送请求，返回 requests.Response（read_body=False 时只读取响应头，用于探测URL）
+        """
+        if not replay.active():
+            return await self._fetch_once(method, url, headers, timeout, allow_redirects, read_body)
+        # 录制/回放时逐跳处理重定向，每一跳都单独录制，回放时不会跳到真实网站
+        for _ in range(MAX_REDIRECTS):
+            response = await self._fetch_once(method, url, headers, timeout, False, read_body)
+            location = response.headers.get('Location')
+            if not allow_redirects or response.status_code not in REDIRECT_STATUSES or not location:
+                return response
+            url = urljoin(url, location)
+            if response.status_code == 303:
+                method = 'GET'
+        return response
+
+    async def _fetch_once(self, method, url, headers, timeout, allow_redirects, read_body):
+        timeout = timeout or self.timeout
+        send_url, send_headers = replay.rewrite(url, headers)
+        host = (urlparse(url).hostname or '').lower()
+        async with self._host_semaphore(host):
+            # 与 sessions.PoliteAdapter 相同的按主机限速，异步等待不占用线程
+            delay = get_host_limiter().reserve(host) if host else 0.0
+            if delay > 0:
+                await asyncio.sleep(delay)
+                metrics.add_time('host_wait', delay)
+            start = time.perf_counter()
+            if AIOHTTP_AVAILABLE:
+                import aiohttp
+                async with self._session.request(
+                        method, send_url, headers=send_headers, allow_redirects=allow_redirects,
+                        timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                    ttfb = time.perf_counter() - start
+                    content = await resp.read() if read_body and method != 'HEAD' else b''
+                    response = _build_response(resp.status, dict(resp.headers),
+                                               url if send_url != url else str(resp.url), content, method)
+            else:
+                def blocking():
+                    with self._session.request(method, send_url, headers=send_headers, timeout=timeout,
+                                               allow_redirects=allow_redirects, verify=self.verify,
+                                               stream=not read_body) as resp:
+                        content = resp.content if read_body and method != 'HEAD' else b''
+                        # elapsed 为发送请求到收到响应头的时间
+                        return resp.elapsed.total_seconds(), _build_response(
+                            resp.status_code, dict(resp.headers),
+                            url if send_url != url else resp.url, content, method)
+
+                ttfb, response = await asyncio.to_thread(blocking)
+            run_metrics = metrics.current()
+            if run_metrics is not None:
+                run_metrics.add_request(method, url, response.status_code, ttfb)
+        replay.record(method, url, headers, response.status_code, response.headers,
+                      response.content if read_body or method == 'HEAD' else None)
+        return response
+
+    async def get(self, url, **kwargs):
+        return await self.fetch('GET', url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        return await self.fetch('HEAD', url, **kwargs)
+
+    async def _run_check(self, check, item):
+        if inspect.iscoroutinefunction(check):
+            return await check(self, item)
+        # 同步检查函数（内部使用requests访问子页面）在线程中运行，同样受主机并发限制
+        async with self._host_semaphore(_host_of(item)):
+            return await asyncio.to_thread(check, item)
+
+    async def first_match(self, items, check):
+        """
+        并发执行 check(item)，返回按 items 顺序第一个非None的结果（都没有找到时返回None）
+
+        check 可以是协程函数 check(engine, item)，也可以是普通函数 check(item)；
+        单个候选出错视为未找到，确定结果后取消其余的探测
+        """
+        items = list(items)
+        if not items:
+            return None
+        tasks = [asyncio.ensure_future(self._run_check(check, item)) for item in items]
+        try:
+            for task in tasks:
+                try:
+                    result = await task
+                except Exception as e:
+                    print(f"  探测失败: {e}")
+                    result = None
+                if result is not None:
+                    return result
+            return None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+def run_first_match(items, check, headers=None):
+    """
+    供图书馆脚本同步调用的 first_match()
+
+    批量执行.py 异步模式下使用共用的引擎；单独运行脚本时临时创建一个引擎
+    """
+    engine = _current_engine.get()
+    if engine is not None and engine.loop is not None and engine.loop.is_running():
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is not engine.loop:
+            # 从工作线程提交到引擎所在的事件循环（会带上当前线程的上下文，输出仍按图书馆分别记录）
+            future = asyncio.run_coroutine_threadsafe(engine.first_match(items, check), engine.loop)
+            return future.result()
+
+    async def standalone():
+        async with AsyncEngine(headers=headers) as temp_engine:
+            return await temp_engine.first_match(items, check)
+
+    return asyncio.run(standalone())
+
+
+async def run_library_async(engine, script_path, config=None, timeout=600, executor=None):
+    """
+    以协程方式运行图书馆脚本（查找+下载），脚本中的并发探测使用 engine
+
+    参数:
+        executor: 运行脚本的线程池；批量运行时应与探测使用的默认线程池分开，避免互相等待
+
+    返回值与 PluginPool.run() 相同：{'returned', 'output', 'stderr', 'error'[, 'timeout']}
+    """
+    from common.plugin_runner import run_captured, install_output_capture
+
+    install_output_capture()
+    loop = asyncio.get_running_loop()
+    token = _current_engine.set(engine)
+    try:
+        # 复制当前上下文，脚本在工作线程中也能取到共用的引擎
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, run_captured, script_path, config)
+        return await asyncio.wait_for(loop.run_in_executor(executor, call), timeout)
+    except asyncio.TimeoutError:
+        # 线程无法强制结束，放弃等待
+        return {'returned': None, 'output': '', 'error': None, 'timeout': True}
+    finally:
+        _current_engine.reset(token)
+
+
+async def run_libraries_async(tasks, on_done, max_workers=4, per_host_limit=4, timeout=600, log=print):
+    """
+    异步批量运行图书馆脚本
+
+    参数:
+        tasks: 任务列表，每个任务是包含 name、script_path、priority 的字典
+        on_done: 任务完成回调 on_done(task, run)，run 为 run_library_async() 的返回值
+        max_workers: 同时运行的图书馆数
+        per_host_limit: 共用引擎中同一主机的最大并发请求数
+    """
+    tasks = sorted(tasks, key=lambda t: t.get('priority', 0))
+    slots = asyncio.Semaphore(max(1, int(max_workers)))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix='library')
+    try:
+        async with AsyncEngine(limit=max(16, max_workers * per_host_limit), per_host_limit=per_host_limit) as engine:
+            async def run_one(task):
+                async with slots:
+                    log(f"  → 启动: {task['name']}")
+                    try:
+                        run = await run_library_async(engine, task['script_path'], timeout=timeout, executor=executor)
+                    except Exception as e:
+                        run = {'returned': None, 'output': '', 'error': str(e)}
+                on_done(task, run)
+
+            await asyncio.gather(*(run_one(task) for task in tasks))
+    finally:
+        # 超时的脚本线程无法结束，不等待
+        executor.shutdown(wait=False)
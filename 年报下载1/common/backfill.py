@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+多年份补齐下载
+功能：
+1. 从图书馆脚本的 main() 中读取年报页面地址（report_page_url / detail_page_url）和文件名格式
+   （使用站点配置的脚本读取 SiteProfile 的 entry_url / file_prefix），不需要修改各图书馆脚本
+2. 每个年报页面只请求一次，页面中的所有年报链接按年份分类，一次得到年份范围内所有年份的候选链接
+3. 候选链接不是PDF时进入详情页（每个链接只请求一次）查找PDF；页面中没有的年份再按往年的地址规律预测
+4. 年报页面、详情页和年报文件都通过同一个线程池并发请求（图书馆之间仍逐个查找），
+   台账中尚未下载的年份下载后写入下载台账（与正常运行相同的记录方式）
+
+请求次数与页面数量成正比，与年份数量无关。需要浏览器才能显示内容的网站（例如页面地址带 #/ 的），
+页面中找不到链接，这些年份记为未找到
+"""
+
+import os
+import re
+import ast
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+import requests
+import urllib3
+from bs4 import BeautifulSoup
+
+from common.html_links import detect_encoding, extract_links
+from common.sessions import get_session
+from common.http_cache import cached_get, open_download, save_response
+from common.result import begin_report, STATUS_SUCCESS, STATUS_FAILED, STATUS_NOT_FOUND
+from common.url_index import predict_urls, is_pdf_url
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# 链接文字中包含这些关键词才视为年报（与各图书馆脚本的判断一致）
+REPORT_KEYWORDS = ('年报', '年度报告', '工作报告', '决算')
+
+_PAGE_VARIABLES = ('report_page_url', 'detail_page_url')
+_YEAR_VARIABLES = ('last_year_str', 'target_year', 'year_for_filename')
+_YEAR_RE = re.compile(r'(?<!\d)(?:19|20)\d{2}(?!\d)')
+
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8,application/pdf',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+}
+
+
+def parse_year_range(text):
+    """解析年份范围：'2019-2023' 或 '2019,2021,2023'，返回升序的年份字符串列表"""
+    years = set()
+    for part in str(text).replace('，', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+            years.update(range(min(start, end), max(start, end) + 1))
+        else:
+            years.add(int(part))
+    return [str(year) for year in sorted(years)]
+
+
+# ---------------------------------------------------------------------------
+# 读取图书馆脚本中的页面地址
+# ---------------------------------------------------------------------------
+
+def _template_of(node):
+    """把字符串常量或只引用年份变量的f-string转换为模板（年份写作 {year}），其他情况返回None"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value.replace('{', '{{').replace('}', '}}')
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(str(value.value).replace('{', '{{').replace('}', '}}'))
+            elif (isinstance(value, ast.FormattedValue) and isinstance(value.value, ast.Name)
+                  and value.value.id in _YEAR_VARIABLES):
+                parts.append('{year}')
+            else:
+                return None
+        return ''.join(parts)
+    return None
+
+
+def read_site_info(script_path):
+    """
+    从图书馆脚本的 main() 或站点配置中读取年报页面地址模板和文件名前缀
+
+    返回 {'pages': [页面地址模板], 'prefix': 文件名前缀}，没有找到页面地址时 pages 为空
+    """
+    with open(script_path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=script_path)
+    library = os.path.splitext(os.path.basename(script_path))[0]
+    info = {'pages': [], 'prefix': library}
+    for node in ast.walk(tree):
+        # 使用站点配置的脚本（common/site_profile.py）：PROFILE = SiteProfile(entry_url=..., file_prefix=...)
+        if isinstance(node, ast.Call) and getattr(node.func, 'id', None) == 'SiteProfile':
+            for keyword in node.keywords:
+                template = _template_of(keyword.value)
+                if keyword.arg == 'entry_url' and template and template not in info['pages']:
+                    info['pages'].append(template)
+                elif keyword.arg == 'file_prefix' and isinstance(keyword.value, ast.Constant):
+                    info['prefix'] = keyword.value.value
+            continue
+        if not (isinstance(node, ast.FunctionDef) and node.name == 'main'):
+            continue
+        for stmt in ast.walk(node):
+            if not (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1
+                    and isinstance(stmt.targets[0], ast.Name)):
+                continue
+            name = stmt.targets[0].id
+            if name in _PAGE_VARIABLES:
+                template = _template_of(stmt.value)
+                if template and template not in info['pages']:
+                    info['pages'].append(template)
+            elif name == 'filename' and isinstance(stmt.value, ast.JoinedStr):
+                # 例如 f"中国国家图书馆{year_for_filename}年年报.pdf"
+                first = stmt.value.values[0] if stmt.value.values else None
+                if isinstance(first, ast.Constant) and '年年报' in ast.unparse(stmt.value):
+                    info['prefix'] = first.value
+    return info
+
+
+# ---------------------------------------------------------------------------
+# 链接分类
+# ---------------------------------------------------------------------------
+
+def _pdf_path(url):
+    """地址的路径以 .pdf 结尾（只看地址，不发请求；确认内容用 url_index.is_pdf_url）"""
+    return urlparse(url).path.lower().endswith('.pdf')
+
+
+def classify_links(html, page_url, years):
+    """
+    把页面中的年报链接按年份分类，返回 {年份: [链接, ...]}（直接指向PDF的链接排在前面）
+
+    年份优先从链接文字中取，文字中没有年份时从链接地址中取
+    """
+    wanted = set(years)
+    found = {}
+    for link in extract_links(html):
+        href = link.href.strip()
+        if not href or href.startswith(('javascript:', '#', 'mailto:')):
+            continue
+        text = ' '.join(filter(None, [link.text, link.title]))
+        url = urljoin(page_url, href)
+        if not (any(keyword in text for keyword in REPORT_KEYWORDS) or _pdf_path(url)):
+            continue
+        text_years = [y for y in _YEAR_RE.findall(text) if y in wanted]
+        url_years = [y for y in _YEAR_RE.findall(urlparse(url).path) if y in wanted]
+        candidates = text_years or url_years
+        if not candidates:
+            continue
+        links = found.setdefault(candidates[0], [])
+        if url not in links:
+            links.append(url)
+    for links in found.values():
+        links.sort(key=lambda u: not _pdf_path(u))
+    return found
+
+
+def _find_pdf_in_page(html, page_url, year):
+    """在详情页中查找PDF链接（链接、iframe、embed），优先选择包含年份的"""
+    soup = BeautifulSoup(html, 'html.parser')
+    candidates = []
+    for tag in soup.find_all(['a', 'iframe', 'embed', 'object']):
+        src = tag.get('href') or tag.get('src') or tag.get('data')
+        if not src:
+            continue
+        url = urljoin(page_url, src.strip())
+        if _pdf_path(url):
+            text = tag.get_text(' ', strip=True) if tag.name == 'a' else ''
+            candidates.append((year not in text and year not in url, url))
+    candidates.sort(key=lambda item: item[0])
+    return candidates[0][1] if candidates else None
+
+
+# ---------------------------------------------------------------------------
+# 补齐下载
+# ---------------------------------------------------------------------------
+
+class _LibraryBackfill:
+    """一个图书馆的补齐任务"""
+
+    def __init__(self, library, output_folder, log):
+        self.library = library
+        self.output_folder = output_folder
+        self.log = log
+        self.session = get_session(_HEADERS)
+        self.fetched = {}
+        self._lock = threading.Lock()
+        self._url_locks = {}
+
+    def fetch(self, url):
+        """请求页面（同一地址只请求一次，多个线程同时请求时后到的等待结果），失败时返回None"""
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            if url in self.fetched:
+                return self.fetched[url]
+            html = None
+            try:
+                response = cached_get(self.session, url, timeout=30, verify=False)
+                if response.status_code == 200:
+                    response.encoding = detect_encoding(response)
+                    html = response.text
+                else:
+                    self.log(f"  ✗ 页面返回状态码 {response.status_code}: {url}")
+            except requests.RequestException as e:
+                self.log(f"  ✗ 访问页面失败: {url} ({e})")
+            self.fetched[url] = html
+            return html
+
+    def collect(self, years, page_templates, executor):
+        """通过线程池同时请求年报页面，返回 {年份: (页面地址, [候选链接])}"""
+        pages = []
+        for template in page_templates:
+            if '{year}' in template:
+                # 页面地址本身按年份区分（例如大连图书馆），只请求需要的年份
+                pages.extend((template.format(year=year), [year]) for year in years)
+            else:
+                pages.append((template.format(), years))
+        candidates = {}
+        # 按页面顺序合并结果，先列出的页面中的链接排在前面
+        htmls = executor.map(self.fetch, [page_url for page_url, _ in pages])
+        for (page_url, page_years), html in zip(pages, htmls):
+            if html is None:
+                continue
+            for year, links in classify_links(html, page_url, page_years).items():
+                if year not in candidates:
+                    candidates[year] = (page_url, links)
+                else:
+                    candidates[year][1].extend(u for u in links if u not in candidates[year][1])
+        return candidates
+
+    def resolve(self, year, links):
+        """从候选链接中得到PDF地址：直接是PDF的优先，否则进入详情页查找"""
+        for url in links:
+            if _pdf_path(url):
+                return url
+        for url in links:
+            html = self.fetch(url)
+            if html:
+                pdf_url = _find_pdf_in_page(html, url, year)
+                if pdf_url:
+                    return pdf_url
+        return None
+
+    def download(self, year, file_url, page_url, prefix, predicted=False):
+        """下载某年份的年报，返回结果字典（common/result.py 格式）"""
+        report = begin_report(self.library)
+        report.page = page_url
+        report.predicted = predicted
+        file_path = os.path.join(self.output_folder, f"{prefix}{year}年年报.pdf")
+        try:
+            with report.phase('download'):
+                os.makedirs(self.output_folder, exist_ok=True)
+                response = open_download(self.session, file_url, timeout=60, verify=False)
+                if not response.not_modified:
+                    response.raise_for_status()
+                file_size = save_response(response, file_path)
+            self.log(f"  ✓ {self.library} {year}年: {file_size:,} 字节 -> {file_path}")
+            return report.finish(STATUS_SUCCESS, year=year, url=file_url, path=file_path)
+        except Exception as e:
+            self.log(f"  ✗ {self.library} {year}年下载失败: {e}")
+            return report.finish(STATUS_FAILED, year=year, url=file_url, error=str(e))
+
+
+def run_backfill(script_dir, scripts, years, ledger, output_folder, max_workers=4, log=print):
+    """
+    补齐多个图书馆多个年份的年报
+
+    页面请求、详情页查找和下载共用一个线程池（max_workers 个线程）；图书馆之间按顺序查找，
+    前一个图书馆的下载与后一个图书馆的页面请求同时进行
+
+    参数:
+        scripts: 图书馆脚本文件名列表
+        years: 年份字符串列表
+        ledger: 下载台账（跳过已下载的年份，记录结果）
+
+    返回 {'success': n, 'failed': n, 'not_found': n, 'skipped': n}
+    """
+    stats = {'success': 0, 'failed': 0, 'not_found': 0, 'skipped': 0}
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+        futures = []
+        for script_name in scripts:
+            library = os.path.splitext(script_name)[0]
+            missing = [year for year in years if not ledger.is_downloaded(library, year)]
+            stats['skipped'] += len(years) - len(missing)
+            if not missing:
+                continue
+
+            info = read_site_info(os.path.join(script_dir, script_name))
+            job = _LibraryBackfill(library, output_folder, log)
+            log(f"\n{library}: 需要补齐 {', '.join(missing)}")
+            candidates = job.collect(missing, info['pages'], executor)
+
+            # 各年份的详情页也通过线程池同时查找
+            lookups = [(year, candidates[year][0], executor.submit(job.resolve, year, candidates[year][1]))
+                       for year in missing if candidates.get(year, (None, []))[1]]
+            resolved = {}
+            for year, page_url, future in lookups:
+                file_url = future.result()
+                if file_url:
+                    resolved[year] = (page_url, file_url, False)
+
+            # 页面中没有的年份：按本次找到的和台账中往年的地址规律预测，确认是PDF后才下载
+            known = [(year, item[1]) for year, item in resolved.items()]
+            known += [(row['year'], row['file_url']) for row in ledger.get_report_urls(library)]
+            known += [(row['year'], row['url']) for row in ledger.get_downloaded_urls(library)]
+            for year in missing:
+                if year in resolved:
+                    continue
+                for url in predict_urls(library, year, known):
+                    if is_pdf_url(job.session, url):
+                        resolved[year] = (candidates.get(year, (None,))[0], url, True)
+                        break
+
+            for year in missing:
+                if year not in resolved:
+                    log(f"  - {library} {year}年: 页面中未找到年报链接")
+                    report = begin_report(library)
+                    ledger.record_attempt(library, year, report.finish(STATUS_NOT_FOUND, year=year))
+                    stats['not_found'] += 1
+                    continue
+                page_url, file_url, predicted = resolved[year]
+                futures.append((library, year, executor.submit(
+                    job.download, year, file_url, page_url, info['prefix'], predicted)))
+
+        for library, year, future in futures:
+            result = future.result()
+            ledger.record_attempt(library, year, result)
+            stats['success' if result['status'] == STATUS_SUCCESS else 'failed'] += 1
+    return stats
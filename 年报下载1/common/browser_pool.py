@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+浏览器预热池（Selenium / Chrome）
+功能：
+1. 每个进程保留若干个已启动的Chrome，图书馆脚本租用浏览器，不再每次启动新的Chrome
+2. 按启动参数区分浏览器（无头/有头、下载目录等不同的脚本不会混用同一个浏览器）
+3. 脚本调用 driver.quit() 时归还浏览器：关闭多余窗口，清除Cookie、缓存和访问过的站点的存储，
+   恢复默认超时，回到空白页；清理失败的浏览器直接关闭
+4. 租用前检查浏览器是否仍然可用，崩溃的浏览器自动丢弃并重新启动；使用次数过多的浏览器定期重启
+5. 进程退出时关闭所有浏览器
+6. 启动浏览器的耗时和租用时长计入运行统计的 browser_start、browser（common/metrics.py）
+
+环境变量 NIANBAO_BROWSER_POOL：
+    未设置或为空  每个进程最多保留 2 个空闲浏览器
+    0 / off       不复用浏览器（driver.quit() 直接关闭）
+    其他数字      最多保留的空闲浏览器数
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+import importlib.util
+from urllib.parse import urlparse
+
+from common import metrics
+
+# selenium 在第一次启动浏览器时才导入（批量执行.py 和不使用浏览器的脚本启动时不加载selenium）
+SELENIUM_AVAILABLE = importlib.util.find_spec('selenium') is not None
+
+BROWSER_POOL_ENV = 'NIANBAO_BROWSER_POOL'
+DEFAULT_POOL_SIZE = 2
+MAX_USES = 30                 # 同一个浏览器最多租用的次数，超过后关闭重启，避免内存占用持续增长
+
+DEFAULT_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                      '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+# WebDriver 的默认超时（秒），归还时恢复，避免上一个脚本的设置影响下一个脚本
+_DEFAULT_PAGE_LOAD_TIMEOUT = 300
+_DEFAULT_SCRIPT_TIMEOUT = 30
+
+
+def get_pool_size():
+    """获取每个进程最多保留的空闲浏览器数，0表示不复用"""
+    value = os.environ.get(BROWSER_POOL_ENV, '').strip()
+    if not value:
+        return DEFAULT_POOL_SIZE
+    if value.lower() in ('off', 'false', 'no', '否'):
+        return 0
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return DEFAULT_POOL_SIZE
+
+
+def standard_options():
+    """大多数图书馆脚本使用的无头Chrome启动参数"""
+    from selenium.webdriver.chrome.options import Options
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument(f'--user-agent={DEFAULT_USER_AGENT}')
+    chrome_options.add_argument('--log-level=3')
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    return chrome_options
+
+
+def _profile_key(chrome_options):
+    """根据启动参数生成浏览器分组的键（参数相同的脚本才共用浏览器）"""
+    return json.dumps({
+        'arguments': sorted(chrome_options.arguments),
+        'experimental': chrome_options.experimental_options,
+        'binary': chrome_options.binary_location,
+    }, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _origin_of(url):
+    parsed = urlparse(url or '')
+    if parsed.scheme in ('http', 'https') and parsed.netloc:
+        return f'{parsed.scheme}://{parsed.netloc}'
+    return None
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class PooledDriver:
+    """
+    租用的浏览器
+
+    其他属性和方法都转发给实际的 WebDriver；quit() 归还到浏览器池，而不是关闭浏览器
+    """
+
+    def __init__(self, pool, driver, key):
+        self._pool = pool
+        self._driver = driver
+        self._key = key
+        self._origins = set()
+        self._released = False
+        self._leased_at = time.perf_counter()
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def get(self, url):
+        origin = _origin_of(url)
+        if origin:
+            self._origins.add(origin)
+        return self._driver.get(url)
+
+    def quit(self):
+        if self._released:
+            return
+        self._released = True
+        metrics.add_time('browser', time.perf_counter() - self._leased_at)
+        self._pool.release(self)
+
+
+class _Entry:
+    """池中的一个浏览器"""
+
+    def __init__(self, driver, key):
+        self.driver = driver
+        self.key = key
+        self.uses = 0
+        self.idle_since = time.time()
+
+
+class BrowserPool:
+    """
+    浏览器池
+
+    参数:
+        size: 最多保留的空闲浏览器数（所有启动参数合计）
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE):
+        self.size = size
+        self._idle = []
+        self._entries = {}    # id(driver) -> _Entry，包括正在使用的浏览器
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _start(self, chrome_options, key):
+        from selenium import webdriver
+        start = time.perf_counter()
+        driver = webdriver.Chrome(options=chrome_options)
+        metrics.add_time('browser_start', time.perf_counter() - start)
+        entry = _Entry(driver, key)
+        with self._lock:
+            self._entries[id(driver)] = entry
+        return entry
+
+    def _discard(self, entry):
+        with self._lock:
+            self._entries.pop(id(entry.driver), None)
+        _quit(entry.driver)
+
+    def _take_idle(self, key):
+        """取出一个同组的空闲浏览器（最近归还的优先），没有时返回None"""
+        with self._lock:
+            for index in range(len(self._idle) - 1, -1, -1):
+                if self._idle[index].key == key:
+                    return self._idle.pop(index)
+        return None
+
+    def acquire(self, chrome_options=None):
+        """租用浏览器，返回 PooledDriver"""
+        chrome_options = chrome_options or standard_options()
+        key = _profile_key(chrome_options)
+        while True:
+            entry = self._take_idle(key)
+            if entry is None:
+                entry = self._start(chrome_options, key)
+                break
+            try:
+                # 检查浏览器是否仍然可用（崩溃或被关闭的浏览器丢弃后重新取）
+                entry.driver.execute_script('return 1')
+                break
+            except Exception:
+                print("  ⚠️  预热的浏览器已失效，重新启动")
+                self._discard(entry)
+        entry.uses += 1
+        return PooledDriver(self, entry.driver, key)
+
+    def release(self, pooled):
+        """归还浏览器：清理后放回空闲列表，清理失败或超过数量时关闭"""
+        with self._lock:
+            entry = self._entries.get(id(pooled._driver))
+        if entry is None:
+            _quit(pooled._driver)
+            return
+        if self._closed or self.size <= 0 or entry.uses >= MAX_USES:
+            self._discard(entry)
+            return
+        try:
+            self._reset(pooled)
+        except Exception:
+            self._discard(entry)
+            return
+
+        evicted = []
+        with self._lock:
+            entry.idle_since = time.time()
+            self._idle.append(entry)
+            while len(self._idle) > self.size:
+                evicted.append(self._idle.pop(0))
+        for old in evicted:
+            self._discard(old)
+
+    def _reset(self, pooled):
+        """清除上一个脚本留下的窗口、Cookie、缓存和站点存储"""
+        driver = pooled._driver
+        handles = driver.window_handles
+        origins = set(pooled._origins)
+        for handle in handles:
+            driver.switch_to.window(handle)
+            origin = _origin_of(driver.current_url)
+            if origin:
+                origins.add(origin)
+            if handle != handles[0]:
+                driver.close()
+        driver.switch_to.window(handles[0])
+
+        for origin in origins:
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+
+        driver.implicitly_wait(0)
+        driver.set_page_load_timeout(_DEFAULT_PAGE_LOAD_TIMEOUT)
+        driver.set_script_timeout(_DEFAULT_SCRIPT_TIMEOUT)
+        driver.get('about:blank')
+
+    def warm_up(self, count=1, chrome_options=None):
+        """预先启动浏览器放入空闲列表，返回启动的数量"""
+        chrome_options = chrome_options or standard_options()
+        key = _profile_key(chrome_options)
+        started = 0
+        for _ in range(max(0, min(count, self.size))):
+            try:
+                entry = self._start(chrome_options, key)
+            except Exception as e:
+                print(f"⚠️  预热浏览器失败: {e}")
+                break
+            with self._lock:
+                self._idle.append(entry)
+            started += 1
+        return started
+
+    def close(self):
+        """关闭所有浏览器（包括仍在使用的）"""
+        with self._lock:
+            self._closed = True
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._idle.clear()
+        for entry in entries:
+            _quit(entry.driver)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取当前进程的浏览器池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(get_pool_size())
+            atexit.register(_pool.close)
+        return _pool
+
+
+def lease_driver(chrome_options=None):
+    """
+    按启动参数租用浏览器（代替 webdriver.Chrome(options=chrome_options)）
+
+    用法不变：脚本结束时照常调用 driver.quit()，浏览器归还到池中；
+    NIANBAO_BROWSER_POOL=0 时直接启动新的浏览器
+    """
+    if not SELENIUM_AVAILABLE:
+        raise RuntimeError("未安装selenium，无法启动浏览器")
+    if get_pool_size() <= 0:
+        from selenium import webdriver
+        with metrics.timed('browser_start'):
+            return webdriver.Chrome(options=chrome_options or standard_options())
+    return get_pool().acquire(chrome_options)
+
+
+def warm_up(count=None):
+    """预先启动无头浏览器（批量执行.py 在插件线程模式、异步模式下调用），返回启动的数量"""
+    if not SELENIUM_AVAILABLE or get_pool_size() <= 0:
+        return 0
+    pool = get_pool()
+    return pool.warm_up(pool.size if count is None else count)
+
+
+def shutdown_pool():
+    """关闭当前进程的所有浏览器"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
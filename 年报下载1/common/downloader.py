@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+年报文件下载器（断点续传、分段下载）
+功能：
+1. 先写入 <文件名>.part，校验通过后原子重命名为最终文件，中途失败不会留下残缺的年报
+2. 服务器支持 Range 时记录下载进度（<文件名>.part.json），连接中断后下次运行从断点继续
+3. 大文件且服务器声明 Accept-Ranges 时拆分为多个字节区间并行下载
+4. 使用大块读写缓冲，下载完成后校验文件大小和PDF结构（%PDF 文件头、%%EOF 结尾）
+"""
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from common import metrics
+
+PART_SUFFIX = '.part'
+STATE_SUFFIX = '.part.json'
+
+CHUNK_SIZE = 256 * 1024              # 每次从网络读取的大小
+BUFFER_SIZE = 1024 * 1024            # 文件写入缓冲
+SEGMENT_MIN_SIZE = 16 * 1024 * 1024  # 超过该大小才分段并行下载
+MAX_SEGMENTS = 4                     # 最大分段数
+
+
+class DownloadError(Exception):
+    """下载失败或文件校验不通过"""
+
+
+class _RangeRejected(Exception):
+    """服务器没有按Range返回（文件已变化或不支持续传），需要重新下载"""
+
+
+def _remote_info(response):
+    """从响应头获取文件总大小、是否支持Range、验证器（ETag或Last-Modified）"""
+    headers = response.headers
+    encoding = headers.get('Content-Encoding', '').strip().lower()
+    length = headers.get('Content-Length', '').strip()
+    # 经过压缩传输时 Content-Length 是压缩后的大小，无法用于续传和校验
+    total = int(length) if length.isdigit() and encoding in ('', 'identity') else None
+    accept_ranges = headers.get('Accept-Ranges', '').strip().lower() == 'bytes' and bool(total)
+    validator = headers.get('ETag') or headers.get('Last-Modified')
+    return total, accept_ranges, validator
+
+
+def _split(total, count):
+    """把 [0, total) 拆分为 count 个区间 [start, end, done]（end包含在内）"""
+    size = -(-total // count)
+    return [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+
+
+def _save_state(part_path, state):
+    state_path = part_path[:-len(PART_SUFFIX)] + STATE_SUFFIX
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def _load_state(part_path, url, total, validator):
+    """读取断点记录，与当前远程文件不一致（URL、大小或验证器变化）时返回None"""
+    state_path = part_path[:-len(PART_SUFFIX)] + STATE_SUFFIX
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        part_size = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        return None
+    if (state.get('url') != url or state.get('total') != total
+            or state.get('validator') != validator or not state.get('segments')):
+        return None
+    segments = state['segments']
+    if len(segments) == 1:
+        # 单段下载按顺序写入，已完成的字节数以 .part 文件大小为准
+        segments[0][2] = min(part_size, total)
+    elif part_size != total:
+        return None
+    return state
+
+
+def discard_partial(file_path):
+    """删除未完成的 .part 文件和断点记录"""
+    for path in (file_path + PART_SUFFIX, file_path + STATE_SUFFIX):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _fetch_range(session, url, part_path, segment, validator, request_kwargs, on_progress):
+    """下载一个字节区间，写入 .part 文件的对应位置"""
+    start, end, done = segment
+    if start + done > end:
+        return
+    kwargs = dict(request_kwargs or {})
+    headers = dict(kwargs.pop('headers', None) or {})
+    headers['Range'] = f'bytes={start + done}-{end}'
+    # 文件已变化时服务器返回200完整内容，而不是206
+    if validator:
+        headers['If-Range'] = validator
+    headers['Accept-Encoding'] = 'identity'
+    kwargs['stream'] = True
+
+    response = session.get(url, headers=headers, **kwargs)
+    try:
+        if response.status_code != 206:
+            raise _RangeRejected(f"状态码 {response.status_code}")
+        response.raise_for_status()
+        with open(part_path, 'r+b', buffering=BUFFER_SIZE) as f:
+            f.seek(start + done)
+            try:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    remaining = end + 1 - (start + segment[2])
+                    if remaining <= 0:
+                        break
+                    chunk = chunk[:remaining]
+                    f.write(chunk)
+                    segment[2] += len(chunk)
+            finally:
+                f.flush()
+                on_progress()
+    finally:
+        response.close()
+
+
+def _download_segments(session, url, part_path, state, request_kwargs):
+    """按断点记录下载所有未完成的区间（多个区间并行）"""
+    lock = threading.Lock()
+
+    def on_progress():
+        with lock:
+            _save_state(part_path, state)
+
+    segments = [seg for seg in state['segments'] if seg[0] + seg[2] <= seg[1]]
+    if not segments:
+        # 上次已下载完但未来得及改名（进程在校验前退出），直接校验 .part
+        return
+    if len(segments) == 1:
+        _fetch_range(session, url, part_path, segments[0], state['validator'], request_kwargs, on_progress)
+        return
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        futures = [executor.submit(_fetch_range, session, url, part_path, seg,
+                                   state['validator'], request_kwargs, on_progress)
+                   for seg in segments]
+        for future in futures:
+            future.result()
+
+
+def _write_stream(response, part_path):
+    """把已打开的响应按顺序写入 .part 文件"""
+    written = 0
+    with open(part_path, 'wb', buffering=BUFFER_SIZE) as f:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                f.write(chunk)
+                written += len(chunk)
+    return written
+
+
+def verify_file(path, expected_size=None, expect_pdf=False):
+    """
+    校验下载的文件
+
+    大小与 Content-Length 不一致时抛出 DownloadError；expect_pdf 为True时检查 %PDF 文件头，
+    缺少 %%EOF 结尾时：已知大小且一致则只给出警告，否则视为文件不完整
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        raise DownloadError("下载的文件为空")
+    if expected_size is not None and size != expected_size:
+        raise DownloadError(f"文件大小不完整: {size:,}/{expected_size:,} 字节")
+    if not expect_pdf:
+        return size
+    with open(path, 'rb') as f:
+        head = f.read(1024)
+        f.seek(max(0, size - 2048))
+        tail = f.read()
+    if b'%PDF-' not in head:
+        raise DownloadError("文件不是有效的PDF（缺少 %PDF 文件头），可能是错误页面")
+    if b'%%EOF' not in tail:
+        if expected_size is None:
+            raise DownloadError("PDF文件不完整（缺少 %%EOF 结尾）")
+        print("  ⚠️  警告: PDF文件缺少 %%EOF 结尾，文件可能不规范")
+    return size
+
+
+def download_response(response, file_path, session=None, request_kwargs=None,
+                      max_segments=MAX_SEGMENTS, expect_pdf=None):
+    """
+    把已打开的下载响应（stream=True）保存为 file_path，返回文件大小
+
+    参数:
+        response: 已打开的响应，不支持续传或分段时直接使用其内容
+        session: 用于发送Range请求的会话，为None时不续传、不分段
+        request_kwargs: 发送Range请求时使用的参数（timeout、verify、headers等）
+        max_segments: 大文件的最大并行分段数，1表示不分段
+        expect_pdf: 是否按PDF校验，默认根据文件扩展名判断
+    """
+    url = getattr(response, 'cache_url', None) or response.url
+    part_path = file_path + PART_SUFFIX
+    if expect_pdf is None:
+        expect_pdf = file_path.lower().endswith('.pdf')
+
+    total, accept_ranges, validator = _remote_info(response)
+    can_range = accept_ranges and session is not None
+    state = _load_state(part_path, url, total, validator) if can_range else None
+    start = time.perf_counter()
+    done = 0
+
+    try:
+        if state:
+            response.close()
+            done = sum(seg[2] for seg in state['segments'])
+            print(f"  继续未完成的下载: 已完成 {done:,}/{total:,} 字节")
+            _download_segments(session, url, part_path, state, request_kwargs)
+        elif can_range and max_segments > 1 and total >= SEGMENT_MIN_SIZE:
+            response.close()
+            segments = _split(total, max_segments)
+            print(f"  文件较大（{total/1024/1024:.2f} MB），分 {len(segments)} 段并行下载")
+            with open(part_path, 'wb') as f:
+                f.truncate(total)
+            state = {'url': url, 'total': total, 'validator': validator, 'segments': segments}
+            _save_state(part_path, state)
+            _download_segments(session, url, part_path, state, request_kwargs)
+        else:
+            discard_partial(file_path)
+            if can_range:
+                # 先写断点记录，中途断开后可以续传
+                _save_state(part_path, {'url': url, 'total': total, 'validator': validator,
+                                        'segments': [[0, total - 1, 0]]})
+            _write_stream(response, part_path)
+    except _RangeRejected as e:
+        # 远程文件已变化或服务器不再支持续传，丢弃已下载的部分重新下载
+        print(f"  ⚠️  无法续传（{e}），重新下载")
+        done = 0
+        discard_partial(file_path)
+        kwargs = dict(request_kwargs or {})
+        kwargs['stream'] = True
+        with session.get(url, **kwargs) as fresh:
+            fresh.raise_for_status()
+            total, _, _ = _remote_info(fresh)
+            _write_stream(fresh, part_path)
+
+    try:
+        verify_file(part_path, total, expect_pdf)
+    except DownloadError:
+        # 大小不完整时保留 .part 以便续传；已达到完整大小仍校验失败（包括续传时已全部下载的 .part）直接删除
+        if total is None or not can_range or os.path.getsize(part_path) >= total:
+            discard_partial(file_path)
+        raise
+
+    os.replace(part_path, file_path)
+    discard_partial(file_path)
+    size = os.path.getsize(file_path)
+    # 下载量和速度计入运行统计（续传时不包括之前已下载的部分）
+    metrics.add_download(max(0, size - done), time.perf_counter() - start)
+    return size
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+页面编码识别与链接提取
+功能：
+1. detect_encoding()：按 BOM、响应头 charset、页面 <meta> 声明的顺序确定编码（与浏览器一致），
+   都没有时尝试UTF-8，失败再用GB18030；代替 response.apparent_encoding（对整个页面做字符集探测，
+   页面较大时很慢，而且常把GBK页面识别为GB2312，生僻字变成乱码）
+2. extract_links()：只提取页面中的 <a href> 链接，返回 Link(href, text, title) 列表；
+   安装了 lxml 时用lxml解析，否则用标准库的 HTMLParser 逐个处理标签，都不构建BeautifulSoup文档树
+
+Link.text 与 BeautifulSoup 的 link.get_text().strip() 相同，href 为属性原值（未拼接为完整地址）
+
+性能对比见 common/link_bench.py；两者的耗时计入运行统计的 parse（common/metrics.py）
+"""
+
+import re
+import codecs
+from collections import namedtuple
+from html.parser import HTMLParser
+
+from common.metrics import timed
+
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+Link = namedtuple('Link', ['href', 'text', 'title'])
+
+# 只在页面开头查找 <meta> 编码声明（HTML标准规定声明必须在前1024字节内，这里放宽一些）
+META_SCAN_SIZE = 4096
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?\s*([-\w.:]+)', re.I)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([-\w.:]+)', re.I)
+
+# GB2312/GBK 页面统一按超集GB18030解码
+# 响应头中的 ISO-8859-1 等大多是服务器的默认值而不是页面的真实编码，忽略
+_ALIASES = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'x-gbk': 'gb18030', 'gb_2312-80': 'gb18030'}
+_WEAK_HEADER_CHARSETS = ('iso-8859-1', 'latin-1', 'latin1', 'us-ascii', 'ascii')
+
+
+def _normalize(charset):
+    """规范化编码名称，Python不支持的编码返回None"""
+    if not charset:
+        return None
+    if isinstance(charset, bytes):
+        charset = charset.decode('ascii', 'ignore')
+    charset = charset.strip().lower()
+    charset = _ALIASES.get(charset, charset)
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        return None
+    return charset
+
+
+def sniff_encoding(content, content_type=None):
+    """根据页面内容（bytes）和 Content-Type 响应头确定编码"""
+    content = content or b''
+    for bom, charset in _BOMS:
+        if content.startswith(bom):
+            return charset
+
+    header_charset = None
+    if content_type:
+        match = _HEADER_CHARSET_RE.search(content_type)
+        header_charset = _normalize(match.group(1)) if match else None
+    if header_charset and header_charset not in _WEAK_HEADER_CHARSETS:
+        return header_charset
+
+    match = _META_CHARSET_RE.search(content[:META_SCAN_SIZE])
+    meta_charset = _normalize(match.group(1)) if match else None
+    if meta_charset:
+        return meta_charset
+
+    try:
+        content.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gb18030'
+
+
+def detect_encoding(response):
+    """
+    确定 requests 响应的编码（代替 response.apparent_encoding）
+
+    用法: response.encoding = detect_encoding(response)
+    """
+    with timed('parse'):
+        return sniff_encoding(response.content, response.headers.get('Content-Type'))
+
+
+class _LinkParser(HTMLParser):
+    """逐个处理标签，只收集 <a> 的 href、title 和文字"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self._current = None
+
+    def _close_link(self):
+        if self._current is not None:
+            href, parts, title = self._current
+            self.links.append(Link(href, ''.join(parts).strip(), title))
+            self._current = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        # <a> 不能嵌套，未闭合的上一个链接到此结束（与浏览器一致）
+        self._close_link()
+        attrs = dict(attrs)
+        if 'href' in attrs:
+            self._current = (attrs['href'] or '', [], attrs.get('title') or '')
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._close_link()
+
+    def handle_data(self, data):
+        if self._current is not None:
+            self._current[1].append(data)
+
+    def close(self):
+        super().close()
+        self._close_link()
+
+
+def _extract_with_parser(html):
+    parser = _LinkParser()
+    parser.feed(html)
+    parser.close()
+    return parser.links
+
+
+def _extract_with_lxml(html):
+    document = lxml.html.document_fromstring(html)
+    links = []
+    for element in document.iter('a'):
+        href = element.get('href')
+        if href is None:
+            continue
+        links.append(Link(href, element.text_content().strip(), element.get('title') or ''))
+    return links
+
+
+def extract_links(html):
+    """提取页面中所有带 href 的 <a> 链接，返回 Link(href, text, title) 列表（按页面顺序）"""
+    if not html:
+        return []
+    with timed('parse'):
+        if LXML_AVAILABLE:
+            try:
+                return _extract_with_lxml(html)
+            except (ValueError, lxml.etree.ParserError):
+                # 带 <?xml encoding?> 声明的字符串、空文档等lxml无法解析，改用HTMLParser
+                pass
+        return _extract_with_parser(html)
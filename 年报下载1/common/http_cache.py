@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP条件请求缓存
+功能：
+1. 记录每个页面和文件的 ETag / Last-Modified 以及内容哈希，保存在磁盘上，多次运行之间共享
+2. 再次请求时发送 If-None-Match / If-Modified-Since，服务器返回304时直接使用缓存内容
+3. 年报文件未变化且本地文件完好时跳过下载，不再重新下载
+4. 每个URL一个索引文件，原子替换写入，多个脚本并发运行时互不影响
+
+环境变量 NIANBAO_HTTP_CACHE：
+    未设置或为空  使用默认目录（脚本目录下的 http_cache）
+    off           关闭缓存
+    其他值        作为缓存目录
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from common.downloader import download_response, PART_SUFFIX
+
+HTTP_CACHE_ENV = 'NIANBAO_HTTP_CACHE'
+CACHE_DIRNAME = 'http_cache'
+
+# 缓存页面时保留的响应头（正文已解压，不保留 Content-Encoding 等）
+_KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Content-Disposition')
+
+
+def get_cache_dir():
+    """获取缓存目录，缓存关闭时返回None"""
+    value = os.environ.get(HTTP_CACHE_ENV, '').strip()
+    if value.lower() in ('off', 'false', '0', 'no', '否'):
+        return None
+    if value:
+        return value
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_dir, CACHE_DIRNAME)
+
+
+def _cache_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _entry_path(cache_dir, url):
+    return os.path.join(cache_dir, _cache_key(url) + '.json')
+
+
+def _body_path(cache_dir, url):
+    return os.path.join(cache_dir, _cache_key(url) + '.body')
+
+
+def _atomic_write(path, data, mode='wb'):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_entry(url, cache_dir=None):
+    """读取URL的缓存记录，不存在或损坏时返回None"""
+    cache_dir = cache_dir or get_cache_dir()
+    if not cache_dir:
+        return None
+    try:
+        with open(_entry_path(cache_dir, url), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        return entry if isinstance(entry, dict) and entry.get('url') == url else None
+    except (OSError, ValueError):
+        return None
+
+
+def save_entry(entry, cache_dir=None):
+    """保存缓存记录（失败时只打印警告，不影响下载）"""
+    cache_dir = cache_dir or get_cache_dir()
+    if not cache_dir:
+        return False
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _atomic_write(_entry_path(cache_dir, entry['url']),
+                      json.dumps(entry, ensure_ascii=False, indent=1), mode='w')
+        return True
+    except OSError as e:
+        print(f"  ⚠️  写入HTTP缓存失败: {e}")
+        return False
+
+
+def _conditional_headers(entry):
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def _new_entry(url, response, kind):
+    return {
+        'url': url,
+        'kind': kind,
+        'final_url': response.url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'headers': {k: response.headers[k] for k in _KEPT_HEADERS if k in response.headers},
+        'fetched_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def _file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_matches(entry):
+    """检查缓存记录中保存的文件是否仍然完好（先比较大小和修改时间，不一致时再比较哈希）"""
+    path = entry.get('path')
+    if not path or not entry.get('sha256'):
+        return False
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != entry.get('size'):
+        return False
+    if stat.st_mtime_ns == entry.get('mtime_ns'):
+        return True
+    try:
+        return _file_sha256(path) == entry['sha256']
+    except OSError:
+        return False
+
+
+def _replay_response(response, entry, body):
+    """用缓存内容构造一个200响应，供调用方按原方式解析"""
+    cached = requests.models.Response()
+    cached.status_code = 200
+    cached.reason = 'OK (cached)'
+    cached._content = body
+    cached.headers = CaseInsensitiveDict(entry.get('headers') or {})
+    cached.url = entry.get('final_url') or entry['url']
+    cached.request = response.request
+    cached.history = response.history
+    cached.elapsed = response.elapsed
+    cached.from_cache = True
+    return cached
+
+
+def cached_get(session, url, **kwargs):
+    """
+    带条件请求缓存的GET（用于年报列表页、详情页）
+
+    服务器返回304时返回由缓存正文构造的响应（from_cache=True），
+    调用方无需区分，照常使用 response.text / response.content
+    """
+    cache_dir = get_cache_dir()
+    if not cache_dir:
+        return session.get(url, **kwargs)
+
+    entry = load_entry(url, cache_dir)
+    body = None
+    if entry and entry.get('kind') == 'page':
+        try:
+            with open(_body_path(cache_dir, url), 'rb') as f:
+                body = f.read()
+        except OSError:
+            body = None
+        if body is not None and hashlib.sha256(body).hexdigest() != entry.get('sha256'):
+            body = None
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    if body is not None:
+        headers.update(_conditional_headers(entry))
+    response = session.get(url, headers=headers, **kwargs)
+
+    if response.status_code == 304 and body is not None:
+        print(f"  页面未变化（304），使用缓存: {url}")
+        response.close()
+        return _replay_response(response, entry, body)
+
+    if response.status_code == 200 and not kwargs.get('stream'):
+        new_entry = _new_entry(url, response, 'page')
+        if new_entry['etag'] or new_entry['last_modified']:
+            content = response.content
+            new_entry['sha256'] = hashlib.sha256(content).hexdigest()
+            new_entry['size'] = len(content)
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                _atomic_write(_body_path(cache_dir, url), content)
+                save_entry(new_entry, cache_dir)
+            except OSError as e:
+                print(f"  ⚠️  写入HTTP缓存失败: {e}")
+    return response
+
+
+def open_download(session, url, **kwargs):
+    """
+    发起年报文件下载请求（stream=True）
+
+    上次下载的文件仍然完好时发送条件请求；服务器返回304时，响应的
+    not_modified 为True，响应头替换为上次下载时的响应头（调用方仍可按 Content-Type 判断类型），
+    随后由 save_response() 直接使用本地文件
+    """
+    kwargs['stream'] = True
+    cache_dir = get_cache_dir()
+    entry = load_entry(url, cache_dir) if cache_dir else None
+    if entry and (entry.get('kind') != 'file' or not _file_matches(entry)):
+        entry = None
+
+    request_kwargs = dict(kwargs)
+    headers = dict(kwargs.pop('headers', None) or {})
+    if entry:
+        headers.update(_conditional_headers(entry))
+    response = session.get(url, headers=headers, **kwargs)
+    response.not_modified = bool(entry) and response.status_code == 304
+    response.cache_entry = entry
+    response.cache_url = url
+    # 供 save_response() 续传、分段下载时发送Range请求
+    response.download_session = session
+    response.request_kwargs = request_kwargs
+    if response.not_modified:
+        response.headers = CaseInsensitiveDict(entry.get('headers') or {})
+    return response
+
+
+def save_response(response, file_path):
+    """
+    保存 open_download() 返回的响应到 file_path，返回文件大小
+
+    内容未变化（304）时不重新下载：文件已在 file_path 则保持不动，否则从上次保存的位置复制；
+    其他情况交给 common/downloader.py 下载（.part 文件、断点续传、分段下载、校验后原子重命名）
+    """
+    entry = getattr(response, 'cache_entry', None)
+    if getattr(response, 'not_modified', False) and entry:
+        response.close()
+        old_path = entry['path']
+        same_file = os.path.exists(file_path) and os.path.samefile(old_path, file_path)
+        if not same_file:
+            part_path = file_path + PART_SUFFIX
+            shutil.copyfile(old_path, part_path)
+            os.replace(part_path, file_path)
+        print(f"  文件未变化（304），跳过下载: {os.path.basename(file_path)}")
+        _record_file(response, entry['url'], file_path, entry['sha256'], entry)
+        return os.path.getsize(file_path)
+
+    file_size = download_response(
+        response, file_path,
+        session=getattr(response, 'download_session', None),
+        request_kwargs=getattr(response, 'request_kwargs', None))
+
+    url = getattr(response, 'cache_url', None)
+    if url and response.status_code == 200 and get_cache_dir():
+        _record_file(response, url, file_path, _file_sha256(file_path))
+    return file_size
+
+
+def _record_file(response, url, file_path, sha256, entry=None):
+    """记录文件的校验信息（304时沿用原有的验证器和响应头）"""
+    if not get_cache_dir():
+        return
+    new_entry = dict(entry) if entry else _new_entry(url, response, 'file')
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return
+    new_entry.update({
+        'path': os.path.abspath(file_path),
+        'sha256': sha256,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    })
+    if entry:
+        new_entry['checked_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    save_entry(new_entry)
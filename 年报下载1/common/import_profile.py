@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+启动耗时分析（python -X importtime）
+功能：
+1. 在新的解释器中导入 批量执行.py 和每个图书馆脚本（只导入，不执行main），
+   用 -X importtime 记录每个模块的导入耗时，扣除解释器本身启动时导入的模块
+2. 输出每个脚本的启动耗时（进程总耗时、导入耗时）和最慢的顶层包
+3. 检查启动时不应导入的模块：批量执行.py 不导入 pandas/selenium 等（只在需要时导入），
+   图书馆脚本不导入 pandas，不使用浏览器的图书馆脚本不导入 selenium/PIL
+4. 导入耗时超出预算或导入了不应导入的模块时返回1，打包前运行可以发现启动变慢
+5. 结果写入 logs/启动耗时_<时间>.json
+
+用法:
+    python -m common.import_profile                        分析批量执行.py 和所有图书馆脚本
+    python -m common.import_profile 南京图书馆 上海图书馆      只分析指定的图书馆（同时分析批量执行.py）
+    python -m common.import_profile --budget-ms=800 --plugin-budget-ms=1500 --repeat=5 --top=10
+
+说明：打包后的exe不能使用 -X importtime，这里分析的是源码的导入。单目录（onedir）打包的exe
+启动时直接从文件夹导入，不需要先解压，启动耗时与这里的结果接近；单文件（onefile）exe每次启动
+还要先把所有依赖解压到临时文件夹
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+
+RUNNER_SCRIPT = '批量执行.py'
+
+# 导入耗时预算（毫秒，不含解释器本身的启动）
+RUNNER_BUDGET_MS = 800
+PLUGIN_BUDGET_MS = 1500
+DEFAULT_REPEAT = 3
+DEFAULT_TOP = 8
+
+# 启动时不应导入的顶层包（只在用到的代码路径中导入）
+RUNNER_LAZY_PACKAGES = ('pandas', 'openpyxl', 'selenium', 'PIL', 'aiohttp', 'fitz', 'PyPDF2')
+PLUGIN_LAZY_PACKAGES = ('pandas', 'openpyxl')
+NON_BROWSER_LAZY_PACKAGES = ('selenium', 'PIL')
+
+# import time:       self |  cumulative |   package（包名前的缩进表示嵌套层级）
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S.*)$')
+
+# 子进程中只导入脚本，不执行main（模块名不是 __main__）
+_LOAD_CODE = """
+import sys, importlib.util
+script_dir, path = sys.argv[1], sys.argv[2]
+sys.path.insert(0, script_dir)
+spec = importlib.util.spec_from_file_location('import_profile_target', path)
+module = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = module
+spec.loader.exec_module(module)
+"""
+
+
+def parse_importtime(text):
+    """解析 -X importtime 的输出，返回 [(模块名, 自身耗时us, 累计耗时us, 层级)]，按导入完成的顺序"""
+    entries = []
+    for line in text.splitlines():
+        match = _LINE.match(line)
+        if match:
+            depth = max(0, len(match.group(3)) - 1) // 2
+            entries.append((match.group(4).strip(), int(match.group(1)), int(match.group(2)), depth))
+    return entries
+
+
+def _run_importtime(args, cwd):
+    """运行一次 python -X importtime，返回 (进程耗时ms, 导入记录, 返回码, 错误信息的最后一行)"""
+    env = dict(os.environ, PYTHONIOENCODING='utf-8')
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=cwd, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    wall_ms = (time.perf_counter() - start) * 1000
+    stderr = proc.stderr.decode('utf-8', errors='replace')
+    errors = [line for line in stderr.splitlines() if line.strip() and not line.startswith('import time:')]
+    return wall_ms, parse_importtime(stderr), proc.returncode, (errors[-1] if errors else '')
+
+
+def interpreter_baseline(cwd, repeat=DEFAULT_REPEAT):
+    """空解释器启动时导入的模块和进程耗时（各脚本的结果扣除这部分）"""
+    walls = []
+    modules = set()
+    for _ in range(max(1, repeat)):
+        wall_ms, entries, _, _ = _run_importtime(['-c', 'pass'], cwd)
+        walls.append(wall_ms)
+        modules = {entry[0] for entry in entries}
+    return {'wall_ms': _median(walls), 'modules': modules}
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else 0.0
+
+
+def profile_script(script_path, baseline, repeat=DEFAULT_REPEAT, top=DEFAULT_TOP):
+    """
+    在新进程中导入脚本 repeat 次（先预热一次生成 .pyc），取中位数
+
+    返回 {'script', 'ok', 'error', 'wall_ms', 'startup_ms', 'import_ms', 'modules', 'packages', 'top'}
+    """
+    script_dir = os.path.dirname(os.path.abspath(script_path))
+    args = ['-c', _LOAD_CODE, script_dir, os.path.abspath(script_path)]
+    _run_importtime(args, script_dir)
+
+    runs = []
+    for _ in range(max(1, repeat)):
+        wall_ms, entries, returncode, error = _run_importtime(args, script_dir)
+        if returncode != 0:
+            return {'script': os.path.basename(script_path), 'ok': False, 'error': error}
+        extra = [entry for entry in entries if entry[0] not in baseline['modules']]
+        runs.append((sum(entry[1] for entry in extra) / 1000, wall_ms, extra))
+    runs.sort(key=lambda run: run[0])
+    import_ms, wall_ms, extra = runs[len(runs) // 2]
+
+    # 顶层包按累计耗时排序（同一个包只取最外层的一条；common 按模块分别统计）
+    packages = set()
+    costs = {}
+    for name, _, cumulative, _ in extra:
+        parts = name.split('.')
+        packages.add(parts[0])
+        key = '.'.join(parts[:2]) if parts[0] == 'common' else parts[0]
+        if key != 'common':
+            costs[key] = max(costs.get(key, 0), cumulative)
+    heaviest = sorted(costs.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'script': os.path.basename(script_path),
+        'ok': True,
+        'error': '',
+        'wall_ms': round(wall_ms, 1),
+        'startup_ms': round(max(0.0, wall_ms - baseline['wall_ms']), 1),
+        'import_ms': round(import_ms, 1),
+        'modules': len(extra),
+        'packages': sorted(packages),
+        'top': [(name, round(us / 1000, 1)) for name, us in heaviest],
+    }
+
+
+def uses_browser(script_path):
+    """与 批量执行.py 的 script_uses_browser 相同：从浏览器池租用Chrome，或站点配置中设置了 browser=True"""
+    try:
+        with open(script_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        return 'lease_driver(' in source or 'browser=True' in source
+    except OSError:
+        return False
+
+
+def check_result(result, budget_ms, lazy_packages):
+    """检查预算和不应导入的包，返回问题列表"""
+    if not result['ok']:
+        return [f"导入失败: {result['error']}"]
+    problems = []
+    if budget_ms and result['import_ms'] > budget_ms:
+        problems.append(f"导入耗时 {result['import_ms']:.0f}ms 超出预算 {budget_ms}ms")
+    eager = [name for name in lazy_packages if name in result['packages']]
+    if eager:
+        problems.append(f"启动时导入了 {', '.join(eager)}")
+    return problems
+
+
+def find_library_scripts(script_dir, names=None):
+    """脚本目录中的图书馆脚本（names 为图书馆名称，可省略 .py）"""
+    wanted = {name[:-3] if name.endswith('.py') else name for name in (names or [])}
+    scripts = []
+    for file in sorted(os.listdir(script_dir)):
+        if file.endswith('图书馆.py') and (not wanted or file[:-3] in wanted):
+            scripts.append(os.path.join(script_dir, file))
+    return scripts
+
+
+def run_profile(script_dir, names=None, repeat=DEFAULT_REPEAT, top=DEFAULT_TOP,
+                budget_ms=RUNNER_BUDGET_MS, plugin_budget_ms=PLUGIN_BUDGET_MS, log=print):
+    """分析 批量执行.py 和图书馆脚本的启动耗时，返回 (结果列表, 问题数)"""
+    baseline = interpreter_baseline(script_dir, repeat)
+    log(f"解释器启动: {baseline['wall_ms']:.0f}ms，导入 {len(baseline['modules'])} 个模块（以下结果已扣除）")
+
+    targets = [(os.path.join(script_dir, RUNNER_SCRIPT), budget_ms, RUNNER_LAZY_PACKAGES)]
+    for path in find_library_scripts(script_dir, names):
+        lazy = PLUGIN_LAZY_PACKAGES if uses_browser(path) else PLUGIN_LAZY_PACKAGES + NON_BROWSER_LAZY_PACKAGES
+        targets.append((path, plugin_budget_ms, lazy))
+
+    results = []
+    problem_count = 0
+    log(f"\n{'导入(ms)':>8}{'启动(ms)':>10}{'模块数':>8}  脚本: 最慢的包(ms)")
+    log("-" * 90)
+    for path, budget, lazy in targets:
+        result = profile_script(path, baseline, repeat, top)
+        result['budget_ms'] = budget
+        result['problems'] = check_result(result, budget, lazy)
+        problem_count += len(result['problems'])
+        results.append(result)
+        if result['ok']:
+            heaviest = ', '.join(f"{name} {ms:.0f}" for name, ms in result['top'][:4])
+            log(f"{result['import_ms']:>8.0f}{result['startup_ms']:>10.0f}{result['modules']:>8}  "
+                f"{result['script'][:-3]}: {heaviest}")
+        else:
+            log(f"{'-':>8}{'-':>10}{'-':>8}  {result['script'][:-3]}")
+        for problem in result['problems']:
+            log(f"  ✗ {problem}")
+    return results, problem_count
+
+
+def write_report(results, report_path):
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return report_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='分析批量执行.py 和图书馆脚本的启动（导入）耗时')
+    parser.add_argument('libraries', nargs='*', help='图书馆名称，默认为所有图书馆脚本')
+    parser.add_argument('--budget-ms', type=int, default=RUNNER_BUDGET_MS,
+                        help=f'批量执行.py 的导入耗时预算（毫秒，0为不检查，默认{RUNNER_BUDGET_MS}）')
+    parser.add_argument('--plugin-budget-ms', type=int, default=PLUGIN_BUDGET_MS,
+                        help=f'每个图书馆脚本的导入耗时预算（毫秒，0为不检查，默认{PLUGIN_BUDGET_MS}）')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='每个脚本测量的次数（取中位数）')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='报告中保留的最慢的包的数量')
+    parser.add_argument('--no-report', action='store_true', help='不写入 logs/启动耗时_<时间>.json')
+    args = parser.parse_args(argv)
+
+    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results, problem_count = run_profile(script_dir, args.libraries, repeat=args.repeat, top=args.top,
+                                         budget_ms=args.budget_ms, plugin_budget_ms=args.plugin_budget_ms)
+    print("-" * 90)
+    if not args.no_report:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        report_path = write_report(results, os.path.join(script_dir, 'logs', f'启动耗时_{timestamp}.json'))
+        print(f"报告: {report_path}")
+    if problem_count:
+        print(f"✗ 发现 {problem_count} 个问题")
+        return 1
+    print(f"✓ {len(results)} 个脚本的启动耗时都在预算内，没有提前导入的包")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+年报下载台账（SQLite）
+功能：
+1. 按（图书馆, 年份）记录下载状态，主键索引查询，替代逐行扫描Excel
+2. 记录每次执行的历史（耗时、文件大小、错误类型）
+3. 每次更新在单个事务中完成，中途崩溃不会损坏已有记录
+4. Excel（是否下载.xlsx）的导入导出由批量执行.py负责，台账只保存图书馆与Excel行名称的对应关系
+5. 年报链接索引：记录每个图书馆每年的年报页面、文件地址和地址规律，供 common/url_index.py 预测下一年的地址
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+LEDGER_FILENAME = '下载台账.db'
+LEDGER_PATH_ENV = 'NIANBAO_LEDGER'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    library     TEXT NOT NULL,
+    year        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    url         TEXT,
+    path        TEXT,
+    bytes       INTEGER,
+    source      TEXT,
+    updated_at  TEXT NOT NULL,
+    PRIMARY KEY (library, year)
+);
+
+CREATE TABLE IF NOT EXISTS attempts (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    library     TEXT NOT NULL,
+    year        TEXT NOT NULL,
+    finished_at TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    url         TEXT,
+    bytes       INTEGER,
+    elapsed     REAL,
+    phases      TEXT,
+    error_class TEXT,
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_library_year ON attempts (library, year);
+
+CREATE TABLE IF NOT EXISTS libraries (
+    library     TEXT PRIMARY KEY,
+    excel_name  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS report_urls (
+    library     TEXT NOT NULL,
+    year        TEXT NOT NULL,
+    page_url    TEXT,
+    file_url    TEXT NOT NULL,
+    pattern     TEXT,
+    predicted   INTEGER NOT NULL DEFAULT 0,
+    found_at    TEXT NOT NULL,
+    PRIMARY KEY (library, year)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key         TEXT PRIMARY KEY,
+    value       TEXT
+);
+"""
+
+STATUS_DOWNLOADED = 'success'
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class Ledger:
+    """下载台账"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        try:
+            # WAL模式：写入时不阻塞读取，断电后也能恢复到最后一次提交
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.DatabaseError:
+            pass
+        with self.conn:
+            self.conn.executescript(_SCHEMA)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def is_downloaded(self, library, year):
+        """检查某图书馆某年份是否已下载"""
+        row = self.conn.execute(
+            'SELECT status FROM downloads WHERE library = ? AND year = ?',
+            (library, str(year))).fetchone()
+        return row is not None and row['status'] == STATUS_DOWNLOADED
+
+    def get_download(self, library, year):
+        """获取下载记录（字典），不存在时返回None"""
+        row = self.conn.execute(
+            'SELECT * FROM downloads WHERE library = ? AND year = ?',
+            (library, str(year))).fetchone()
+        return dict(row) if row else None
+
+    def downloaded_libraries(self, year):
+        """获取某年份已下载的图书馆集合"""
+        rows = self.conn.execute(
+            'SELECT library FROM downloads WHERE year = ? AND status = ?',
+            (str(year), STATUS_DOWNLOADED)).fetchall()
+        return {row['library'] for row in rows}
+
+    def get_attempts(self, library, year=None, limit=20):
+        """获取某图书馆最近的执行历史"""
+        if year is None:
+            rows = self.conn.execute(
+                'SELECT * FROM attempts WHERE library = ? ORDER BY id DESC LIMIT ?',
+                (library, limit)).fetchall()
+        else:
+            rows = self.conn.execute(
+                'SELECT * FROM attempts WHERE library = ? AND year = ? ORDER BY id DESC LIMIT ?',
+                (library, str(year), limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_excel_name(self, library):
+        """获取图书馆在Excel中对应的名称，未记录返回None"""
+        row = self.conn.execute(
+            'SELECT excel_name FROM libraries WHERE library = ?', (library,)).fetchone()
+        return row['excel_name'] if row else None
+
+    def has_library(self, library):
+        """台账中是否登记过该图书馆"""
+        row = self.conn.execute(
+            'SELECT 1 FROM libraries WHERE library = ?', (library,)).fetchone()
+        return row is not None
+
+    def get_report_urls(self, library):
+        """获取某图书馆各年份的年报链接记录（新的年份在前）"""
+        rows = self.conn.execute(
+            'SELECT * FROM report_urls WHERE library = ? ORDER BY year DESC',
+            (library,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_downloaded_urls(self, library):
+        """获取某图书馆有下载地址的成功记录（新的年份在前）"""
+        rows = self.conn.execute(
+            'SELECT year, url FROM downloads WHERE library = ? AND status = ? AND url IS NOT NULL '
+            'ORDER BY year DESC', (library, STATUS_DOWNLOADED)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+    # ------------------------------------------------------------------
+    # 更新（每个方法一个事务）
+    # ------------------------------------------------------------------
+
+    def set_meta(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def set_library(self, library, excel_name):
+        """登记图书馆与Excel行名称的对应关系（excel_name为None表示Excel中没有该行）"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO libraries (library, excel_name) VALUES (?, ?)',
+                (library, excel_name))
+
+    def set_downloaded(self, library, year, source='excel'):
+        """直接标记为已下载（用于从Excel导入人工修改的状态）"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO downloads (library, year, status, source, updated_at) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (library, year) DO UPDATE SET '
+                'status = excluded.status, source = excluded.source, updated_at = excluded.updated_at',
+                (library, str(year), STATUS_DOWNLOADED, source, _now()))
+
+    def clear_downloaded(self, library, year, updated_before=None):
+        """
+        清除下载状态（用于从Excel导入人工修改的状态）
+
+        参数:
+            updated_before: 只清除在该时间之前更新的记录，避免覆盖Excel修改之后才下载成功的记录
+        """
+        with self.lock, self.conn:
+            if updated_before is None:
+                self.conn.execute(
+                    'DELETE FROM downloads WHERE library = ? AND year = ?',
+                    (library, str(year)))
+            else:
+                self.conn.execute(
+                    'DELETE FROM downloads WHERE library = ? AND year = ? AND updated_at < ?',
+                    (library, str(year), updated_before))
+
+    def record_attempt(self, library, year, result):
+        """
+        记录一次执行结果（common/result.py 的结果字典）
+
+        成功时同时更新下载状态和年报链接索引；失败只追加历史，不覆盖已有的成功记录
+        """
+        from common.url_index import url_pattern
+
+        result = result or {}
+        status = result.get('status') or 'error'
+        year = str(result.get('year') or year)
+        error_class = None if status == STATUS_DOWNLOADED else status
+        phases = json.dumps(result.get('phases') or {}, ensure_ascii=False)
+        now = _now()
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO attempts (library, year, finished_at, status, url, bytes, elapsed, '
+                'phases, error_class, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (library, year, now, status, result.get('url'), result.get('bytes'),
+                 result.get('elapsed'), phases, error_class, result.get('error')))
+            if status == STATUS_DOWNLOADED:
+                self.conn.execute(
+                    'INSERT INTO downloads (library, year, status, url, path, bytes, source, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (library, year) DO UPDATE SET '
+                    'status = excluded.status, url = excluded.url, path = excluded.path, '
+                    'bytes = excluded.bytes, source = excluded.source, updated_at = excluded.updated_at',
+                    (library, year, status, result.get('url'), result.get('path'),
+                     result.get('bytes'), 'run', now))
+                if result.get('url'):
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO report_urls '
+                        '(library, year, page_url, file_url, pattern, predicted, found_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (library, year, result.get('page'), result['url'],
+                         url_pattern(result['url'], year), int(bool(result.get('predicted'))), now))
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+def get_ledger_path(script_dir, db_path=None):
+    """台账路径：参数优先，其次是环境变量 NIANBAO_LEDGER（批量执行.py 设置），默认为脚本目录下的 下载台账.db"""
+    return db_path or os.environ.get(LEDGER_PATH_ENV, '').strip() or os.path.join(script_dir, LEDGER_FILENAME)
+
+
+def open_ledger(script_dir, db_path=None):
+    """打开（不存在则创建）台账数据库"""
+    return Ledger(get_ledger_path(script_dir, db_path))
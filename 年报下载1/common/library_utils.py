@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+图书馆脚本共用的工具函数
+功能：请求头、文件名清理、年份提取、读取配置和下载年报文件。
+原来每个图书馆脚本各自保存一份相同的副本，现在统一从这里导入，修改只需要改一处
+"""
+
+import os
+import re
+from urllib.parse import urlparse, parse_qs
+
+import requests
+import urllib3
+
+from common.sessions import get_session
+from common.http_cache import open_download, save_response
+
+# 禁用SSL警告
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+def get_headers():
+    """获取模拟浏览器的请求头"""
+    return {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/pdf',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'DNT': '1',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+    }
+
+
+def clean_filename(filename):
+    """清理文件名，移除Windows不允许的字符"""
+    invalid_chars = r'[<>:"/\\|?*]'
+    cleaned = re.sub(invalid_chars, '_', filename)
+    cleaned = cleaned.strip(' .')
+    if not cleaned:
+        cleaned = "unnamed_file"
+    return cleaned
+
+
+def extract_year_from_text(text):
+    """从文本中提取年份，优先提取完整的年份（如2023、2024）"""
+    if not text:
+        return None
+    # 优先匹配完整的4位年份（2000-2099）
+    year_match = re.search(r'(20[0-3]\d)', text)
+    if year_match:
+        return year_match.group(1)
+    return None
+
+
+def extract_year_from_url_params(url):
+    """从URL参数中提取年份（特别是从filename参数）"""
+    try:
+        parsed = urlparse(url)
+        params = parse_qs(parsed.query)
+        # 检查filename参数
+        if 'filename' in params:
+            filename = params['filename'][0]
+            year = extract_year_from_text(filename)
+            if year:
+                return year
+    except Exception:
+        pass
+    return None
+
+
+def load_config(config_path="config.txt"):
+    """读取配置文件"""
+    config = {}
+    try:
+        if not os.path.exists(config_path):
+            # 如果配置文件不存在，创建默认配置
+            default_config = """# 配置文件
+# 格式：key=value
+# 支持使用 # 开头添加注释
+# 支持空行
+
+# 输出文件夹路径（必填）
+# 示例：output_folder=D:\\Desktop\\图书馆年报
+output_folder=D:\\Desktop\\图书馆年报
+"""
+            with open(config_path, 'w', encoding='utf-8') as f:
+                f.write(default_config)
+            print(f"✓ 已创建默认配置文件: {config_path}")
+            print("  请编辑配置文件设置输出路径后重新运行")
+            return None
+
+        with open(config_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if '=' in line:
+                    key, value = line.split('=', 1)
+                    key = key.strip()
+                    value = value.strip()
+                    if value.startswith('"') and value.endswith('"'):
+                        value = value[1:-1]
+                    elif value.startswith("'") and value.endswith("'"):
+                        value = value[1:-1]
+                    config[key] = value
+    except Exception as e:
+        print(f"✗ 读取配置文件失败: {e}")
+        return None
+
+    return config
+
+
+def download_pdf(url, filename, save_dir):
+    """下载文件（支持PDF、DOCX、DOC等格式）"""
+    try:
+        session = get_session(get_headers())
+
+        print(f"正在下载: {url}")
+        response = open_download(session, url, timeout=60, verify=False)
+        response.raise_for_status()
+
+        # 检查内容类型和文件扩展名
+        content_type = response.headers.get('Content-Type', '').lower()
+        url_lower = url.lower()
+
+        # 检查是否是HTML文件，如果是则拒绝下载
+        if 'text/html' in content_type or url_lower.endswith(('.htm', '.html')):
+            print(f"✗ 错误: URL指向的是HTML页面，不是文档文件")
+            print(f"  请检查页面中是否有PDF/DOCX/DOC文档链接")
+            return False
+
+        # 根据URL确定文件扩展名
+        if url_lower.endswith('.docx'):
+            file_ext = '.docx'
+        elif url_lower.endswith('.doc'):
+            file_ext = '.doc'
+        elif url_lower.endswith('.pdf'):
+            file_ext = '.pdf'
+        else:
+            # 根据Content-Type判断
+            if 'word' in content_type or 'document' in content_type:
+                if 'openxml' in content_type or 'docx' in content_type:
+                    file_ext = '.docx'
+                else:
+                    file_ext = '.doc'
+            elif 'pdf' in content_type:
+                file_ext = '.pdf'
+            else:
+                file_ext = '.pdf'  # 默认使用pdf
+
+        # 确保文件名有正确的扩展名
+        if not filename.lower().endswith(('.pdf', '.docx', '.doc')):
+            filename = filename + file_ext
+        elif not filename.lower().endswith(file_ext):
+            # 如果扩展名不匹配，替换为正确的扩展名
+            filename = os.path.splitext(filename)[0] + file_ext
+
+        # 清理文件名
+        filename = clean_filename(filename)
+
+        # 创建保存目录
+        os.makedirs(save_dir, exist_ok=True)
+        file_path = os.path.join(save_dir, filename)
+
+        # 保存文件（先写入.part，校验后重命名；内容未变化时不重新下载）
+        file_size = save_response(response, file_path)
+
+        # 验证文件是否成功保存
+        if not os.path.exists(file_path):
+            print(f"✗ 文件保存失败: {file_path}")
+            return False
+
+        actual_size = os.path.getsize(file_path)
+        print(f"✓ 下载成功: {filename}")
+        print(f"  文件大小: {actual_size:,} 字节 ({actual_size/1024/1024:.2f} MB)")
+        print(f"  保存路径: {file_path}")
+
+        session.close()
+        return True
+
+    except requests.exceptions.RequestException as e:
+        print(f"✗ 下载失败: {e}")
+        return False
+    except Exception as e:
+        print(f"✗ 发生错误: {e}")
+        return False
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+链接提取性能对比
+对比原来的做法（response.apparent_encoding + BeautifulSoup html.parser + find_all('a')）
+与 common/html_links.py（detect_encoding + extract_links）在保存的年报页面上的耗时和结果
+
+用法（在 年报下载1 目录下运行）:
+    python -m common.link_bench --fetch     # 下载各图书馆脚本的年报页面到 bench_pages/ 后对比
+    python -m common.link_bench             # 使用已保存的页面对比
+    python -m common.link_bench D:\\pages -n 20
+
+页面保存为 <图书馆>.html（原始字节），响应头 Content-Type 保存在同名的 .type 文件中
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import requests
+import urllib3
+from bs4 import BeautifulSoup
+
+from common.html_links import detect_encoding, extract_links, LXML_AVAILABLE
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+}
+
+
+def _get_script_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fetch_pages(script_dir, pages_dir):
+    """下载每个图书馆脚本的年报页面（地址模板中的年份取去年），返回保存的页面数"""
+    from common.backfill import read_site_info
+
+    os.makedirs(pages_dir, exist_ok=True)
+    year = str(time.localtime().tm_year - 1)
+    saved = 0
+    with requests.Session() as session:
+        session.headers.update(_HEADERS)
+        for file in sorted(os.listdir(script_dir)):
+            if not file.endswith('图书馆.py'):
+                continue
+            library = file[:-3]
+            pages = read_site_info(os.path.join(script_dir, file))['pages']
+            if not pages:
+                print(f"  - {library}: 没有年报页面地址")
+                continue
+            url = pages[0].format(year=year)
+            try:
+                response = session.get(url, timeout=30, verify=False)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                print(f"  ✗ {library}: {e}")
+                continue
+            with open(os.path.join(pages_dir, library + '.html'), 'wb') as f:
+                f.write(response.content)
+            with open(os.path.join(pages_dir, library + '.type'), 'w', encoding='utf-8') as f:
+                f.write(response.headers.get('Content-Type', ''))
+            print(f"  ✓ {library}: {len(response.content):,} 字节")
+            saved += 1
+    return saved
+
+
+def _load_page(pages_dir, name):
+    response = requests.models.Response()
+    response.status_code = 200
+    with open(os.path.join(pages_dir, name + '.html'), 'rb') as f:
+        response._content = f.read()
+    type_path = os.path.join(pages_dir, name + '.type')
+    if os.path.exists(type_path):
+        with open(type_path, 'r', encoding='utf-8') as f:
+            response.headers['Content-Type'] = f.read().strip()
+    return response
+
+
+def old_path(response):
+    response.encoding = response.apparent_encoding or 'utf-8'
+    soup = BeautifulSoup(response.text, 'html.parser')
+    return [(link.get('href'), link.get_text().strip()) for link in soup.find_all('a', href=True)]
+
+
+def new_path(response):
+    response.encoding = detect_encoding(response)
+    return [(link.href, link.text) for link in extract_links(response.text)]
+
+
+def _best_time(func, pages_dir, name, repeat):
+    """重复运行取最短耗时（每次重新构造响应，避免 requests 缓存解码结果）"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        response = _load_page(pages_dir, name)
+        start = time.perf_counter()
+        result = func(response)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result, response.encoding
+
+
+def run_benchmark(pages_dir, repeat=5):
+    names = sorted(file[:-5] for file in os.listdir(pages_dir) if file.endswith('.html'))
+    if not names:
+        print(f"✗ {pages_dir} 中没有保存的页面，请先使用 --fetch 下载")
+        return 1
+
+    print(f"解析器: {'lxml' if LXML_AVAILABLE else 'html.parser 流式处理'}，每个页面重复 {repeat} 次取最短耗时\n")
+    print(f"{'图书馆':<14}{'大小':>10}{'原耗时ms':>10}{'新耗时ms':>10}{'加速':>7}  {'链接(原/新/一致)':<18}编码(原->新)")
+    total_old = total_new = 0.0
+    for name in names:
+        old_time, old_links, old_encoding = _best_time(old_path, pages_dir, name, repeat)
+        new_time, new_links, new_encoding = _best_time(new_path, pages_dir, name, repeat)
+        total_old += old_time
+        total_new += new_time
+        size = os.path.getsize(os.path.join(pages_dir, name + '.html'))
+        same = len(set(old_links) & set(new_links))
+        print(f"{name:<14}{size:>10,}{old_time * 1000:>10.1f}{new_time * 1000:>10.1f}"
+              f"{old_time / max(new_time, 1e-9):>6.1f}x  "
+              f"{f'{len(old_links)}/{len(new_links)}/{same}':<18}{old_encoding}->{new_encoding}")
+
+    print(f"\n合计: 原 {total_old * 1000:.1f} ms，新 {total_new * 1000:.1f} ms，"
+          f"加速 {total_old / max(total_new, 1e-9):.1f}x（{len(names)} 个页面）")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='链接提取性能对比')
+    parser.add_argument('pages_dir', nargs='?', help='保存页面的文件夹（默认 bench_pages）')
+    parser.add_argument('--fetch', action='store_true', help='先下载各图书馆脚本的年报页面')
+    parser.add_argument('-n', '--repeat', type=int, default=5, help='每个页面重复次数（默认5）')
+    args = parser.parse_args(argv)
+
+    script_dir = _get_script_dir()
+    pages_dir = args.pages_dir or os.path.join(script_dir, 'bench_pages')
+    if args.fetch:
+        print(f"下载年报页面到: {pages_dir}")
+        fetch_pages(script_dir, pages_dir)
+        print()
+    return run_benchmark(pages_dir, max(1, args.repeat))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+运行耗时统计
+功能：
+1. 每次图书馆脚本运行一个 RunMetrics（begin_report() 时创建，结果字典的 metrics 字段）
+2. 记录每个HTTP请求的DNS、建立连接、TLS握手、首字节时间（TTFB），复用的连接记为0；
+   页面解析时间、下载字节数和速度（MB/s）、浏览器使用时间、页面等待时间
+3. 批量执行.py 把每个图书馆的结果追加到 logs/metrics.jsonl（每行一条JSON），
+   common/metrics_report.py 据此生成HTML/Excel汇总
+
+说明：requests 不提供连接阶段的耗时，common/sessions.py 的连接池使用本模块的连接类记录。
+DNS时间由连接前单独解析一次得到（随后建立连接时使用系统缓存）。
+在脚本自己启动的线程中发送的请求（分段下载、并发探测）不计入
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+import contextvars
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+MAX_REQUESTS = 100          # 每次运行最多保存的请求明细数（汇总仍包括所有请求）
+
+_current = contextvars.ContextVar('nianbao_metrics', default=None)
+_connect_timing = threading.local()
+
+
+class RunMetrics:
+    """一次图书馆脚本运行的耗时统计"""
+
+    def __init__(self):
+        self.requests = []
+        self.request_count = 0
+        self.totals = {'dns': 0.0, 'connect': 0.0, 'tls': 0.0, 'ttfb': 0.0}
+        self.new_connections = 0
+        self.timers = {}                  # parse / browser / browser_start / wait / host_wait
+        self.download_bytes = 0
+        self.download_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_request(self, method, url, status, ttfb, timing=None):
+        timing = timing or {}
+        entry = {
+            'method': method,
+            'url': url,
+            'status': status,
+            'dns': round(timing.get('dns', 0.0), 4),
+            'connect': round(timing.get('connect', 0.0), 4),
+            'tls': round(timing.get('tls', 0.0), 4),
+            'ttfb': round(ttfb, 4),
+            'reused': not timing,
+        }
+        with self._lock:
+            self.request_count += 1
+            if timing:
+                self.new_connections += 1
+            for key in self.totals:
+                self.totals[key] += entry[key]
+            if len(self.requests) < MAX_REQUESTS:
+                self.requests.append(entry)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def add_download(self, size, seconds):
+        with self._lock:
+            self.download_bytes += size
+            self.download_seconds += seconds
+
+    def summary(self):
+        """转换为可写入JSON的字典"""
+        count = self.request_count
+        mb_per_s = None
+        if self.download_bytes and self.download_seconds > 0:
+            mb_per_s = round(self.download_bytes / 1024 / 1024 / self.download_seconds, 3)
+        return {
+            'requests': count,
+            'new_connections': self.new_connections,
+            'dns': round(self.totals['dns'], 3),
+            'connect': round(self.totals['connect'], 3),
+            'tls': round(self.totals['tls'], 3),
+            'ttfb': round(self.totals['ttfb'], 3),
+            'ttfb_avg': round(self.totals['ttfb'] / count, 3) if count else None,
+            'download_bytes': self.download_bytes,
+            'download_seconds': round(self.download_seconds, 3),
+            'mb_per_s': mb_per_s,
+            **{name: round(seconds, 3) for name, seconds in self.timers.items()},
+            'request_log': list(self.requests),
+        }
+
+
+def start_run():
+    """开始记录当前线程（协程）中的运行，返回 RunMetrics"""
+    metrics = RunMetrics()
+    _current.set(metrics)
+    return metrics
+
+
+def current():
+    """当前运行的 RunMetrics，不在图书馆脚本中时返回None"""
+    return _current.get()
+
+
+def add_time(name, seconds):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_time(name, seconds)
+
+
+def add_download(size, seconds):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_download(size, seconds)
+
+
+class timed:
+    """
+    记录一段代码的耗时
+
+    用法: with timed('parse'): ...
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# ---------------------------------------------------------------------------
+# 连接阶段计时（common/sessions.py 的连接池使用）
+# ---------------------------------------------------------------------------
+
+def begin_request():
+    """发送请求前清除上一次的连接计时"""
+    _connect_timing.value = None
+
+
+def end_request(method, url, status, elapsed):
+    """
+    请求返回响应头后记录到当前运行（期间没有建立新连接时视为复用连接）
+
+    elapsed 为发送请求到收到响应头的总时间，减去DNS、连接和TLS时间即为首字节时间
+    """
+    timing = getattr(_connect_timing, 'value', None)
+    _connect_timing.value = None
+    metrics = _current.get()
+    if metrics is not None:
+        setup = sum(timing.values()) if timing else 0.0
+        metrics.add_request(method, url, status, max(0.0, elapsed - setup), timing)
+
+
+def _resolve_time(host, port):
+    start = time.perf_counter()
+    try:
+        socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    except OSError:
+        pass
+    return time.perf_counter() - start
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """记录DNS和建立TCP连接耗时的连接"""
+
+    def _new_conn(self):
+        dns = _resolve_time(self._dns_host, self.port) if _current.get() is not None else 0.0
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _connect_timing.value = {'dns': dns, 'connect': time.perf_counter() - start}
+        return sock
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """记录DNS、建立TCP连接和TLS握手耗时的连接"""
+
+    def _new_conn(self):
+        dns = _resolve_time(self._dns_host, self.port) if _current.get() is not None else 0.0
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _connect_timing.value = {'dns': dns, 'connect': time.perf_counter() - start}
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        timing = getattr(_connect_timing, 'value', None)
+        if timing is not None:
+            timing['tls'] = max(0.0, time.perf_counter() - start - timing['connect'] - timing['dns'])
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+POOL_CLASSES = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+# ---------------------------------------------------------------------------
+# JSONL 记录
+# ---------------------------------------------------------------------------
+
+def run_record(run_id, mode, result, wall=None):
+    """
+    由脚本结果字典生成一行耗时记录
+
+    参数:
+        run_id: 批量运行的标识（开始时间）
+        mode: 运行模式（sequential / parallel / plugin-process / async 等）
+        wall: 批量执行.py 测得的脚本总耗时（包括启动子进程），为None时使用结果中的 elapsed
+    """
+    result = result or {}
+    elapsed = result.get('elapsed')
+    return {
+        'run_id': run_id,
+        'mode': mode,
+        'library': result.get('library'),
+        'status': result.get('status'),
+        'wall': round(wall, 3) if wall is not None else elapsed,
+        'elapsed': elapsed,
+        'phases': result.get('phases') or {},
+        'bytes': result.get('bytes'),
+        'metrics': {key: value for key, value in (result.get('metrics') or {}).items() if key != 'request_log'},
+        'request_log': (result.get('metrics') or {}).get('request_log', []),
+    }
+
+
+def append_record(path, record):
+    """追加一行JSON记录"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def read_records(path):
+    """读取所有记录（跳过损坏的行）"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+批量运行耗时汇总
+功能：
+1. 读取 logs/metrics.jsonl（批量执行.py 每个图书馆一行，见 common/metrics.py）
+2. 生成 logs/耗时汇总.html：最近一次运行按总耗时排序的图书馆列表（查找、下载、下载速度、
+   DNS/连接/TLS/首字节时间、解析、浏览器、页面等待），每个图书馆最近几次运行的耗时趋势，
+   以及各次运行的合计
+3. 安装了 pandas 时同时生成 logs/耗时汇总.xlsx（最近一次、各次运行、全部明细三个工作表）
+
+用法（在 年报下载1 目录下运行）:
+    python -m common.metrics_report               # 使用 logs/metrics.jsonl
+    python -m common.metrics_report --runs 20     # 趋势显示最近20次运行
+批量执行.py 每次运行结束时自动生成
+"""
+
+import os
+import sys
+import html
+import argparse
+import importlib.util
+from collections import OrderedDict
+
+from common.metrics import read_records
+
+# pandas 只在生成Excel汇总时导入（批量执行.py 启动时不加载pandas）
+PANDAS_AVAILABLE = importlib.util.find_spec('pandas') is not None
+
+METRICS_FILE = 'metrics.jsonl'
+REPORT_NAME = '耗时汇总'
+DEFAULT_TREND_RUNS = 10
+
+# (列名, 取值函数, 格式)
+_COLUMNS = [
+    ('总耗时(秒)', lambda r: r.get('wall'), '{:.1f}'),
+    ('查找(秒)', lambda r: (r.get('phases') or {}).get('find'), '{:.1f}'),
+    ('下载(秒)', lambda r: (r.get('phases') or {}).get('download'), '{:.1f}'),
+    ('下载量(MB)', lambda r: _mb(_m(r, 'download_bytes')), '{:.2f}'),
+    ('速度(MB/s)', lambda r: _m(r, 'mb_per_s'), '{:.2f}'),
+    ('请求数', lambda r: _m(r, 'requests'), '{:d}'),
+    ('新连接', lambda r: _m(r, 'new_connections'), '{:d}'),
+    ('DNS(秒)', lambda r: _m(r, 'dns'), '{:.2f}'),
+    ('连接(秒)', lambda r: _m(r, 'connect'), '{:.2f}'),
+    ('TLS(秒)', lambda r: _m(r, 'tls'), '{:.2f}'),
+    ('首字节合计(秒)', lambda r: _m(r, 'ttfb'), '{:.2f}'),
+    ('平均首字节(秒)', lambda r: _m(r, 'ttfb_avg'), '{:.3f}'),
+    ('解析(秒)', lambda r: _m(r, 'parse'), '{:.2f}'),
+    ('浏览器启动(秒)', lambda r: _m(r, 'browser_start'), '{:.1f}'),
+    ('浏览器(秒)', lambda r: _m(r, 'browser'), '{:.1f}'),
+    ('页面等待(秒)', lambda r: _m(r, 'wait'), '{:.1f}'),
+    ('限速等待(秒)', lambda r: _m(r, 'host_wait'), '{:.1f}'),
+]
+
+
+def _m(record, key):
+    return (record.get('metrics') or {}).get(key)
+
+
+def _mb(size):
+    return size / 1024 / 1024 if size else None
+
+
+def _fmt(value, fmt):
+    if value is None:
+        return ''
+    try:
+        return fmt.format(value)
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def group_runs(records):
+    """按 run_id 分组，返回 OrderedDict(run_id -> 记录列表)，按运行时间排序"""
+    runs = OrderedDict()
+    for record in sorted(records, key=lambda r: str(r.get('run_id', ''))):
+        runs.setdefault(record.get('run_id', ''), []).append(record)
+    return runs
+
+
+def summarize_run(run_id, records):
+    """一次运行的合计"""
+    walls = [r.get('wall') or 0 for r in records]
+    size = sum(_m(r, 'download_bytes') or 0 for r in records)
+    seconds = sum(_m(r, 'download_seconds') or 0 for r in records)
+    return {
+        'run_id': run_id,
+        'mode': records[0].get('mode', '') if records else '',
+        'libraries': len(records),
+        'success': sum(1 for r in records if r.get('status') == 'success'),
+        'wall_sum': round(sum(walls), 1),
+        'wall_max': round(max(walls), 1) if walls else 0,
+        'requests': sum(_m(r, 'requests') or 0 for r in records),
+        'download_mb': round(size / 1024 / 1024, 2),
+        'mb_per_s': round(size / 1024 / 1024 / seconds, 2) if size and seconds > 0 else None,
+    }
+
+
+def library_trends(runs, limit=DEFAULT_TREND_RUNS):
+    """每个图书馆最近 limit 次运行的总耗时，返回 {图书馆: [耗时或None, ...]}（按运行顺序）"""
+    run_ids = list(runs)[-limit:]
+    trends = {}
+    for index, run_id in enumerate(run_ids):
+        for record in runs[run_id]:
+            series = trends.setdefault(record.get('library'), [None] * len(run_ids))
+            series[index] = record.get('wall')
+    return trends
+
+
+def _sparkline(values, width=120, height=24):
+    """用内联SVG画耗时趋势（缺少的运行留空）"""
+    points = [(i, v) for i, v in enumerate(values) if v is not None]
+    if len(points) < 2:
+        return ''
+    top = max(v for _, v in points) or 1
+    step = width / max(1, len(values) - 1)
+    coords = ' '.join(f"{i * step:.1f},{height - 2 - v / top * (height - 4):.1f}" for i, v in points)
+    last_x, last_v = points[-1]
+    last_y = height - 2 - last_v / top * (height - 4)
+    return (f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+            f'<polyline fill="none" stroke="#4a7bd0" stroke-width="1.5" points="{coords}"/>'
+            f'<circle cx="{last_x * step:.1f}" cy="{last_y:.1f}" r="2" fill="#d04a4a"/></svg>')
+
+
+def _change(values):
+    """最近一次与上一次相比的变化（百分比）"""
+    known = [v for v in values if v is not None]
+    if len(known) < 2 or not known[-2]:
+        return ''
+    change = (known[-1] - known[-2]) / known[-2] * 100
+    color = '#c0392b' if change > 10 else ('#27ae60' if change < -10 else '#555')
+    return f'<span style="color:{color}">{change:+.0f}%</span>'
+
+
+_STYLE = """
+body { font-family: "Microsoft YaHei", sans-serif; font-size: 13px; margin: 20px; }
+table { border-collapse: collapse; margin-bottom: 24px; }
+th, td { border: 1px solid #ccc; padding: 3px 6px; text-align: right; white-space: nowrap; }
+th { background: #f0f0f0; }
+td.name { text-align: left; }
+tr.fail td.name { color: #c0392b; }
+"""
+
+
+def build_html(records, trend_runs=DEFAULT_TREND_RUNS):
+    """生成HTML汇总"""
+    runs = group_runs(records)
+    if not runs:
+        return '<html><body><p>没有耗时记录</p></body></html>'
+    latest_id = next(reversed(runs))
+    latest = sorted(runs[latest_id], key=lambda r: r.get('wall') or 0, reverse=True)
+    trends = library_trends(runs, trend_runs)
+
+    out = ['<!DOCTYPE html><html><head><meta charset="utf-8">',
+           f'<title>{REPORT_NAME}</title><style>{_STYLE}</style></head><body>']
+    summary = summarize_run(latest_id, runs[latest_id])
+    out.append(f'<h2>最近一次运行: {html.escape(str(latest_id))}（{html.escape(summary["mode"])}）</h2>')
+    out.append(f'<p>{summary["libraries"]} 个图书馆，成功 {summary["success"]}，'
+               f'最慢 {summary["wall_max"]} 秒，合计 {summary["wall_sum"]} 秒，'
+               f'下载 {summary["download_mb"]} MB</p>')
+
+    out.append('<table><tr><th>#</th><th>图书馆</th><th>状态</th>')
+    out.extend(f'<th>{name}</th>' for name, _, _ in _COLUMNS)
+    out.append(f'<th>最近{len(list(runs)[-trend_runs:])}次耗时</th><th>与上次相比</th></tr>')
+    for index, record in enumerate(latest, 1):
+        library = record.get('library')
+        row_class = '' if record.get('status') == 'success' else ' class="fail"'
+        out.append(f'<tr{row_class}><td>{index}</td><td class="name">{html.escape(str(library))}</td>'
+                   f'<td class="name">{html.escape(str(record.get("status")))}</td>')
+        out.extend(f'<td>{_fmt(getter(record), fmt)}</td>' for _, getter, fmt in _COLUMNS)
+        series = trends.get(library, [])
+        out.append(f'<td>{_sparkline(series)}</td><td>{_change(series)}</td></tr>')
+    out.append('</table>')
+
+    out.append('<h2>各次运行</h2><table><tr><th>运行</th><th>模式</th><th>图书馆数</th><th>成功</th>'
+               '<th>合计耗时(秒)</th><th>最慢(秒)</th><th>请求数</th><th>下载量(MB)</th><th>速度(MB/s)</th></tr>')
+    for run_id in reversed(runs):
+        s = summarize_run(run_id, runs[run_id])
+        out.append(f'<tr><td class="name">{html.escape(str(run_id))}</td><td class="name">{html.escape(s["mode"])}</td>'
+                   f'<td>{s["libraries"]}</td><td>{s["success"]}</td><td>{s["wall_sum"]}</td>'
+                   f'<td>{s["wall_max"]}</td><td>{s["requests"]}</td><td>{s["download_mb"]}</td>'
+                   f'<td>{_fmt(s["mb_per_s"], "{:.2f}")}</td></tr>')
+    out.append('</table></body></html>')
+    return '\n'.join(out)
+
+
+def _flat_row(record):
+    row = {'运行': record.get('run_id'), '模式': record.get('mode'),
+           '图书馆': record.get('library'), '状态': record.get('status')}
+    for name, getter, _ in _COLUMNS:
+        row[name] = getter(record)
+    return row
+
+
+def write_excel(records, excel_path):
+    """生成Excel汇总（需要pandas），返回是否成功"""
+    if not PANDAS_AVAILABLE:
+        return False
+    import pandas as pd
+    runs = group_runs(records)
+    if not runs:
+        return False
+    latest = sorted(runs[next(reversed(runs))], key=lambda r: r.get('wall') or 0, reverse=True)
+    run_rows = [summarize_run(run_id, runs[run_id]) for run_id in reversed(runs)]
+    with pd.ExcelWriter(excel_path) as writer:
+        pd.DataFrame([_flat_row(r) for r in latest]).to_excel(writer, sheet_name='最近一次', index=False)
+        pd.DataFrame(run_rows).rename(columns={
+            'run_id': '运行', 'mode': '模式', 'libraries': '图书馆数', 'success': '成功',
+            'wall_sum': '合计耗时(秒)', 'wall_max': '最慢(秒)', 'requests': '请求数',
+            'download_mb': '下载量(MB)', 'mb_per_s': '速度(MB/s)',
+        }).to_excel(writer, sheet_name='各次运行', index=False)
+        pd.DataFrame([_flat_row(r) for r in records]).to_excel(writer, sheet_name='全部明细', index=False)
+    return True
+
+
+def write_reports(metrics_path, output_dir=None, trend_runs=DEFAULT_TREND_RUNS, log=print):
+    """根据 metrics.jsonl 生成HTML（以及Excel）汇总，返回HTML路径，没有记录时返回None"""
+    records = read_records(metrics_path)
+    if not records:
+        log(f"没有耗时记录: {metrics_path}")
+        return None
+    output_dir = output_dir or os.path.dirname(os.path.abspath(metrics_path))
+    html_path = os.path.join(output_dir, REPORT_NAME + '.html')
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(build_html(records, trend_runs))
+    log(f"耗时汇总: {html_path}")
+    excel_path = os.path.join(output_dir, REPORT_NAME + '.xlsx')
+    try:
+        if write_excel(records, excel_path):
+            log(f"耗时汇总: {excel_path}")
+    except Exception as e:
+        log(f"⚠️  生成Excel耗时汇总失败: {e}")
+    return html_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量运行耗时汇总')
+    parser.add_argument('metrics', nargs='?', help='耗时记录文件（默认 logs/metrics.jsonl）')
+    parser.add_argument('--runs', type=int, default=DEFAULT_TREND_RUNS, help='趋势显示的运行次数（默认10）')
+    args = parser.parse_args(argv)
+
+    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    metrics_path = args.metrics or os.path.join(script_dir, 'logs', METRICS_FILE)
+    return 0 if write_reports(metrics_path, trend_runs=max(2, args.runs)) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
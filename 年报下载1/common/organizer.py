@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+校验后移动的文件夹整理（整理.py 的 organize_mode=verified）
+功能：
+1. 先扫描源文件夹生成移动计划（逐个文件，保留子文件夹结构），再在线程池中执行
+2. 源和目标在同一磁盘时直接重命名；跨磁盘时用大块缓冲复制，边复制边计算SHA-256，
+   复制完成后重新读取目标文件核对哈希，一致才删除源文件（不会因复制中断丢失年报）
+3. 内容相同的年报在目标文件夹中只保存一份，其余用硬链接指向它（文件系统不支持硬链接时保留副本）
+4. 覆盖时只替换同名文件（先写临时文件再原子替换），不再删除整个已存在的文件夹
+5. 在目标文件夹中保存整理清单（整理清单.json），记录每个文件的大小、修改时间和哈希；
+   再次运行时按相对路径查询清单，大小和修改时间一致的文件直接跳过，不再重新读取
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+MANIFEST_NAME = '整理清单.json'
+TMP_SUFFIX = '.整理中'
+SKIP_SUFFIXES = ('.part', '.part.json', TMP_SUFFIX)   # 未完成的下载和上次中断的临时文件不移动
+
+BUFFER_SIZE = 4 * 1024 * 1024      # 复制和计算哈希时每次读写的大小
+DEFAULT_WORKERS = 4
+
+RESULT_MOVED = 'moved'
+RESULT_LINKED = 'linked'           # 与已有文件内容相同，改为硬链接
+
+
+class OrganizeError(Exception):
+    """复制校验不通过"""
+
+
+class Manifest:
+    """目标文件夹中的整理清单：相对路径 -> {size, mtime_ns, sha256}，以及哈希 -> 相对路径的索引"""
+
+    def __init__(self, target_dir):
+        self.path = os.path.join(target_dir, MANIFEST_NAME)
+        self.files = {}
+        self.by_hash = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = dict(data.get('files') or {})
+        except Exception as e:
+            print(f"⚠️  整理清单无法读取，将重新建立: {e}")
+            self.files = {}
+        for rel, entry in self.files.items():
+            self.by_hash.setdefault(entry.get('sha256'), rel)
+
+    def is_organized(self, rel, size, mtime_ns, target_path):
+        """源文件是否已经整理过（清单中的大小、修改时间一致，且目标文件仍然存在）"""
+        entry = self.files.get(rel)
+        if not entry or entry.get('size') != size or entry.get('mtime_ns') != mtime_ns:
+            return False
+        try:
+            return os.stat(target_path).st_size == size
+        except OSError:
+            return False
+
+    def claim(self, rel, size, mtime_ns, digest):
+        """
+        记录文件，返回内容相同的已有文件的相对路径（没有时返回None）
+
+        在同一个锁中查询和登记，同时复制的两个相同文件只有一个成为原件
+        """
+        with self._lock:
+            # 覆盖时旧内容不再存在，不能再作为硬链接的原件
+            previous = self.files.get(rel)
+            if previous and self.by_hash.get(previous.get('sha256')) == rel:
+                del self.by_hash[previous['sha256']]
+            original = self.by_hash.get(digest)
+            self.files[rel] = {'size': size, 'mtime_ns': mtime_ns, 'sha256': digest}
+            if original is None:
+                self.by_hash[digest] = rel
+            return original
+
+    def forget(self, rel):
+        with self._lock:
+            entry = self.files.pop(rel, None)
+            if entry and self.by_hash.get(entry.get('sha256')) == rel:
+                del self.by_hash[entry['sha256']]
+
+    def save(self):
+        with self._lock:
+            data = {'version': 1, 'files': self.files}
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=0)
+            os.replace(tmp_path, self.path)
+
+
+def _hash_file(path, buffer):
+    digest = hashlib.sha256()
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _copy_with_hash(source_path, tmp_path, buffer):
+    """大块缓冲复制并计算源文件的哈希，复制修改时间等属性"""
+    digest = hashlib.sha256()
+    view = memoryview(buffer)
+    with open(source_path, 'rb', buffering=0) as src, open(tmp_path, 'wb', buffering=0) as dst:
+        while True:
+            n = src.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+            dst.write(view[:n])
+        dst.flush()
+        os.fsync(dst.fileno())
+    stat = os.stat(source_path)
+    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return digest.hexdigest()
+
+
+def _same_size(path, size):
+    try:
+        return os.path.getsize(path) == size
+    except OSError:
+        return False
+
+
+def _replace_with_link(original_path, target_path):
+    """把 target_path 替换为指向 original_path 的硬链接，失败时保留原文件"""
+    link_tmp = target_path + TMP_SUFFIX
+    try:
+        if os.path.exists(link_tmp):
+            os.remove(link_tmp)
+        os.link(original_path, link_tmp)
+        os.replace(link_tmp, target_path)
+        return True
+    except OSError:
+        try:
+            os.remove(link_tmp)
+        except OSError:
+            pass
+        return False
+
+
+def plan_moves(source_dir, target_dir, manifest, overwrite=False):
+    """
+    扫描源文件夹，返回 (待移动列表, 已整理的源文件列表, 因目标已存在而跳过的数量)
+
+    待移动列表的每项为 (相对路径, 源文件, 目标文件, 大小, 修改时间ns)
+    """
+    moves = []
+    organized = []
+    exists_count = 0
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(source_dir, rel_dir)) as entries:
+            for entry in entries:
+                rel = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(rel)
+                    continue
+                if entry.name == MANIFEST_NAME or entry.name.endswith(SKIP_SUFFIXES):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                key = rel.replace(os.sep, '/')
+                target_path = os.path.join(target_dir, rel)
+                if manifest.is_organized(key, stat.st_size, stat.st_mtime_ns, target_path):
+                    organized.append(entry.path)
+                elif not overwrite and os.path.lexists(target_path):
+                    exists_count += 1
+                else:
+                    moves.append((key, entry.path, target_path, stat.st_size, stat.st_mtime_ns))
+    return moves, organized, exists_count
+
+
+def _move_one(item, target_dir, manifest, same_device, dedupe, buffers):
+    key, source_path, target_path, size, mtime_ns = item
+    buffer = getattr(buffers, 'buffer', None)
+    if buffer is None:
+        buffer = buffers.buffer = bytearray(BUFFER_SIZE)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+    if same_device:
+        # 同一磁盘：重命名是原子操作，内容不会变化，之后计算哈希用于清单和去重
+        os.replace(source_path, target_path)
+        digest = _hash_file(target_path, buffer)
+    else:
+        tmp_path = target_path + TMP_SUFFIX
+        try:
+            digest = _copy_with_hash(source_path, tmp_path, buffer)
+            if os.path.getsize(tmp_path) != size or _hash_file(tmp_path, buffer) != digest:
+                raise OrganizeError("复制后的文件与源文件不一致")
+            os.replace(tmp_path, target_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        os.remove(source_path)
+
+    original = manifest.claim(key, size, mtime_ns, digest)
+    if dedupe and original is not None:
+        original_path = os.path.join(target_dir, original.replace('/', os.sep))
+        if _same_size(original_path, size) and _replace_with_link(original_path, target_path):
+            return RESULT_LINKED
+    return RESULT_MOVED
+
+
+def _remove_empty_dirs(source_dir):
+    """删除源文件夹中已经移空的子文件夹（源文件夹本身保留）"""
+    for root, dirs, files in os.walk(source_dir, topdown=False):
+        if root == source_dir:
+            continue
+        try:
+            os.rmdir(root)
+        except OSError:
+            pass
+
+
+def organize(source_dir, target_dir, overwrite=False, max_workers=DEFAULT_WORKERS, dedupe=True, log=print):
+    """
+    校验后移动 source_dir 中的所有文件到 target_dir
+
+    返回:
+        统计字典 {moved, linked, skipped, organized, failed, bytes, seconds}
+    """
+    stats = {'moved': 0, 'linked': 0, 'skipped': 0, 'organized': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0}
+    if not os.path.isdir(source_dir):
+        log(f"✗ 源文件夹不存在: {source_dir}")
+        return stats
+    try:
+        os.makedirs(target_dir, exist_ok=True)
+    except Exception as e:
+        log(f"✗ 创建目标文件夹失败: {e}")
+        return stats
+
+    start = time.time()
+    manifest = Manifest(target_dir)
+    moves, organized, stats['skipped'] = plan_moves(source_dir, target_dir, manifest, overwrite)
+    same_device = os.stat(source_dir).st_dev == os.stat(target_dir).st_dev
+
+    # 清单中已有、目标文件完好的源文件：上次已复制校验，只是没有删除源文件
+    for path in organized:
+        try:
+            os.remove(path)
+            stats['organized'] += 1
+        except OSError as e:
+            log(f"⚠️  无法删除已整理的源文件: {path} - {e}")
+
+    total_bytes = sum(item[3] for item in moves)
+    log(f"\n移动计划: {len(moves)} 个文件（{total_bytes / 1024 / 1024:.1f} MB），"
+        f"已整理 {stats['organized']} 个，目标已存在跳过 {stats['skipped']} 个")
+    log(f"{'同一磁盘，直接重命名' if same_device else '跨磁盘复制并校验哈希'}，{max_workers} 个线程"
+        f"{'，相同内容使用硬链接' if dedupe else ''}")
+    log("-" * 60)
+
+    buffers = threading.local()
+    print_lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(_move_one, item, target_dir, manifest, same_device, dedupe, buffers): item
+                   for item in moves}
+        for done_count, future in enumerate(as_completed(futures), 1):
+            key, _, _, size, _ = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                manifest.forget(key)
+                stats['failed'] += 1
+                with print_lock:
+                    log(f"✗ 移动失败: {key} - {e}")
+                continue
+            stats['bytes'] += size
+            stats['linked' if result == RESULT_LINKED else 'moved'] += 1
+            with print_lock:
+                log(f"[{done_count}/{len(moves)}] ✓ {key}{'（硬链接）' if result == RESULT_LINKED else ''}")
+            if done_count % 200 == 0:
+                manifest.save()
+
+    manifest.save()
+    _remove_empty_dirs(source_dir)
+    stats['seconds'] = time.time() - start
+    return stats
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+页面就绪等待（Selenium）
+功能：
+1. 按具体信号等待，代替固定的 time.sleep()：
+   document.readyState、网络空闲（Resource Timing API 一段时间内没有新的资源请求完成）、
+   DOM静止（MutationObserver 一段时间内没有变化）、元素位置稳定、图片加载完成
+2. 每个站点一个等待预算（秒），所有等待共用，超出预算后不再等待，避免慢速网站拖住整个批次
+3. 记录每项等待的实际耗时和超时设置，结束时输出等待报告（实际耗时 / 预算）；
+   等待时间同时计入运行统计的 wait（common/metrics.py）
+
+说明：通过 execute_cdp_cmd 无法订阅CDP的Network事件，网络空闲使用页面内的
+performance.getEntriesByType('resource') 判断
+"""
+
+import time
+
+from common import metrics
+
+DEFAULT_BUDGET = 60          # 默认每个站点的等待预算（秒）
+POLL_INTERVAL = 0.1          # 检查间隔（秒）
+
+# 较慢的站点使用更大的预算
+SITE_BUDGETS = {
+    '内蒙古图书馆': 120,
+}
+
+# 在页面中安装 MutationObserver，记录最后一次DOM变化的时间（重复安装无影响）
+_INSTALL_OBSERVER_JS = """
+if (!window.__nianbaoMutation) {
+    window.__nianbaoMutation = {last: performance.now()};
+    new MutationObserver(function() {
+        window.__nianbaoMutation.last = performance.now();
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return performance.now() - window.__nianbaoMutation.last;
+"""
+
+_MUTATION_AGE_JS = """
+return window.__nianbaoMutation ? performance.now() - window.__nianbaoMutation.last : null;
+"""
+
+_RESOURCE_STATE_JS = """
+return [document.readyState, performance.getEntriesByType('resource').length];
+"""
+
+_PENDING_IMAGES_JS = """
+var pending = 0;
+var images = document.images;
+for (var i = 0; i < images.length; i++) {
+    if (!images[i].complete) { pending++; }
+}
+return pending;
+"""
+
+_RECT_JS = """
+var r = arguments[0].getBoundingClientRect();
+return [r.left, r.top, r.width, r.height];
+"""
+
+
+class PageReadiness:
+    """
+    页面就绪等待
+
+    参数:
+        driver: WebDriver
+        site: 站点名称（用于选择预算和输出报告）
+        budget: 等待预算（秒），为None时使用 SITE_BUDGETS 或 DEFAULT_BUDGET
+    """
+
+    def __init__(self, driver, site='', budget=None):
+        self.driver = driver
+        self.site = site
+        self.budget = budget if budget is not None else SITE_BUDGETS.get(site, DEFAULT_BUDGET)
+        self.spent = 0.0
+        self.waits = []
+
+    # ------------------------------------------------------------------
+    # 基础
+    # ------------------------------------------------------------------
+
+    def remaining(self):
+        return max(0.0, self.budget - self.spent)
+
+    def _wait(self, name, timeout, condition):
+        """
+        轮询 condition()，返回True表示在超时前满足条件
+
+        实际超时取 timeout 和剩余预算中较小的值；预算用完时只检查一次
+        """
+        limit = min(timeout, self.remaining())
+        start = time.time()
+        ok = False
+        while True:
+            try:
+                ok = bool(condition())
+            except Exception:
+                ok = False
+            if ok or time.time() - start >= limit:
+                break
+            time.sleep(POLL_INTERVAL)
+        elapsed = time.time() - start
+        self.spent += elapsed
+        metrics.add_time('wait', elapsed)
+        self.waits.append({'name': name, 'elapsed': round(elapsed, 2), 'timeout': timeout, 'ok': ok})
+        return ok
+
+    # ------------------------------------------------------------------
+    # 等待条件
+    # ------------------------------------------------------------------
+
+    def document_ready(self, timeout=30):
+        """等待 document.readyState == 'complete'"""
+        return self._wait('document_ready', timeout,
+                          lambda: self.driver.execute_script('return document.readyState') == 'complete')
+
+    def network_idle(self, timeout=15, idle=0.5):
+        """等待网络空闲：页面加载完成，且 idle 秒内没有新的资源请求完成"""
+        state = {'count': -1, 'since': time.time()}
+
+        def condition():
+            ready_state, count = self.driver.execute_script(_RESOURCE_STATE_JS)
+            now = time.time()
+            if count != state['count']:
+                state['count'] = count
+                state['since'] = now
+                return False
+            return ready_state == 'complete' and now - state['since'] >= idle
+
+        return self._wait('network_idle', timeout, condition)
+
+    def dom_quiet(self, timeout=10, quiet=0.5):
+        """等待DOM静止：quiet 秒内没有任何DOM变化"""
+        try:
+            self.driver.execute_script(_INSTALL_OBSERVER_JS)
+        except Exception:
+            pass
+
+        def condition():
+            age = self.driver.execute_script(_MUTATION_AGE_JS)
+            if age is None:
+                # 页面已跳转，重新安装
+                self.driver.execute_script(_INSTALL_OBSERVER_JS)
+                return False
+            return age >= quiet * 1000
+
+        return self._wait('dom_quiet', timeout, condition)
+
+    def element_stable(self, element, timeout=5, settle=0.3):
+        """等待元素位置和大小稳定（平滑滚动、动画结束）"""
+        state = {'rect': None, 'since': time.time()}
+
+        def condition():
+            rect = self.driver.execute_script(_RECT_JS, element)
+            now = time.time()
+            if rect != state['rect']:
+                state['rect'] = rect
+                state['since'] = now
+                return False
+            return now - state['since'] >= settle
+
+        return self._wait('element_stable', timeout, condition)
+
+    def images_loaded(self, timeout=15):
+        """等待页面中的图片全部加载完成（加载失败的图片也算完成）"""
+        return self._wait('images_loaded', timeout,
+                          lambda: self.driver.execute_script(_PENDING_IMAGES_JS) == 0)
+
+    def selector_present(self, css_selector, timeout=10):
+        """等待页面中出现匹配CSS选择器的元素"""
+        return self._wait('selector_present', timeout, lambda: self.driver.execute_script(
+            'return document.querySelector(arguments[0]) !== null', css_selector))
+
+    def navigation(self, url_before, handles_before, timeout=10):
+        """点击后等待跳转：URL变化或打开了新窗口"""
+        return self._wait('navigation', timeout, lambda: (
+            self.driver.current_url != url_before or len(self.driver.window_handles) > handles_before))
+
+    def settled(self, timeout=30):
+        """等待页面完全就绪：加载完成、网络空闲、DOM静止（共用 timeout）"""
+        start = time.time()
+        ok = self.document_ready(timeout)
+        ok = self.network_idle(max(0, timeout - (time.time() - start))) and ok
+        ok = self.dom_quiet(max(0, timeout - (time.time() - start))) and ok
+        return ok
+
+    # ------------------------------------------------------------------
+    # 滚动
+    # ------------------------------------------------------------------
+
+    def scroll_through(self, max_passes=3, step_timeout=2):
+        """
+        逐屏滚动整个页面，触发懒加载内容，每屏等待DOM静止；
+        页面高度在一次完整滚动后不再变化时停止，返回最终页面高度
+        """
+        height = self.driver.execute_script('return document.body.scrollHeight')
+        for _ in range(max_passes):
+            start_height = height
+            step = self.driver.execute_script('return window.innerHeight') or 800
+            position = 0
+            while position < height:
+                position += step
+                self.driver.execute_script(f'window.scrollTo(0, {position});')
+                self.dom_quiet(timeout=step_timeout, quiet=0.3)
+                height = self.driver.execute_script('return document.body.scrollHeight')
+            self.network_idle(timeout=step_timeout * 2)
+            height = self.driver.execute_script('return document.body.scrollHeight')
+            if height <= start_height:
+                break
+            print(f"  检测到新内容加载，页面高度: {height}px")
+        return height
+
+    # ------------------------------------------------------------------
+    # 报告
+    # ------------------------------------------------------------------
+
+    def summary(self):
+        return {
+            'site': self.site,
+            'budget': self.budget,
+            'spent': round(self.spent, 2),
+            'waits': list(self.waits),
+        }
+
+    def print_summary(self):
+        """输出等待报告：实际等待时间与预算，以及各类等待的次数、耗时和超时次数"""
+        print(f"  等待耗时: {self.spent:.1f} 秒 / 预算 {self.budget} 秒"
+              + ("（预算已用完）" if self.remaining() <= 0 else ""))
+        totals = {}
+        for wait in self.waits:
+            total = totals.setdefault(wait['name'], [0, 0.0, 0])
+            total[0] += 1
+            total[1] += wait['elapsed']
+            total[2] += 0 if wait['ok'] else 1
+        for name, (count, elapsed, timeouts) in totals.items():
+            print(f"    {name}: {count} 次，{elapsed:.1f} 秒" + (f"，超时 {timeouts} 次" if timeouts else ""))
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+年报文件完整性校验
+功能：
+1. 用内存映射读取文件，只检查结构，不完整解析：
+   PDF检查 %PDF 文件头、%%EOF 结尾、startxref 指向的交叉引用表（或交叉引用流）和 trailer，
+   并抽查交叉引用表中的对象位置；DOCX/XLSX检查ZIP目录结尾；DOC/XLS检查OLE文件头
+2. 识别伪装成年报的网页（服务器返回的错误页、登录页、验证码页被保存为 .pdf）和下载不完整的文件
+3. 结构检查无法确定时（交叉引用位置不一致等，很多阅读器能自动修复）才用 PyPDF2 / PyMuPDF 完整解析
+4. verify_folder() 在进程池中校验整个文件夹，write_report() 输出CSV报告
+
+用法（在 年报下载1 目录下运行）:
+    python 批量执行.py --verify              # 校验 config.txt 中的 output_folder
+    python -m common.pdf_verify D:\\图书馆年报
+"""
+
+import os
+import re
+import csv
+import sys
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import PyPDF2
+    PYPDF2_AVAILABLE = True
+except ImportError:
+    PYPDF2_AVAILABLE = False
+
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+STATUS_OK = 'ok'                # 正常
+STATUS_EMPTY = 'empty'          # 空文件
+STATUS_HTML = 'html'            # 实际是网页
+STATUS_NOT_PDF = 'not_pdf'      # 文件头与扩展名不符
+STATUS_TRUNCATED = 'truncated'  # 下载不完整
+STATUS_DAMAGED = 'damaged'      # 结构损坏，完整解析也失败
+STATUS_SUSPECT = 'suspect'      # 结构不一致，且没有可用的PDF库完整解析
+STATUS_ERROR = 'error'          # 无法读取
+
+BAD_STATUSES = (STATUS_EMPTY, STATUS_HTML, STATUS_NOT_PDF, STATUS_TRUNCATED, STATUS_DAMAGED, STATUS_ERROR)
+
+STATUS_LABELS = {
+    STATUS_OK: '正常',
+    STATUS_EMPTY: '空文件',
+    STATUS_HTML: '网页',
+    STATUS_NOT_PDF: '格式不符',
+    STATUS_TRUNCATED: '不完整',
+    STATUS_DAMAGED: '已损坏',
+    STATUS_SUSPECT: '可疑',
+    STATUS_ERROR: '读取失败',
+}
+
+CHECKED_EXTENSIONS = ('.pdf', '.docx', '.xlsx', '.doc', '.xls')
+
+HEAD_SIZE = 1024            # %PDF 文件头允许出现的范围
+TAIL_SIZE = 2048            # %%EOF 和 startxref 所在的结尾范围
+OFFSET_SLACK = 16           # 对象位置允许的偏差（部分生成器多写或少写换行）
+SAMPLE_OBJECTS = 16         # 抽查的对象数
+
+_HTML_MARKERS = (b'<!doctype html', b'<html', b'<head', b'<body', b'<script', b'<meta', b'<title')
+_STARTXREF_RE = re.compile(rb'startxref\s+(\d+)')
+_SUBSECTION_RE = re.compile(rb'(\d+)\s+(\d+)\s*[\r\n]')
+_OBJ_RE = re.compile(rb'\d+\s+\d+\s+obj\b')
+
+
+def _looks_like_html(head):
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    return any(marker in text for marker in _HTML_MARKERS)
+
+
+def _result(path, status, detail, size=None):
+    return {'path': path, 'status': status, 'detail': detail, 'size': size}
+
+
+def _object_at(data, offset):
+    """offset 附近（允许少量偏差）是否是对象的开始"""
+    start = max(0, offset - OFFSET_SLACK)
+    return _OBJ_RE.search(data, start, offset + OFFSET_SLACK + 32) is not None
+
+
+def _check_xref_table(data, offset):
+    """
+    检查传统交叉引用表（xref ... trailer），返回问题说明，没有问题返回None
+
+    抽查表中使用中（n）的对象，位置上应当是 "N G obj"
+    """
+    position = offset + 4
+    entries = []
+    while True:
+        while data[position:position + 1] in (b' ', b'\t', b'\r', b'\n'):
+            position += 1
+        match = _SUBSECTION_RE.match(data, position)
+        if not match:
+            break
+        count = int(match.group(2))
+        position = match.end()
+        # 每条记录固定20字节：10位偏移 5位代数 n/f 两字节行尾
+        table_end = position + count * 20
+        if table_end > len(data):
+            return "交叉引用表超出文件范围"
+        for index in range(count):
+            entry = data[position + index * 20:position + index * 20 + 18]
+            if entry[17:18] == b'n':
+                try:
+                    entries.append(int(entry[:10]))
+                except ValueError:
+                    return "交叉引用表格式不规范"
+        position = table_end
+    if data.find(b'trailer', position, position + 64) < 0:
+        return "交叉引用表后缺少 trailer"
+    trailer = data[position:position + 4096]
+    if b'/Root' not in trailer or b'/Size' not in trailer:
+        return "trailer 缺少 /Root 或 /Size"
+    if not entries:
+        return None
+    step = max(1, len(entries) // SAMPLE_OBJECTS)
+    for object_offset in entries[::step]:
+        if object_offset >= len(data) or not _object_at(data, object_offset):
+            return f"交叉引用表中的对象位置不正确: {object_offset}"
+    return None
+
+
+def _check_pdf_structure(data):
+    """
+    检查PDF结构，返回 (状态, 说明)
+
+    状态为None表示结构不一致但不能确定已损坏，需要完整解析
+    """
+    size = len(data)
+    head = data[:HEAD_SIZE]
+    if b'%PDF-' not in head:
+        if _looks_like_html(head):
+            return STATUS_HTML, "文件内容是网页，不是PDF"
+        return STATUS_NOT_PDF, "缺少 %PDF 文件头"
+
+    tail_start = max(0, size - TAIL_SIZE)
+    eof = data.rfind(b'%%EOF', tail_start)
+    if eof < 0:
+        return STATUS_TRUNCATED, "缺少 %%EOF 结尾，文件不完整"
+
+    matches = list(_STARTXREF_RE.finditer(data, max(0, eof - TAIL_SIZE), eof))
+    if not matches:
+        return None, "缺少 startxref"
+    offset = int(matches[-1].group(1))
+    if offset >= size:
+        return STATUS_TRUNCATED, f"startxref 指向文件之外（{offset:,} / {size:,} 字节），文件不完整"
+
+    window = data[offset:offset + 64]
+    if window.startswith(b'xref'):
+        problem = _check_xref_table(data, offset)
+        return (STATUS_OK, "结构完整") if problem is None else (None, problem)
+    if _OBJ_RE.match(window) and b'/XRef' in data[offset:offset + 1024]:
+        # 交叉引用流（PDF 1.5+）经过压缩，不展开检查
+        return STATUS_OK, "结构完整（交叉引用流）"
+    return None, f"startxref 位置没有交叉引用表: {offset:,}"
+
+
+def _full_parse(path):
+    """用PDF库完整打开文件，返回 (是否成功, 说明)，没有可用的库时返回 (None, 说明)"""
+    if PYPDF2_AVAILABLE:
+        try:
+            with open(path, 'rb') as f:
+                reader = PyPDF2.PdfReader(f)
+                if len(reader.pages) == 0:
+                    return False, "PDF文件没有页面"
+            return True, "PyPDF2解析正常"
+        except Exception as e:
+            return False, f"PyPDF2解析失败: {e}"
+    if PYMUPDF_AVAILABLE:
+        try:
+            with fitz.open(path) as doc:
+                if doc.page_count == 0:
+                    return False, "PDF文件没有页面"
+            return True, "PyMuPDF解析正常"
+        except Exception as e:
+            return False, f"PyMuPDF解析失败: {e}"
+    return None, "未安装PyPDF2或PyMuPDF，无法完整解析"
+
+
+def _check_office(data, extension):
+    head = data[:HEAD_SIZE]
+    if extension in ('.docx', '.xlsx'):
+        if not head.startswith(b'PK\x03\x04'):
+            if _looks_like_html(head):
+                return STATUS_HTML, "文件内容是网页，不是Office文档"
+            return STATUS_NOT_PDF, "缺少ZIP文件头"
+        # ZIP目录结尾记录（最长22字节 + 64KB注释）
+        if data.rfind(b'PK\x05\x06', max(0, len(data) - 65557)) < 0:
+            return STATUS_TRUNCATED, "缺少ZIP目录结尾，文件不完整"
+        return STATUS_OK, "结构完整"
+    if not head.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        if _looks_like_html(head):
+            return STATUS_HTML, "文件内容是网页，不是Office文档"
+        return STATUS_NOT_PDF, "缺少OLE文件头"
+    # OLE文件由512字节的扇区组成
+    if (len(data) - 512) % 512:
+        return STATUS_TRUNCATED, "文件大小不是完整的扇区，文件不完整"
+    return STATUS_OK, "结构完整"
+
+
+def check_file(path):
+    """
+    校验一个年报文件，返回 {'path', 'status', 'detail', 'size'}
+
+    status 见 STATUS_* 常量；文件不会被修改
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        size = os.path.getsize(path)
+        if size == 0:
+            return _result(path, STATUS_EMPTY, "文件为空", 0)
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if extension == '.pdf':
+                status, detail = _check_pdf_structure(data)
+            else:
+                status, detail = _check_office(data, extension)
+    except (OSError, ValueError) as e:
+        return _result(path, STATUS_ERROR, f"读取文件失败: {e}")
+
+    if status is None:
+        ok, parse_detail = _full_parse(path)
+        if ok is None:
+            status = STATUS_SUSPECT
+        else:
+            status = STATUS_OK if ok else STATUS_DAMAGED
+        detail = f"{detail}；{parse_detail}"
+    return _result(path, status, detail, size)
+
+
+def collect_files(folder):
+    """列出文件夹（含子文件夹）中需要校验的年报文件"""
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(CHECKED_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def verify_folder(folder, max_workers=None):
+    """在进程池中校验文件夹中的所有年报文件，返回结果列表（与 collect_files 顺序相同）"""
+    paths = collect_files(folder)
+    if len(paths) < 2 or max_workers == 1:
+        return [check_file(path) for path in paths]
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(check_file, paths, chunksize=8))
+    except (OSError, RuntimeError) as e:
+        # 无法创建进程池（受限环境等）时在当前进程中校验
+        print(f"⚠️  无法使用进程池（{e}），改为逐个校验")
+        return [check_file(path) for path in paths]
+
+
+def write_report(results, report_path, folder=None):
+    """把校验结果写成CSV（Excel可直接打开），有问题的文件排在前面"""
+    order = {status: index for index, status in enumerate(BAD_STATUSES + (STATUS_SUSPECT, STATUS_OK))}
+    rows = sorted(results, key=lambda item: (order.get(item['status'], 0), item['path']))
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['文件', '状态', '大小（字节）', '说明'])
+        for item in rows:
+            path = os.path.relpath(item['path'], folder) if folder else item['path']
+            writer.writerow([path, STATUS_LABELS.get(item['status'], item['status']),
+                             item['size'] if item['size'] is not None else '', item['detail']])
+    return report_path
+
+
+def summarize(results):
+    """按状态统计数量"""
+    counts = {}
+    for item in results:
+        counts[item['status']] = counts.get(item['status'], 0) + 1
+    return counts
+
+
+def print_problems(results, folder=None, log=print):
+    """输出有问题的文件和统计"""
+    problems = [item for item in results if item['status'] != STATUS_OK]
+    for item in problems:
+        path = os.path.relpath(item['path'], folder) if folder else item['path']
+        log(f"  ✗ [{STATUS_LABELS.get(item['status'], item['status'])}] {path}: {item['detail']}")
+    counts = summarize(results)
+    log(f"\n共校验 {len(results)} 个文件：" + "，".join(
+        f"{STATUS_LABELS.get(status, status)} {count}" for status, count in sorted(
+            counts.items(), key=lambda item: item[0] != STATUS_OK)))
+    return problems
+
+
+if __name__ == '__main__':
+    target = sys.argv[1] if len(sys.argv) > 1 else '.'
+    results = verify_folder(target)
+    print_problems(results, target)
+    print(f"报告: {write_report(results, os.path.join(target, '校验报告.csv'), target)}")
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+图书馆脚本插件运行器
+功能：
+1. 将 <馆名>.py 作为模块导入（每个进程只导入一次），调用其 run(config) 或 main()
+2. 进程模式：常驻工作进程复用已导入的 requests/bs4/selenium 等依赖，超时后重启该进程
+3. 线程模式：在当前进程的线程中运行，按线程分别捕获输出（异步模式同样使用该捕获方式）
+4. 打包成exe后 sys.executable 是exe本身，无法用子进程运行.py脚本，此时只能使用插件模式
+"""
+
+import os
+import sys
+import io
+import queue
+import threading
+import traceback
+import contextvars
+import importlib.util
+import multiprocessing
+from contextlib import redirect_stdout, redirect_stderr
+
+# 已导入的图书馆模块缓存 {脚本路径: 模块}
+_module_cache = {}
+_module_lock = threading.Lock()
+
+
+def load_library_module(script_path):
+    """导入图书馆脚本为模块（同一进程内只导入一次）"""
+    script_path = os.path.abspath(script_path)
+    with _module_lock:
+        module = _module_cache.get(script_path)
+        if module is not None:
+            return module
+
+        script_dir = os.path.dirname(script_path)
+        if script_dir not in sys.path:
+            sys.path.insert(0, script_dir)
+
+        module_name = 'library_' + os.path.splitext(os.path.basename(script_path))[0]
+        spec = importlib.util.spec_from_file_location(module_name, script_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except Exception:
+            sys.modules.pop(module_name, None)
+            raise
+        _module_cache[script_path] = module
+        return module
+
+
+def call_library(script_path, config=None):
+    """调用图书馆脚本入口：优先使用 run(config)，否则调用 main()"""
+    module = load_library_module(script_path)
+    if hasattr(module, 'run'):
+        return module.run(config)
+    return module.main()
+
+
+def run_captured(script_path, config=None):
+    """
+    在当前线程运行图书馆脚本并捕获输出
+
+    返回:
+        {'returned': 入口函数返回值, 'output': 标准输出, 'stderr': 标准错误, 'error': 异常信息或None}
+    """
+    out = io.StringIO()
+    err = io.StringIO()
+    returned = None
+    error = None
+    with _capture_output(out, err):
+        try:
+            returned = call_library(script_path, config)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                error = f"SystemExit: {e.code}"
+        except BaseException:
+            error = traceback.format_exc()
+    return {'returned': returned, 'output': out.getvalue(), 'stderr': err.getvalue(), 'error': error}
+
+
+# ---------------------------------------------------------------------------
+# 输出捕获：线程模式和异步模式下多个脚本同时运行，sys.stdout 需要按线程/协程分发
+# ---------------------------------------------------------------------------
+
+class _ContextStream(io.TextIOBase):
+    """
+    按上下文分发写入的输出流，未设置捕获的上下文写入原始流
+
+    每个线程有独立的上下文，因此可以按线程捕获；异步引擎提交的协程和线程会继承
+    发起调用的上下文，脚本内部并发探测的输出也记录到该脚本
+    """
+
+    def __init__(self, original):
+        self.original = original
+        self.buffer_var = contextvars.ContextVar(f'capture_{id(self)}', default=None)
+
+    def _target(self):
+        return self.buffer_var.get() or self.original
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        target = self._target()
+        if hasattr(target, 'flush'):
+            target.flush()
+
+    @property
+    def encoding(self):
+        return getattr(self.original, 'encoding', 'utf-8')
+
+
+_stream_lock = threading.Lock()
+
+
+def install_output_capture():
+    """安装按线程/协程分发的 stdout/stderr（只安装一次）"""
+    with _stream_lock:
+        if not isinstance(sys.stdout, _ContextStream):
+            sys.stdout = _ContextStream(sys.stdout)
+        if not isinstance(sys.stderr, _ContextStream):
+            sys.stderr = _ContextStream(sys.stderr)
+
+
+class _capture_output:
+    """捕获当前线程的输出；已安装分发流时按上下文捕获，否则直接重定向"""
+
+    def __init__(self, out, err):
+        self.out = out
+        self.err = err
+        self.redirects = []
+        self.tokens = []
+
+    def __enter__(self):
+        if isinstance(sys.stdout, _ContextStream) and isinstance(sys.stderr, _ContextStream):
+            self.tokens = [(sys.stdout, sys.stdout.buffer_var.set(self.out)),
+                           (sys.stderr, sys.stderr.buffer_var.set(self.err))]
+        else:
+            self.redirects = [redirect_stdout(self.out), redirect_stderr(self.err)]
+            for r in self.redirects:
+                r.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.redirects:
+            for r in reversed(self.redirects):
+                r.__exit__(*exc)
+        else:
+            for stream, token in reversed(self.tokens):
+                stream.buffer_var.reset(token)
+        return False
+
+
+# ---------------------------------------------------------------------------
+# 进程模式
+# ---------------------------------------------------------------------------
+
+def _worker_loop(conn, script_dir):
+    """工作进程主循环：接收脚本路径，运行后返回结果，直到收到None"""
+    if script_dir and script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        script_path, config = request
+        result = run_captured(script_path, config)
+        try:
+            conn.send(result)
+        except Exception:
+            # 返回值无法序列化时只返回文本
+            result['returned'] = repr(result['returned'])
+            conn.send(result)
+    conn.close()
+    # 关闭本进程中保留的浏览器（fork启动的工作进程退出时不会执行atexit）
+    browser_pool = sys.modules.get('common.browser_pool')
+    if browser_pool is not None:
+        browser_pool.shutdown_pool()
+    sessions = sys.modules.get('common.sessions')
+    if sessions is not None:
+        sessions.reset_sessions()
+
+
+class PluginWorker:
+    """常驻工作进程，依次运行多个图书馆脚本"""
+
+    def __init__(self, script_dir):
+        self.script_dir = script_dir
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_loop, args=(child_conn, self.script_dir), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def run(self, script_path, config=None, timeout=600):
+        """运行脚本，超时则终止并重启工作进程"""
+        if self.process is None or not self.process.is_alive():
+            self.start()
+        self.conn.send((script_path, config))
+        if not self.conn.poll(timeout):
+            self.restart()
+            return {'returned': None, 'output': '', 'error': None, 'timeout': True}
+        try:
+            return self.conn.recv()
+        except EOFError:
+            # 工作进程崩溃（例如浏览器驱动导致的段错误）
+            self.restart()
+            return {'returned': None, 'output': '', 'error': '工作进程意外退出'}
+
+    def restart(self):
+        self.stop(force=True)
+        self.start()
+
+    def stop(self, force=False):
+        if self.process is None:
+            return
+        try:
+            if force:
+                self.process.terminate()
+            else:
+                self.conn.send(None)
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+        except Exception:
+            pass
+        self.process = None
+        self.conn = None
+
+
+class PluginPool:
+    """
+    插件运行池
+
+    参数:
+        script_dir: 图书馆脚本所在目录
+        size: 工作进程/线程数
+        mode: 'process' 常驻进程；'thread' 当前进程内的线程
+    """
+
+    def __init__(self, script_dir, size=1, mode='process'):
+        self.script_dir = script_dir
+        self.mode = mode
+        self.workers = queue.Queue()
+        if mode == 'process':
+            for _ in range(max(1, size)):
+                self.workers.put(PluginWorker(script_dir))
+        else:
+            install_output_capture()
+
+    def run(self, script_path, config=None, timeout=600):
+        """运行脚本，返回 {'returned', 'output', 'stderr', 'error'[, 'timeout']}"""
+        if self.mode == 'process':
+            worker = self.workers.get()
+            try:
+                return worker.run(script_path, config, timeout)
+            finally:
+                self.workers.put(worker)
+        return self._run_in_thread(script_path, config, timeout)
+
+    def _run_in_thread(self, script_path, config, timeout):
+        """线程模式：超时的线程无法强制结束，设为守护线程后放弃等待"""
+        box = {}
+
+        def target():
+            box['result'] = run_captured(script_path, config)
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            return {'returned': None, 'output': '', 'error': None, 'timeout': True}
+        return box['result']
+
+    def close(self):
+        if self.mode != 'process':
+            return
+        while not self.workers.empty():
+            self.workers.get().stop()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+网页打印为PDF（Chrome DevTools Page.printToPDF）
+功能：
+1. 直接由Chrome生成矢量PDF（文字可复制、体积小），代替逐屏截图再拼接成图片PDF
+2. 使用流式传输（transferMode=ReturnAsStream），通过 IO.read 分块读取并写入磁盘，
+   长页面不会在内存中生成整份base64数据
+3. 先写入 <文件名>.part，校验PDF结构后原子重命名（与 common/downloader.py 相同）
+4. 环境变量 NIANBAO_PDF_CAPTURE=screenshot 时不使用打印，由脚本改用截图拼接
+
+注意：Page.printToPDF 只能在无头模式下使用，有界面的浏览器会报错，调用方应回退到截图拼接
+"""
+
+import os
+import base64
+
+from common.downloader import PART_SUFFIX, BUFFER_SIZE, DownloadError, verify_file
+
+PDF_CAPTURE_ENV = 'NIANBAO_PDF_CAPTURE'
+
+READ_SIZE = 1024 * 1024          # 每次 IO.read 读取的大小
+
+# A4纸、保留背景，与浏览器"打印-另存为PDF"一致
+DEFAULT_PRINT_OPTIONS = {
+    'printBackground': True,
+    'paperWidth': 8.27,
+    'paperHeight': 11.69,
+    'marginTop': 0.4,
+    'marginBottom': 0.4,
+    'marginLeft': 0.4,
+    'marginRight': 0.4,
+    'preferCSSPageSize': False,
+}
+
+
+def print_enabled():
+    """是否使用打印方式生成PDF（NIANBAO_PDF_CAPTURE=screenshot 时关闭）"""
+    return os.environ.get(PDF_CAPTURE_ENV, '').strip().lower() not in ('screenshot', '截图')
+
+
+def _write_stream(driver, handle, f):
+    """通过 IO.read 分块读取打印结果并写入文件，返回写入的字节数"""
+    written = 0
+    try:
+        while True:
+            chunk = driver.execute_cdp_cmd('IO.read', {'handle': handle, 'size': READ_SIZE})
+            data = chunk.get('data') or ''
+            if data:
+                data = base64.b64decode(data) if chunk.get('base64Encoded') else data.encode('latin-1')
+                f.write(data)
+                written += len(data)
+            if chunk.get('eof'):
+                break
+    finally:
+        try:
+            driver.execute_cdp_cmd('IO.close', {'handle': handle})
+        except Exception:
+            pass
+    return written
+
+
+def print_page_to_pdf(driver, save_path, print_options=None):
+    """
+    把当前页面打印为PDF保存到 save_path，返回文件大小
+
+    参数:
+        print_options: Page.printToPDF 参数，默认 DEFAULT_PRINT_OPTIONS（A4）
+
+    失败时抛出异常（不会留下不完整的文件）
+    """
+    options = dict(DEFAULT_PRINT_OPTIONS)
+    options.update(print_options or {})
+    options['transferMode'] = 'ReturnAsStream'
+
+    part_path = save_path + PART_SUFFIX
+    try:
+        result = driver.execute_cdp_cmd('Page.printToPDF', options)
+        with open(part_path, 'wb', buffering=BUFFER_SIZE) as f:
+            if result.get('stream'):
+                _write_stream(driver, result['stream'], f)
+            elif result.get('data'):
+                # 不支持流式传输的旧版本Chrome会直接返回base64数据
+                f.write(base64.b64decode(result['data']))
+            else:
+                raise DownloadError("Chrome没有返回PDF数据")
+        verify_file(part_path, expect_pdf=True)
+    except Exception:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+
+    os.replace(part_path, save_path)
+    return os.path.getsize(save_path)
@@ -0,0 +1,650 @@
+# -*- coding: utf-8 -*-
+"""
+离线录制/回放基准测试
+功能：
+1. 录制：在临时工作目录中用真实网络跑一遍 批量执行.py，图书馆脚本经 common/sessions.py 和
+   common/async_engine.py 发出的每个请求及响应都保存到录制目录（index-<进程号>.jsonl + 按内容哈希保存的响应体）
+2. 回放服务器：按 (方法, 原地址, Range) 返回录制的响应，可以设置每个请求的延迟和带宽；
+   没有录制的 Range 请求从完整响应中截取，没有录制的地址返回404并计数
+3. 基准测试：在临时工作目录中（新的台账和输出文件夹，不影响正式数据）用回放服务器运行
+   批量执行.py 的各种运行模式，统计总耗时、每个图书馆的请求数、峰值内存和未命中的请求
+
+回放时请求不直接发往图书馆网站：环境变量 NIANBAO_REPLAY 设置后，共用连接池把请求发给回放服务器，
+原地址放在 X-Replay-Url 请求头中，响应的 url 仍为原地址，脚本的行为与联网时相同。
+浏览器（Selenium）访问的页面不经过这里，需要浏览器的图书馆在无网络时无法回放
+
+用法（在 年报下载1 目录下运行）:
+    python -m common.replay record fixtures                       # 联网录制所有图书馆
+    python -m common.replay record fixtures --libraries 国家图书馆,上海图书馆
+    python -m common.replay serve fixtures --latency 50 --bandwidth 2048
+    python -m common.replay bench fixtures --modes sequential,parallel,async --repeat 3
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+RECORD_ENV = 'NIANBAO_RECORD'
+REPLAY_ENV = 'NIANBAO_REPLAY'
+REPLAY_HEADER = 'X-Replay-Url'
+
+BODY_DIR = 'bodies'
+CHUNK_SIZE = 16 * 1024
+
+# 响应体按解码后的内容保存，回放时重新计算长度
+_DROP_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length', 'connection', 'keep-alive'}
+
+# 基准测试的运行模式 -> 批量执行.py 的命令行参数
+BENCH_MODES = {
+    'sequential': ['--sequential'],
+    'parallel': ['--parallel'],
+    'plugin-process': ['--parallel', '--plugin=process'],
+    'plugin-thread': ['--parallel', '--plugin=thread'],
+    'async': ['--async'],
+}
+
+# 工作目录中的配置：不使用HTTP缓存和地址预测，保证每次运行发出相同的请求
+_WORKSPACE_CONFIG = {
+    'http_cache': 'off',
+    'url_predict': 'off',
+    'excel_auto_export': 'false',
+    'ledger_path': '',
+}
+
+
+# ---------------------------------------------------------------------------
+# 录制
+# ---------------------------------------------------------------------------
+
+class FixtureStore:
+    """录制目录（每个进程写自己的索引文件，响应体按SHA-256去重保存）"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, BODY_DIR), exist_ok=True)
+        self.index_path = os.path.join(root, f'index-{os.getpid()}.jsonl')
+
+    def _save_body(self, body):
+        digest = hashlib.sha256(body).hexdigest()
+        path = os.path.join(self.root, BODY_DIR, digest)
+        if not os.path.exists(path):
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        return digest
+
+    def add(self, method, url, range_header, status, headers, body):
+        """
+        保存一次请求和响应
+
+        body 为None表示没有读取响应体（只探测地址），回放时优先使用有响应体的记录
+        """
+        kept = {name: value for name, value in headers.items() if name.lower() not in _DROP_HEADERS}
+        if method == 'HEAD' and headers.get('Content-Length'):
+            kept['Content-Length'] = headers['Content-Length']
+        entry = {
+            'method': method,
+            'url': url,
+            'range': range_header,
+            'status': status,
+            'headers': kept,
+            'body': self._save_body(body) if body else None,
+            'partial': body is None and method != 'HEAD',
+            'time': round(time.time(), 3),
+        }
+        with self._lock:
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _recorder():
+    global _store
+    root = os.environ.get(RECORD_ENV)
+    if not root:
+        return None
+    with _store_lock:
+        if _store is None or _store.root != root:
+            _store = FixtureStore(root)
+        return _store
+
+
+def active():
+    """是否处于录制或回放模式"""
+    return bool(os.environ.get(RECORD_ENV) or os.environ.get(REPLAY_ENV))
+
+
+def record(method, url, request_headers, status, headers, body):
+    """录制模式下保存一次请求（其他时候不做任何事）"""
+    store = _recorder()
+    if store is None:
+        return
+    try:
+        store.add(method, url, (request_headers or {}).get('Range'), status, headers, body)
+    except Exception as e:
+        print(f"  ⚠️  录制请求失败: {url} - {e}")
+
+
+def rewrite(url, headers=None):
+    """
+    回放模式下把请求改为发往回放服务器，返回 (发送地址, 请求头)；不在回放模式时原样返回
+    """
+    base = os.environ.get(REPLAY_ENV)
+    if not base:
+        return url, headers
+    headers = dict(headers or {})
+    headers[REPLAY_HEADER] = url
+    return base.rstrip('/') + '/replay', headers
+
+
+# common/sessions.py 的适配器使用（直接修改 PreparedRequest）
+
+def redirect_request(request):
+    """回放模式下把 PreparedRequest 改为发往回放服务器，返回原地址（不在回放模式时返回None）"""
+    base = os.environ.get(REPLAY_ENV)
+    if not base:
+        return None
+    original = request.url
+    request.headers[REPLAY_HEADER] = original
+    request.url = base.rstrip('/') + '/replay'
+    return original
+
+
+def restore_response(request, response, original):
+    """恢复原地址，脚本看到的 response.url 与联网时相同"""
+    request.url = original
+    request.headers.pop(REPLAY_HEADER, None)
+    response.url = original
+
+
+def record_response(request, response):
+    """录制 requests 的响应（读取完整响应体，之后 iter_content 从内存中返回）"""
+    if not os.environ.get(RECORD_ENV):
+        return
+    body = response.content if request.method != 'HEAD' else b''
+    record(request.method, request.url, request.headers, response.status_code, response.headers, body)
+
+
+# ---------------------------------------------------------------------------
+# 回放服务器
+# ---------------------------------------------------------------------------
+
+def load_fixtures(root):
+    """读取录制目录，返回 {(方法, 地址, Range): 记录}（同一请求录制多次时使用第一条有响应体的记录）"""
+    fixtures = {}
+    for name in sorted(os.listdir(root)):
+        if not (name.startswith('index') and name.endswith('.jsonl')):
+            continue
+        with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                key = (entry['method'], entry['url'], entry.get('range'))
+                existing = fixtures.get(key)
+                if existing is None or (existing.get('partial') and not entry.get('partial')):
+                    fixtures[key] = entry
+    return fixtures
+
+
+def _parse_range(range_header, size):
+    """解析 'bytes=a-b'，返回 (start, end)，无法解析时返回None"""
+    try:
+        unit, spec = range_header.split('=', 1)
+        if unit.strip() != 'bytes' or ',' in spec:
+            return None
+        start, end = spec.strip().split('-', 1)
+        if start == '':
+            length = int(end)
+            return max(0, size - length), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+        if start >= size:
+            return None
+        return start, min(end, size - 1)
+    except ValueError:
+        return None
+
+
+class ReplayServer:
+    """
+    回放服务器
+
+    参数:
+        latency: 每个请求返回响应头前的延迟（秒）
+        bandwidth: 每个连接的带宽（字节/秒），0表示不限制
+    """
+
+    def __init__(self, root, port=0, latency=0.0, bandwidth=0):
+        self.root = root
+        self.fixtures = load_fixtures(root)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.misses = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._httpd.server_address[1]}'
+
+    def _body(self, entry):
+        if not entry.get('body'):
+            return b''
+        with open(os.path.join(self.root, BODY_DIR, entry['body']), 'rb') as f:
+            return f.read()
+
+    def lookup(self, method, url, range_header):
+        """返回 (状态码, 响应头, 响应体)，没有录制时返回None"""
+        entry = self.fixtures.get((method, url, range_header))
+        if entry is not None:
+            return entry['status'], entry['headers'], self._body(entry)
+        if method == 'HEAD':
+            entry = self.fixtures.get(('GET', url, None))
+            return (entry['status'], entry['headers'], b'') if entry else None
+        entry = self.fixtures.get((method, url, None))
+        if entry is None:
+            return None
+        body = self._body(entry)
+        if range_header and entry['status'] == 200:
+            # 没有录制这个区间，从完整响应中截取
+            span = _parse_range(range_header, len(body))
+            if span is None:
+                return 416, {'Content-Range': f'bytes */{len(body)}'}, b''
+            start, end = span
+            headers = dict(entry['headers'])
+            headers['Content-Range'] = f'bytes {start}-{end}/{len(body)}'
+            return 206, headers, body[start:end + 1]
+        return entry['status'], entry['headers'], body
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self):
+                method = self.command
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                url = self.headers.get(REPLAY_HEADER)
+                with server._lock:
+                    server.requests += 1
+                found = server.lookup(method, url, self.headers.get('Range')) if url else None
+                if server.latency:
+                    time.sleep(server.latency)
+                if found is None:
+                    with server._lock:
+                        server.misses.append(f'{method} {url}')
+                    found = (404, {'Content-Type': 'text/plain'}, b'not recorded')
+                status, headers, body = found
+                self.send_response(status)
+                for name, value in headers.items():
+                    if name.lower() != 'content-length' or method == 'HEAD':
+                        self.send_header(name, value)
+                if method != 'HEAD':
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if method == 'HEAD' or not body:
+                    return
+                if not server.bandwidth:
+                    self.wfile.write(body)
+                    return
+                # 按带宽分块发送
+                view = memoryview(body)
+                for offset in range(0, len(body), CHUNK_SIZE):
+                    chunk = view[offset:offset + CHUNK_SIZE]
+                    self.wfile.write(chunk)
+                    time.sleep(len(chunk) / server.bandwidth)
+
+            do_GET = do_POST = do_HEAD = do_PUT = _handle
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def take_stats(self):
+        """返回并清零 (请求数, 未命中列表)"""
+        with self._lock:
+            stats = (self.requests, list(self.misses))
+            self.requests = 0
+            self.misses = []
+        return stats
+
+
+# ---------------------------------------------------------------------------
+# 临时工作目录与基准测试
+# ---------------------------------------------------------------------------
+
+def _get_script_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _write_config(source_path, target_path, overrides):
+    """复制配置文件并替换指定的项"""
+    lines = []
+    seen = set()
+    if os.path.exists(source_path):
+        with open(source_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                key = line.split('=', 1)[0].strip() if '=' in line and not line.lstrip().startswith('#') else None
+                if key in overrides:
+                    line = f'{key}={overrides[key]}\n'
+                    seen.add(key)
+                lines.append(line)
+    for key, value in overrides.items():
+        if key not in seen:
+            lines.append(f'{key}={value}\n')
+    with open(target_path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+
+def make_workspace(script_dir, libraries=None, config_overrides=None):
+    """
+    创建临时工作目录：复制批量执行.py、图书馆脚本和 common/，使用新的台账和输出文件夹
+
+    不复制 是否下载.xlsx（其中标记为已下载的图书馆会被跳过）
+    """
+    workspace = tempfile.mkdtemp(prefix='nianbao_bench_')
+    wanted = {name if name.endswith('.py') else name + '.py' for name in (libraries or [])}
+    for name in os.listdir(script_dir):
+        path = os.path.join(script_dir, name)
+        if not name.endswith('.py') or not os.path.isfile(path):
+            continue
+        if wanted and name.endswith('图书馆.py') and name not in wanted:
+            continue
+        shutil.copy2(path, os.path.join(workspace, name))
+    shutil.copytree(os.path.join(script_dir, 'common'), os.path.join(workspace, 'common'),
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    overrides = dict(_WORKSPACE_CONFIG)
+    overrides['output_folder'] = os.path.join(workspace, 'output')
+    overrides.update(config_overrides or {})
+    _write_config(os.path.join(script_dir, 'config.txt'), os.path.join(workspace, 'config.txt'), overrides)
+    return workspace
+
+
+def _tree_rss(proc):
+    try:
+        processes = [proc] + proc.children(recursive=True)
+    except psutil.Error:
+        return 0
+    total = 0
+    for p in processes:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def run_measured(cmd, cwd, env, timeout, log_path):
+    """
+    运行命令，返回 {'wall', 'returncode', 'peak_rss', 'rss_scope'}
+
+    安装了psutil时每0.1秒统计一次整个进程树的内存合计；
+    否则在POSIX系统上用 wait4 取得最大的单个进程的峰值内存（Windows上为None）
+    """
+    start = time.time()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        peak = None
+        scope = None
+        deadline = start + timeout
+        if PSUTIL_AVAILABLE:
+            scope = '进程树合计'
+            peak = 0
+            ps_proc = psutil.Process(proc.pid)
+            while proc.poll() is None:
+                peak = max(peak, _tree_rss(ps_proc))
+                if time.time() > deadline:
+                    proc.kill()
+                time.sleep(0.1)
+        elif hasattr(os, 'wait4'):
+            scope = '最大单个进程'
+            timer = threading.Timer(timeout, proc.kill)
+            timer.start()
+            try:
+                _, status, usage = os.wait4(proc.pid, 0)
+            finally:
+                timer.cancel()
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # Linux 上 ru_maxrss 单位为KB，macOS 为字节
+            peak = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+        else:
+            try:
+                proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+    return {'wall': time.time() - start, 'returncode': proc.returncode, 'peak_rss': peak, 'rss_scope': scope}
+
+
+def read_library_stats(workspace):
+    """读取工作目录中 logs/metrics.jsonl 的每个图书馆的状态和请求数"""
+    from common.metrics import read_records
+    stats = {}
+    for record in read_records(os.path.join(workspace, 'logs', 'metrics.jsonl')):
+        stats[record.get('library')] = {
+            'status': record.get('status'),
+            'requests': (record.get('metrics') or {}).get('requests') or 0,
+            'wall': record.get('wall'),
+        }
+    return stats
+
+
+def _tail(path, lines=10):
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return [line.rstrip() for line in f.readlines()[-lines:]]
+    except OSError:
+        return []
+
+
+def _child_env(extra):
+    env = dict(os.environ)
+    env.pop(RECORD_ENV, None)
+    env.pop(REPLAY_ENV, None)
+    env['PYTHONIOENCODING'] = 'utf-8'
+    env.update(extra)
+    return env
+
+
+def record_run(fixtures_dir, libraries=None, mode='sequential', timeout=3600, log=print):
+    """联网运行一次批量执行.py，把所有请求录制到 fixtures_dir"""
+    fixtures_dir = os.path.abspath(fixtures_dir)
+    os.makedirs(fixtures_dir, exist_ok=True)
+    workspace = make_workspace(_get_script_dir(), libraries)
+    log(f"录制到: {fixtures_dir}（工作目录 {workspace}）")
+    try:
+        result = run_measured([sys.executable, '批量执行.py', '--console'] + BENCH_MODES[mode], workspace,
+                              _child_env({RECORD_ENV: fixtures_dir}), timeout,
+                              os.path.join(fixtures_dir, 'record.log'))
+        if result['returncode'] != 0:
+            log(f"⚠️  批量执行.py 退出码 {result['returncode']}，运行日志最后几行:")
+            for line in _tail(os.path.join(fixtures_dir, 'record.log')):
+                log(f"  {line}")
+        count = len(load_fixtures(fixtures_dir))
+        log(f"完成: 耗时 {result['wall']:.1f} 秒，共录制 {count} 个请求，运行日志 record.log")
+        for library, stats in sorted(read_library_stats(workspace).items()):
+            log(f"  {library}: {stats['status']}，{stats['requests']} 个请求")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def run_bench(fixtures_dir, modes, repeat=1, latency=0.0, bandwidth=0, libraries=None,
+              host_interval=None, timeout=3600, log=print):
+    """
+    用回放服务器运行各个模式的 批量执行.py，返回结果列表
+
+    每次运行使用新的临时工作目录；总耗时取各次运行的中位数
+    """
+    server = ReplayServer(os.path.abspath(fixtures_dir), latency=latency, bandwidth=bandwidth).start()
+    log(f"回放服务器: {server.url}，{len(server.fixtures)} 个录制的请求，"
+        f"延迟 {latency * 1000:.0f} ms，带宽 {'不限' if not bandwidth else f'{bandwidth / 1024:.0f} KB/s'}")
+    overrides = {'host_interval': host_interval} if host_interval is not None else {}
+    results = []
+    try:
+        for mode in modes:
+            runs = []
+            for attempt in range(1, repeat + 1):
+                workspace = make_workspace(_get_script_dir(), libraries, overrides)
+                try:
+                    measured = run_measured([sys.executable, '批量执行.py', '--console'] + BENCH_MODES[mode],
+                                            workspace, _child_env({REPLAY_ENV: server.url}), timeout,
+                                            os.path.join(workspace, 'bench.log'))
+                    measured['libraries'] = read_library_stats(workspace)
+                    measured['replay_requests'], measured['misses'] = server.take_stats()
+                    if measured['returncode'] != 0:
+                        log(f"  ⚠️  {mode} 运行失败（退出码 {measured['returncode']}），运行日志最后几行:")
+                        for line in _tail(os.path.join(workspace, 'bench.log')):
+                            log(f"    {line}")
+                finally:
+                    shutil.rmtree(workspace, ignore_errors=True)
+                runs.append(measured)
+                log(f"  {mode} 第{attempt}次: {measured['wall']:.1f} 秒，"
+                    f"{measured['replay_requests']} 个请求，未命中 {len(measured['misses'])}")
+            walls = sorted(run['wall'] for run in runs)
+            results.append({'mode': mode, 'wall': walls[len(walls) // 2], 'runs': runs})
+    finally:
+        server.stop()
+    return results
+
+
+def _format_rss(value):
+    return f'{value / 1024 / 1024:.0f} MB' if value else '-'
+
+
+def print_bench(results, log=print):
+    log("\n" + "=" * 72)
+    log(f"{'模式':<16}{'总耗时(秒)':>12}{'成功':>6}{'请求数':>8}{'每馆请求':>10}{'未命中':>8}{'峰值内存':>12}")
+    for result in results:
+        last = result['runs'][-1]
+        libraries = last['libraries']
+        success = sum(1 for s in libraries.values() if s['status'] == 'success')
+        requests_total = sum(s['requests'] for s in libraries.values())
+        per_library = requests_total / len(libraries) if libraries else 0
+        peak = max((run['peak_rss'] or 0) for run in result['runs'])
+        log(f"{result['mode']:<16}{result['wall']:>12.1f}{success:>6}{requests_total:>8}{per_library:>10.1f}"
+            f"{len(last['misses']):>8}{_format_rss(peak):>12}")
+    scope = next((run['rss_scope'] for result in results for run in result['runs'] if run['rss_scope']), None)
+    if scope:
+        log(f"峰值内存为{scope}")
+
+    if results:
+        log("\n每个图书馆的请求数（最后一次运行）:")
+        names = sorted({name for result in results for name in result['runs'][-1]['libraries']})
+        log(f"{'图书馆':<14}" + ''.join(f"{result['mode']:>16}" for result in results))
+        for name in names:
+            cells = []
+            for result in results:
+                stats = result['runs'][-1]['libraries'].get(name)
+                cells.append(f"{stats['requests']} ({stats['wall'] or 0:.1f}s)" if stats else '-')
+            log(f"{name:<14}" + ''.join(f"{cell:>16}" for cell in cells))
+    misses = sorted({miss for result in results for run in result['runs'] for miss in run['misses']})
+    if misses:
+        log(f"\n未录制的请求（{len(misses)} 个，回放服务器返回404）:")
+        for miss in misses[:20]:
+            log(f"  {miss}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线录制/回放基准测试')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_record = sub.add_parser('record', help='联网运行并录制所有请求')
+    p_record.add_argument('fixtures')
+    p_record.add_argument('--libraries', default='', help='只录制这些图书馆（逗号分隔）')
+    p_record.add_argument('--mode', default='sequential', choices=sorted(BENCH_MODES))
+
+    p_serve = sub.add_parser('serve', help='启动回放服务器')
+    p_serve.add_argument('fixtures')
+    p_serve.add_argument('--port', type=int, default=8780)
+    p_serve.add_argument('--latency', type=float, default=0, help='每个请求的延迟（毫秒）')
+    p_serve.add_argument('--bandwidth', type=float, default=0, help='每个连接的带宽（KB/s，0为不限）')
+
+    p_bench = sub.add_parser('bench', help='用回放服务器运行批量执行.py的各个模式')
+    p_bench.add_argument('fixtures')
+    p_bench.add_argument('--modes', default='sequential,parallel,async',
+                         help=f"逗号分隔，可选 {', '.join(BENCH_MODES)}")
+    p_bench.add_argument('--repeat', type=int, default=1)
+    p_bench.add_argument('--latency', type=float, default=0, help='每个请求的延迟（毫秒）')
+    p_bench.add_argument('--bandwidth', type=float, default=0, help='每个连接的带宽（KB/s，0为不限）')
+    p_bench.add_argument('--libraries', default='', help='只运行这些图书馆（逗号分隔）')
+    p_bench.add_argument('--host-interval', default=None, help='覆盖 config.txt 的 host_interval')
+    p_bench.add_argument('--output', help='结果另存为JSON')
+
+    args = parser.parse_args(argv)
+    libraries = [name.strip() for name in getattr(args, 'libraries', '').split(',') if name.strip()]
+
+    if args.command == 'record':
+        record_run(args.fixtures, libraries, args.mode)
+        return 0
+
+    if args.command == 'serve':
+        server = ReplayServer(os.path.abspath(args.fixtures), port=args.port,
+                              latency=args.latency / 1000, bandwidth=args.bandwidth * 1024)
+        print(f"回放服务器: {server.url}（{len(server.fixtures)} 个录制的请求，Ctrl+C 结束）")
+        print(f"图书馆脚本设置环境变量 {REPLAY_ENV}={server.url} 后使用回放")
+        server.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            requests_count, misses = server.take_stats()
+            print(f"\n共 {requests_count} 个请求，未命中 {len(misses)} 个")
+            server.stop()
+        return 0
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in BENCH_MODES]
+    if unknown:
+        parser.error(f"未知的模式: {', '.join(unknown)}")
+    results = run_bench(args.fixtures, modes, repeat=max(1, args.repeat), latency=args.latency / 1000,
+                        bandwidth=args.bandwidth * 1024, libraries=libraries, host_interval=args.host_interval)
+    print_bench(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+图书馆脚本运行结果协议
+功能：
+1. 各图书馆脚本的 main() 通过 RunReport 记录状态、年份、URL、文件大小和各阶段耗时
+2. main() 返回结果字典，插件模式下批量执行.py 直接读取返回值
+3. 子进程模式下，批量执行.py 通过环境变量 NIANBAO_RESULT_FILE 指定结果文件，
+   脚本结束时把结果写成JSON，批量执行.py 不再需要解析脚本输出判断成败
+
+结果字典格式：
+    {
+        "library": "首都图书馆",
+        "status": "success",        # 见 STATUS_* 常量
+        "year": "2024",
+        "url": "https://...",
+        "path": "D:\\...\\首都图书馆2024年年报.pdf",
+        "bytes": 1234567,
+        "page": "https://...",      # 年报所在的页面
+        "predicted": false,         # 是否按往年的地址规律直接找到（common/url_index.py）
+        "phases": {"find": 1.23, "download": 4.56},
+        "elapsed": 5.79,
+        "metrics": {...},           # 请求、解析、下载速度等耗时统计（common/metrics.py）
+        "error": null
+    }
+"""
+
+import os
+import json
+import time
+from contextlib import contextmanager
+
+from common import metrics
+
+RESULT_FILE_ENV = 'NIANBAO_RESULT_FILE'
+
+STATUS_SUCCESS = 'success'          # 下载成功
+STATUS_NOT_FOUND = 'not_found'      # 未找到年报链接
+STATUS_FAILED = 'failed'            # 找到链接但下载失败
+STATUS_CONFIG_ERROR = 'config_error'  # 配置文件错误
+
+
+class RunReport:
+    """记录一次图书馆脚本运行的结果"""
+
+    def __init__(self, library):
+        self.library = library
+        self.started = time.time()
+        self.phases = {}
+        self.result = None
+        self.page = None
+        self.predicted = False
+        self.metrics = metrics.start_run()
+
+    @contextmanager
+    def phase(self, name):
+        """记录某个阶段（find、download等）的耗时，同名阶段累加"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(self.phases.get(name, 0) + time.time() - start, 3)
+
+    def finish(self, status, year=None, url=None, path=None, error=None):
+        """结束记录，返回结果字典；如果设置了结果文件环境变量，同时写入文件"""
+        size = None
+        if path and os.path.isfile(path):
+            size = os.path.getsize(path)
+        self.result = {
+            'library': self.library,
+            'status': status,
+            'year': str(year) if year else None,
+            'url': url,
+            'path': path,
+            'bytes': size,
+            'page': self.page,
+            'predicted': self.predicted,
+            'phases': dict(self.phases),
+            'elapsed': round(time.time() - self.started, 3),
+            'metrics': self.metrics.summary(),
+            'error': error,
+        }
+        write_result_file(self.result)
+        return self.result
+
+
+def begin_report(library):
+    """开始记录图书馆脚本的运行结果"""
+    return RunReport(library)
+
+
+def write_result_file(result, result_file=None):
+    """把结果写入环境变量指定的文件（未设置时不写）"""
+    result_file = result_file or os.environ.get(RESULT_FILE_ENV)
+    if not result_file:
+        return False
+    try:
+        tmp_file = result_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp_file, result_file)
+        return True
+    except Exception as e:
+        print(f"⚠️  写入结果文件失败: {e}")
+        return False
+
+
+def read_result_file(result_file):
+    """读取结果文件，不存在或格式错误时返回None"""
+    try:
+        if not os.path.exists(result_file):
+            return None
+        with open(result_file, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        return result if isinstance(result, dict) and 'status' in result else None
+    except Exception:
+        return None
+
+
+def is_success(result):
+    """判断结果是否为下载成功"""
+    return isinstance(result, dict) and result.get('status') == STATUS_SUCCESS
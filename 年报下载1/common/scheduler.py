@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+并发调度器
+功能：
+1. 使用固定大小的线程池并发执行图书馆任务
+2. 按主机限制并发数，避免同一网站被同时访问
+3. 按优先级排序，慢速网站优先启动，与快速网站重叠执行
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+# 已知的慢速网站，默认优先启动
+SLOW_LIBRARIES = ['内蒙古图书馆', '黑龙江省图书馆', '宁波图书馆']
+
+# 从脚本源码中识别网站地址
+_URL_PATTERN = re.compile(r'''(?:base_url|report_page_url|list_url|entry_url)\s*=\s*f?["'](https?://[^"'/]+)''')
+
+
+def get_script_host(script_path):
+    """从图书馆脚本源码中提取目标网站的主机名，提取失败时返回脚本名"""
+    try:
+        with open(script_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        match = _URL_PATTERN.search(source)
+        if match:
+            host = urlparse(match.group(1)).hostname
+            if host:
+                return host.lower()
+    except Exception:
+        pass
+    return os.path.basename(script_path)
+
+
+def parse_priority_list(value):
+    """解析配置中的优先级列表（逗号分隔），为空时使用默认的慢速网站列表"""
+    if not value or not value.strip():
+        return list(SLOW_LIBRARIES)
+    value = value.replace('，', ',')
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def get_priority(name, priority_list):
+    """获取任务优先级，数值越小越先执行；不在列表中的任务排在最后"""
+    for i, item in enumerate(priority_list):
+        if item and (item in name or name in item):
+            return i
+    return len(priority_list)
+
+
+def run_scheduled(tasks, execute, max_workers=4, per_host_limit=1, on_done=None, log=print):
+    """
+    并发执行任务
+
+    参数:
+        tasks: 任务列表，每个任务是包含 name、host、priority 的字典
+        execute: 执行函数，接收任务字典，返回执行结果
+        max_workers: 最大并发数
+        per_host_limit: 同一主机的最大并发数
+        on_done: 任务完成回调 on_done(task, result)，在调度线程中调用，可安全修改共享数据
+        log: 日志输出函数
+
+    返回:
+        [(task, result), ...] 按完成顺序排列
+    """
+    max_workers = max(1, int(max_workers))
+    per_host_limit = max(1, int(per_host_limit))
+
+    # 按优先级排序（稳定排序，同优先级保持原有顺序）
+    pending = sorted(tasks, key=lambda t: t.get('priority', 0))
+    host_running = {}
+    running = {}
+    results = []
+
+    def pick_next():
+        """选出第一个所在主机未达到并发上限的任务"""
+        for i, task in enumerate(pending):
+            host = task.get('host') or task['name']
+            if host_running.get(host, 0) < per_host_limit:
+                return pending.pop(i)
+        return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # 填满空闲的工作线程
+            while pending and len(running) < max_workers:
+                task = pick_next()
+                if task is None:
+                    break
+                host = task.get('host') or task['name']
+                host_running[host] = host_running.get(host, 0) + 1
+                log(f"  → 启动: {task['name']} (主机: {host}, 运行中: {len(running) + 1})")
+                running[executor.submit(execute, task)] = task
+
+            if not running:
+                break
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                host = task.get('host') or task['name']
+                host_running[host] -= 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    log(f"✗ 任务异常: {task['name']} - {e}")
+                    result = False
+                results.append((task, result))
+                if on_done:
+                    on_done(task, result)
+
+    return results
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+进程共享的HTTP连接池
+功能：
+1. get_session() 返回的会话共用同一组连接适配器（每个主机一个连接池），
+   查找年报时建立的TCP/TLS连接在下载时、以及同一网站的其他图书馆脚本中继续使用（keep-alive）
+2. 每个会话的请求头和Cookie仍然独立；session.close() 不会关闭共用的连接池
+3. 连接失败、429和502/503/504按指数退避自动重试（只重试GET/HEAD），遵守 Retry-After
+4. 按主机限制请求频率：同一主机两次请求之间至少间隔若干秒，代替固定的随机等待
+   （异步引擎 common/async_engine.py 通过 get_host_limiter() 使用同一个限速器）
+
+环境变量 NIANBAO_HOST_INTERVAL（批量执行.py 从 config.txt 的 host_interval 设置）：
+    未设置      同一主机的请求间隔 0.5 秒
+    1           所有主机间隔 1 秒
+    1,www.nlc.cn=3,whhlyt.nx.gov.cn=2   默认1秒，指定主机使用各自的间隔
+    0           不限制
+"""
+
+import os
+import time
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common import metrics, replay
+
+HOST_INTERVAL_ENV = 'NIANBAO_HOST_INTERVAL'
+DEFAULT_HOST_INTERVAL = 0.5
+
+POOL_CONNECTIONS = 32       # 保留连接池的主机数
+POOL_MAXSIZE = 8            # 每个主机保留的连接数（分段下载、并发探测时同时使用多个连接）
+
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5         # 重试等待 0.5、1、2 秒
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def parse_host_intervals(value):
+    """解析 '1,www.nlc.cn=3' 格式，返回 (默认间隔, {主机: 间隔})"""
+    default = DEFAULT_HOST_INTERVAL
+    overrides = {}
+    for part in (value or '').replace('，', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if '=' in part:
+                host, interval = part.split('=', 1)
+                overrides[host.strip().lower()] = max(0.0, float(interval))
+            else:
+                default = max(0.0, float(part))
+        except ValueError:
+            print(f"⚠️  无法识别的请求间隔设置: {part}")
+    return default, overrides
+
+
+class HostRateLimiter:
+    """按主机限制请求频率（进程内所有线程共用）"""
+
+    def __init__(self, default_interval=DEFAULT_HOST_INTERVAL, overrides=None):
+        self.default_interval = default_interval
+        self.overrides = dict(overrides or {})
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def interval_for(self, host):
+        return self.overrides.get(host, self.default_interval)
+
+    def reserve(self, host):
+        """占用该主机的下一个请求时间段，返回需要等待的秒数（不睡眠，异步引擎用 asyncio.sleep 等待）"""
+        interval = self.interval_for(host)
+        if interval <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, 0.0))
+            # 先占用时间段再睡眠，多个线程按顺序排队
+            self._next[host] = start + interval
+        return start - now
+
+    def wait(self, host):
+        """等待到该主机允许下一次请求的时间，返回等待的秒数"""
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class PoliteAdapter(HTTPAdapter):
+    """发送请求前按主机限速的适配器，同时记录每个请求的连接耗时（common/metrics.py）"""
+
+    def __init__(self, limiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = metrics.POOL_CLASSES
+
+    def send(self, request, **kwargs):
+        host = (urlparse(request.url).hostname or '').lower()
+        if host:
+            waited = self.limiter.wait(host)
+            if waited:
+                metrics.add_time('host_wait', waited)
+        # 回放模式（common/replay.py）下请求发往回放服务器，返回前恢复原地址
+        original_url = replay.redirect_request(request)
+        metrics.begin_request()
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        if original_url:
+            replay.restore_response(request, response, original_url)
+        metrics.end_request(request.method, request.url, response.status_code, time.perf_counter() - start)
+        replay.record_response(request, response)
+        return response
+
+
+def _new_retry():
+    return Retry(total=RETRY_TOTAL, connect=RETRY_TOTAL, read=1, status=RETRY_TOTAL,
+                 backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES,
+                 allowed_methods=frozenset(['GET', 'HEAD']),
+                 respect_retry_after_header=True, raise_on_status=False)
+
+
+class _SharedSession(requests.Session):
+    """使用共用适配器的会话：close() 只清除本会话的Cookie，不关闭连接池"""
+
+    def __init__(self, adapters):
+        super().__init__()
+        for prefix, adapter in adapters.items():
+            self.mount(prefix, adapter)
+
+    def close(self):
+        self.cookies.clear()
+
+
+_adapters = None
+_limiter = None
+_registry_lock = threading.Lock()
+
+
+def _get_adapters():
+    global _adapters, _limiter
+    with _registry_lock:
+        if _adapters is None:
+            default, overrides = parse_host_intervals(os.environ.get(HOST_INTERVAL_ENV))
+            _limiter = HostRateLimiter(default, overrides)
+            adapter = PoliteAdapter(_limiter, pool_connections=POOL_CONNECTIONS,
+                                    pool_maxsize=POOL_MAXSIZE, max_retries=_new_retry())
+            _adapters = {'https://': adapter, 'http://': adapter}
+        return _adapters
+
+
+def get_host_limiter():
+    """连接池共用的按主机限速器（common/async_engine.py 的请求也按它限速）"""
+    _get_adapters()
+    return _limiter
+
+
+def get_session(headers=None):
+    """
+    获取使用共用连接池的会话（代替 requests.Session()）
+
+    参数:
+        headers: 本会话的请求头（不影响其他会话）
+    """
+    session = _SharedSession(_get_adapters())
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def reset_sessions():
+    """关闭所有共用的连接（插件工作进程结束时调用），下次 get_session() 重新创建"""
+    global _adapters, _limiter
+    with _registry_lock:
+        adapters, _adapters, _limiter = _adapters, None, None
+    if adapters:
+        for adapter in set(adapters.values()):
+            adapter.close()
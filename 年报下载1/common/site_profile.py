@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+"""
+按站点配置查找和下载年报
+功能：
+1. 图书馆脚本只声明站点配置（SiteProfile）：年报页面地址、链接筛选规则、是否需要浏览器、查找不到时的补充步骤；
+   读取配置、查找、下载和返回结果都在这里完成，修复和优化只需要改一处
+2. 查找时先按往年的地址规律预测（common/url_index.py），未命中时按 strategies 依次执行，找到即停止：
+   list        年报页面中去年的文档链接，按文档格式、是否为年报、页面顺序排序后取第一个
+   guess       按常见文件名在网站根目录下构造地址，并发探测
+   detail      并发进入去年的非文档链接（详情页），查找其中的文档链接、iframe和正文中的PDF地址
+   first_link  返回去年的第一个链接
+3. find_profiles()：一次加载所有使用站点配置的图书馆，按网站分组并发查找（只查找不下载），
+   用于检查各站点配置是否仍然有效
+
+用法（在 年报下载1 目录下运行）:
+    python -m common.site_profile                           # 查找所有使用站点配置的图书馆去年的年报
+    python -m common.site_profile --year 2023 湖北省图书馆 河南省图书馆
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import traceback
+from urllib.parse import urljoin, urlparse
+
+import requests
+from bs4 import BeautifulSoup
+
+from common.result import begin_report, STATUS_SUCCESS, STATUS_FAILED, STATUS_NOT_FOUND, STATUS_CONFIG_ERROR
+from common.html_links import detect_encoding, extract_links
+from common.sessions import get_session
+from common.http_cache import cached_get
+from common.async_engine import run_first_match
+from common.url_index import predict_report_url
+from common.library_utils import (get_headers, clean_filename, extract_year_from_text,
+                                  extract_year_from_url_params, load_config, download_pdf)
+
+# 文档格式 -> 扩展名
+DOCUMENT_EXTENSIONS = {'pdf': '.pdf', 'docx': '.docx', 'doc': '.doc'}
+
+DEFAULT_KEYWORDS = ('年报', '年度报告', '年度', 'annual', 'report')
+REPORT_WORDS = ('年报', '年度报告')       # 同样是去年的文档时，优先选择文字中带这些词的
+DETAIL_DOC_KEYWORDS = ('年报', '年度报告', '决算', '报告', '附件', '下载')
+HTML_EXTENSIONS = ('.html', '.htm', '.shtml')
+
+# 常用的规则
+COMMON_GUESS_NAMES = ('{year}年报.pdf', '{year}年度报告.pdf', '{year}年报官网版.pdf', '{year}年年度报告.pdf')
+LIBRARY_DOCUMENT_WORDS = (('图书馆',), ('决算', '年报', '年度报告'))    # 文化厅/图书馆公开栏目中本馆的决算或年报
+
+STRATEGIES = ('list', 'guess', 'detail', 'first_link')
+DEFAULT_STRATEGIES = ('list', 'detail', 'first_link')
+
+_PDF_IN_TEXT_RE = re.compile(r'https?://[^\s<>"]+\.pdf', re.I)
+
+
+class SiteProfile:
+    """
+    一个图书馆的站点配置
+
+    参数:
+        library: 图书馆名称（结果、台账和 是否下载.xlsx 中的名称）
+        entry_url: 年报列表页面
+        base_url: 网站根地址（guess 步骤在这里构造地址），默认取 entry_url 的协议和主机
+        file_prefix: 文件名前缀，默认为 library
+        keywords: 链接文字或地址中包含任一关键词时视为年报链接
+        required: 链接文字必须满足的关键词组（每组至少出现一个），例如 (('图书馆',), ('决算', '年报'))
+        formats: 接受的文档格式，按优先顺序
+        browser: 年报页面需要浏览器渲染（从浏览器池租用Chrome）
+        headless: 使用无头浏览器
+        wait_selector: 使用浏览器时等待出现的元素（CSS选择器）
+        container: 只在匹配的元素中查找链接（CSS选择器）
+        detail_keywords: detail 步骤只进入文字中包含这些词的链接（为空时进入所有非文档链接）
+        detail_html_only: detail 步骤只进入以 .html/.htm/.shtml 结尾的链接
+        detail_any_year: 详情页中没有去年（或未标年份）的文档时，使用其他年份的文档（"未验证年份"）
+        guess_names: guess 步骤尝试的文件名，{year} 替换为年份
+        strategies: 预测未命中后的查找步骤
+    """
+
+    def __init__(self, library, entry_url, base_url=None, file_prefix=None, keywords=DEFAULT_KEYWORDS,
+                 required=(), formats=('pdf',), browser=False, headless=True, wait_selector=None,
+                 container=None, detail_keywords=REPORT_WORDS, detail_html_only=False, detail_any_year=False,
+                 guess_names=(), strategies=DEFAULT_STRATEGIES):
+        unknown = [name for name in strategies if name not in STRATEGIES]
+        if unknown:
+            raise ValueError(f"{library}: 未知的查找步骤 {', '.join(unknown)}")
+        unknown = [name for name in formats if name not in DOCUMENT_EXTENSIONS]
+        if unknown:
+            raise ValueError(f"{library}: 未知的文档格式 {', '.join(unknown)}")
+        parsed = urlparse(entry_url)
+        self.library = library
+        self.entry_url = entry_url
+        self.base_url = (base_url or f'{parsed.scheme}://{parsed.netloc}').rstrip('/')
+        self.file_prefix = file_prefix or library
+        self.keywords = tuple(keywords)
+        self.required = tuple(tuple(group) for group in required)
+        self.formats = tuple(formats)
+        self.browser = browser
+        self.headless = headless
+        self.wait_selector = wait_selector
+        self.container = container
+        self.detail_keywords = tuple(detail_keywords)
+        self.detail_html_only = detail_html_only
+        self.detail_any_year = detail_any_year
+        self.guess_names = tuple(guess_names)
+        self.strategies = tuple(strategies)
+
+    @property
+    def host(self):
+        return (urlparse(self.entry_url).hostname or self.library).lower()
+
+    def document_format(self, url):
+        """链接指向的文档格式（只认 formats 中的格式），不是文档时返回None"""
+        lowered = url.lower()
+        path = urlparse(lowered).path
+        for name in self.formats:
+            extension = DOCUMENT_EXTENSIONS[name]
+            if path.endswith(extension) or lowered.endswith(extension):
+                return name
+        return None
+
+    def format_rank(self, link):
+        return self.formats.index(link['format']) if link['format'] else len(self.formats)
+
+
+# ---------------------------------------------------------------------------
+# 读取年报页面
+# ---------------------------------------------------------------------------
+
+def _fetch_html(session, url):
+    """请求页面，http 访问失败时改用 https，返回 (页面地址, html)"""
+    try:
+        response = cached_get(session, url, timeout=30, verify=False)
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        if not url.startswith('http://'):
+            raise
+        url = 'https://' + url[len('http://'):]
+        print(f"HTTP访问失败，尝试HTTPS: {url}")
+        response = cached_get(session, url, timeout=30, verify=False)
+        response.raise_for_status()
+    response.encoding = detect_encoding(response)
+    return url, response.text
+
+
+def _render_page(profile):
+    """用浏览器打开年报页面，返回渲染后的html"""
+    from common.browser_pool import lease_driver, standard_options
+    from common.page_ready import PageReadiness
+
+    chrome_options = standard_options()
+    if not profile.headless:
+        chrome_options.arguments.remove('--headless')
+    chrome_options.add_argument('--ignore-certificate-errors')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+
+    print(f"正在使用浏览器访问页面: {profile.entry_url}")
+    driver = lease_driver(chrome_options)
+    try:
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        driver.get(profile.entry_url)
+        ready = PageReadiness(driver, profile.library)
+        ready.document_ready()
+        if profile.wait_selector and not ready.selector_present(profile.wait_selector):
+            print(f"⚠️  等待 {profile.wait_selector} 超时，继续尝试...")
+        ready.dom_quiet()
+        return driver.page_source
+    finally:
+        driver.quit()
+
+
+def _page_links(profile, html):
+    """页面中的链接 [(href, 文字)]，设置了 container 时只取其中的链接"""
+    if not profile.container:
+        return [(link.href, link.text or link.title) for link in extract_links(html)]
+    soup = BeautifulSoup(html, 'html.parser')
+    links = []
+    for box in soup.select(profile.container):
+        for tag in box.find_all('a', href=True):
+            links.append((tag.get('href'), tag.get_text().strip() or tag.get('title', '')))
+    return links
+
+
+def collect_links(profile, html, page_url):
+    """
+    筛选年报页面中的链接
+
+    返回 [{'url', 'text', 'year', 'format', 'is_report'}]（按页面顺序）
+    """
+    links = []
+    for href, text in _page_links(profile, html):
+        href = (href or '').strip()
+        text = (text or '').strip()
+        if not href or href.startswith(('javascript:', '#', 'mailto:')):
+            continue
+        if profile.required and not all(any(word in text for word in group) for group in profile.required):
+            continue
+        url = urljoin(page_url, href)
+        is_report = any(keyword in text or keyword in href.lower() for keyword in profile.keywords)
+        doc_format = profile.document_format(url)
+        # 优先使用文字中的年份，然后是地址参数中的年份，最后是地址路径中的年份
+        year = extract_year_from_text(text) or extract_year_from_url_params(url) or extract_year_from_text(href)
+        if is_report or doc_format or year:
+            links.append({'url': url, 'text': text, 'year': year, 'format': doc_format, 'is_report': is_report})
+    return links
+
+
+def _is_report_text(link):
+    return any(word in link['text'] for word in REPORT_WORDS) or '年报' in link['url']
+
+
+# ---------------------------------------------------------------------------
+# 查找步骤
+# ---------------------------------------------------------------------------
+
+def _from_list(profile, links, year, session):
+    """年报页面中去年的文档链接：文档格式优先，其次文字中带年报的，最后按页面顺序"""
+    documents = [link for link in links if link['format']]
+    if not documents:
+        return None
+    best = min(documents, key=lambda link: (profile.format_rank(link), not _is_report_text(link)))
+    print(f"✓ 找到去年的年报链接: {best['text']} (年份: {best['year'] or year})")
+    print(f"  URL: {best['url']}")
+    return best['url'], best['year'] or year
+
+
+def _from_guess(profile, links, year, session):
+    """按常见文件名在网站根目录下构造地址并发探测"""
+    if not profile.guess_names:
+        return None
+    print("未找到直接的文档链接，尝试构建可能的地址...")
+    headers = dict(session.headers)
+
+    async def probe(engine, name):
+        url = f"{profile.base_url}/{name.format(year=year)}"
+        print(f"尝试访问可能的地址: {url}")
+        try:
+            response = await engine.head(url, headers=headers, timeout=10)
+        except Exception:
+            # 有些服务器不支持HEAD，改用GET（只读取响应头）
+            try:
+                response = await engine.get(url, headers=headers, timeout=10, read_body=False)
+            except Exception:
+                return None
+        if response.status_code != 200:
+            return None
+        content_type = response.headers.get('Content-Type', '').lower()
+        if 'text/html' in content_type:
+            return None
+        print(f"✓ 找到去年的年报 (年份: {year})")
+        print(f"  URL: {url}")
+        return url, year
+
+    return run_first_match(list(profile.guess_names), probe)
+
+
+def _documents_in_page(profile, html, page_url, year):
+    """
+    详情页中的文档地址，按是否确认为去年、格式、是否带年报关键词排序；
+    其他年份的文档只在 detail_any_year 时作为最后的选择
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    candidates = []
+    other_years = []
+    for index, tag in enumerate(soup.find_all(['a', 'iframe', 'embed'])):
+        src = tag.get('href') or tag.get('src') or tag.get('data-src')
+        if not src or src.startswith(('javascript:', '#')):
+            continue
+        url = urljoin(page_url, src.strip())
+        doc_format = profile.document_format(url)
+        if not doc_format:
+            continue
+        text = (tag.get_text().strip() or tag.get('title', '')) if tag.name == 'a' else ''
+        doc_year = extract_year_from_text(text) or extract_year_from_text(src) or extract_year_from_url_params(url)
+        has_keyword = any(keyword in text or keyword in src.lower() for keyword in DETAIL_DOC_KEYWORDS)
+        key = (doc_year != year, profile.formats.index(doc_format), not has_keyword, index)
+        if doc_year and doc_year != year:
+            other_years.append((key, url, text or src, doc_year))
+            continue
+        candidates.append((key, url, text or src))
+    if candidates:
+        _, url, text = min(candidates)
+        print(f"✓ 在页面找到文档: {text}")
+        print(f"  URL: {url}")
+        return url, year
+    if profile.detail_any_year and other_years:
+        _, url, text, doc_year = min(other_years, key=lambda item: item[0][1:])
+        print(f"✓ 在页面找到文档（未验证年份）: {text}")
+        print(f"  URL: {url}")
+        return url, doc_year
+
+    # 正文中以文字形式给出的PDF地址
+    if 'pdf' in profile.formats:
+        for url in _PDF_IN_TEXT_RE.findall(soup.get_text()):
+            if year in url:
+                print(f"✓ 在页面文本中找到PDF地址: {url}")
+                return url, year
+    return None
+
+
+def _from_detail(profile, links, year, session):
+    """并发进入去年的非文档链接，在详情页中查找文档"""
+    pages = [link for link in links if not link['format']
+             and (not profile.detail_keywords or any(word in link['text'] for word in profile.detail_keywords))
+             and (not profile.detail_html_only or urlparse(link['url']).path.lower().endswith(HTML_EXTENSIONS))]
+    if not pages:
+        return None
+    print(f"找到 {len(pages)} 个去年的页面链接，正在进入页面查找文档...")
+
+    def check_page(link):
+        print(f"访问链接页面: {link['text']}")
+        print(f"  URL: {link['url']}")
+        try:
+            page_url, html = _fetch_html(session, link['url'])
+        except Exception as e:
+            print(f"  访问链接页面失败: {e}")
+            return None
+        found = _documents_in_page(profile, html, page_url, year)
+        if not found:
+            print("  在页面未找到文档链接")
+        return found
+
+    return run_first_match(pages, check_page)
+
+
+def _first_link(profile, links, year, session):
+    """返回去年的第一个链接"""
+    link = links[0]
+    print(f"✓ 找到去年的链接: {link['text']} (年份: {link['year'] or year})")
+    return link['url'], link['year'] or year
+
+
+_STRATEGY_FUNCTIONS = {
+    'list': _from_list,
+    'guess': _from_guess,
+    'detail': _from_detail,
+    'first_link': _first_link,
+}
+
+
+def find_report(profile, year):
+    """
+    在年报页面中查找指定年份的年报（不包括按往年规律预测）
+
+    返回:
+        (url, 年份)，未找到时返回None
+    """
+    session = get_session(get_headers())
+    try:
+        if profile.browser:
+            page_url, html = profile.entry_url, _render_page(profile)
+        else:
+            print(f"正在访问页面: {profile.entry_url}")
+            page_url, html = _fetch_html(session, profile.entry_url)
+
+        print(f"查找 {year} 年的年报...")
+        all_links = collect_links(profile, html, page_url)
+        if all_links:
+            print(f"找到 {len(all_links)} 个可能的链接")
+            for link in all_links[:10]:
+                print(f"  - {link['text']} | 年份: {link['year']} | URL: {link['url'][:80]}")
+
+        year_links = [link for link in all_links if link['year'] == year or year in link['text']]
+        if year_links:
+            for name in profile.strategies:
+                found = _STRATEGY_FUNCTIONS[name](profile, year_links, year, session)
+                if found:
+                    return found
+
+        others = [link for link in all_links if link['is_report'] and link['year'] and link['year'] != year]
+        if others:
+            print(f"\n⚠️  未找到 {year} 年的年报，但找到其他年份的年报:")
+            for link in others[:10]:
+                print(f"    {link['text']} (年份: {link['year']})")
+        print(f"✗ 未找到 {year} 年的年报")
+        return None
+    except Exception as e:
+        print(f"✗ 查找年报链接失败: {e}")
+        traceback.print_exc()
+        return None
+    finally:
+        session.close()
+
+
+def report_filename(profile, year, url):
+    """年报文件名：<前缀><年份>年年报<扩展名>（扩展名按地址判断，默认.pdf）"""
+    doc_format = profile.document_format(url)
+    extension = DOCUMENT_EXTENSIONS[doc_format] if doc_format else '.pdf'
+    return clean_filename(f"{profile.file_prefix}{year}年年报{extension}")
+
+
+# ---------------------------------------------------------------------------
+# 图书馆脚本入口
+# ---------------------------------------------------------------------------
+
+def run_profile(profile, script_dir=None):
+    """
+    按站点配置下载去年的年报（图书馆脚本的 main()），返回结果字典
+
+    参数:
+        script_dir: config.txt 所在目录，默认为 年报下载1 目录（打包后为exe所在目录）
+    """
+    report = begin_report(profile.library)
+
+    print("=" * 60)
+    print(f"{profile.file_prefix}年报下载工具")
+    print("=" * 60)
+
+    if not script_dir:
+        # 打包后的exe从 _internal 导入 common，config.txt 在exe所在目录
+        if getattr(sys, 'frozen', False):
+            script_dir = os.path.dirname(sys.executable)
+        else:
+            script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = load_config(os.path.join(script_dir, "config.txt"))
+    if config is None:
+        return report.finish(STATUS_CONFIG_ERROR, error='配置文件不可用')
+
+    output_folder = config.get("output_folder", "").strip()
+    if not output_folder:
+        print("✗ 错误: 配置文件中未设置 output_folder")
+        print("  请在配置文件中设置输出路径")
+        return report.finish(STATUS_CONFIG_ERROR, error='未设置 output_folder')
+
+    last_year_str = str(int(time.strftime('%Y')) - 1)
+    print(f"目标年份: {last_year_str}年")
+    print(f"输出路径: {output_folder}")
+    print("-" * 60)
+
+    with report.phase('find'):
+        # 先按往年的年报地址规律预测，未命中时再完整查找
+        result = (predict_report_url(report, last_year_str, profile.entry_url)
+                  or find_report(profile, last_year_str))
+
+    if not result:
+        print("\n✗ 未找到年报链接，下载失败")
+        return report.finish(STATUS_NOT_FOUND, year=last_year_str)
+
+    file_url, year_for_filename = result
+    filename = report_filename(profile, year_for_filename, file_url)
+    print(f"\n文件名: {filename}")
+    print("-" * 60)
+
+    with report.phase('download'):
+        success = download_pdf(file_url, filename, output_folder)
+
+    print("\n" + "=" * 60)
+    print("✓ 下载完成" if success else "✗ 下载失败")
+    print("=" * 60)
+    if success:
+        print(f"文件已保存到: {os.path.join(output_folder, filename)}")
+
+    return report.finish(
+        STATUS_SUCCESS if success else STATUS_FAILED,
+        year=year_for_filename,
+        url=file_url,
+        path=os.path.join(output_folder, filename),
+    )
+
+
+# ---------------------------------------------------------------------------
+# 批量查找
+# ---------------------------------------------------------------------------
+
+def load_profiles(script_dir, names=None):
+    """导入脚本目录中使用站点配置的图书馆脚本，返回 [SiteProfile]（按名称排序）"""
+    from common.plugin_runner import load_library_module
+
+    wanted = {name[:-3] if name.endswith('.py') else name for name in (names or [])}
+    profiles = []
+    for file in sorted(os.listdir(script_dir)):
+        library = file[:-3]
+        if not file.endswith('.py') or (wanted and library not in wanted):
+            continue
+        path = os.path.join(script_dir, file)
+        with open(path, 'r', encoding='utf-8') as f:
+            if 'SiteProfile(' not in f.read():
+                continue
+        # 用 python -m 运行时本模块是 __main__，脚本中的 SiteProfile 来自 common.site_profile，不能用 isinstance
+        profile = getattr(load_library_module(path), 'PROFILE', None)
+        if profile is not None and hasattr(profile, 'strategies'):
+            profiles.append(profile)
+    return profiles
+
+
+def find_profiles(profiles, year, max_workers=4, per_host_limit=1, log=print):
+    """
+    并发查找多个图书馆的年报（同一网站的图书馆依次查找），返回 {图书馆: (url, 年份) 或 None}
+
+    需要浏览器的图书馆同样参与调度，从浏览器池租用Chrome
+    """
+    from common.scheduler import run_scheduled
+
+    tasks = [{'name': profile.library, 'host': profile.host, 'profile': profile} for profile in profiles]
+    results = run_scheduled(tasks, lambda task: find_report(task['profile'], year),
+                            max_workers=max_workers, per_host_limit=per_host_limit, log=log)
+    return {task['name']: result or None for task, result in results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按站点配置查找年报（只查找不下载）')
+    parser.add_argument('libraries', nargs='*', help='图书馆名称，默认为所有使用站点配置的图书馆')
+    parser.add_argument('--year', default=str(int(time.strftime('%Y')) - 1))
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    profiles = load_profiles(script_dir, args.libraries)
+    if not profiles:
+        print("✗ 没有使用站点配置的图书馆脚本")
+        return 1
+    print(f"查找 {len(profiles)} 个图书馆 {args.year} 年的年报...")
+    results = find_profiles(profiles, args.year, max_workers=args.workers)
+
+    print("\n" + "=" * 60)
+    found = 0
+    for profile in profiles:
+        result = results.get(profile.library)
+        if result:
+            found += 1
+            print(f"✓ {profile.library}: {result[0]}")
+        else:
+            print(f"✗ {profile.library}: 未找到")
+    print(f"共 {len(profiles)} 个，找到 {found} 个")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+年报链接索引与地址预测
+功能：
+1. url_pattern()：把年报地址中的年份替换为占位符，得到该图书馆的地址规律
+   （例如 .../files/nb2023.pdf -> .../files/nb{year}.pdf）
+2. predict_urls()：根据台账中往年的年报地址（report_urls 表，以及下载记录中的地址），
+   生成今年可能的地址，近的年份优先
+3. predict_report_url()：依次检查预测的地址，确认是PDF时直接返回 (url, 年份)，
+   脚本不必再完整爬取年报页面；全部未命中时返回None，由脚本按原来的方式查找
+4. is_pdf_url()：请求地址确认内容是PDF（补齐下载 common/backfill.py 也用它检查预测的地址）
+
+环境变量 NIANBAO_URL_PREDICT=off 时不预测
+"""
+
+import os
+import re
+import sys
+import sqlite3
+
+import requests
+
+from common.sessions import get_session
+
+URL_PREDICT_ENV = 'NIANBAO_URL_PREDICT'
+
+# 地址中与年报年份相差不超过1年的年份都替换为占位符（有的图书馆按发布年份命名）
+_OFFSETS = {0: '{year}', 1: '{year+1}', -1: '{year-1}'}
+
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/pdf,*/*;q=0.8',
+}
+
+
+def predict_enabled():
+    return os.environ.get(URL_PREDICT_ENV, '').strip().lower() not in ('off', 'false', '0', 'no', '否')
+
+
+def url_pattern(url, year):
+    """把地址中的年份替换为占位符，地址中不含年份时返回None（无法推算其他年份的地址）"""
+    try:
+        year = int(year)
+    except (TypeError, ValueError):
+        return None
+
+    def replace(match):
+        offset = int(match.group(0)) - year
+        return _OFFSETS.get(offset, match.group(0))
+
+    pattern = re.sub(r'(?<!\d)(?:19|20)\d{2}(?!\d)', replace, url)
+    return pattern if '{year' in pattern else None
+
+
+def expand_pattern(pattern, year):
+    """按年份展开地址规律"""
+    year = int(year)
+    return (pattern.replace('{year+1}', str(year + 1))
+                   .replace('{year-1}', str(year - 1))
+                   .replace('{year}', str(year)))
+
+
+def _get_script_dir():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_known_urls(library):
+    """从台账读取该图书馆往年的年报地址 [(年份, 地址)]，台账不存在时返回空列表（不创建台账）"""
+    from common.ledger import get_ledger_path, open_ledger
+
+    db_path = get_ledger_path(_get_script_dir())
+    if not os.path.exists(db_path):
+        return []
+    try:
+        ledger = open_ledger(None, db_path)
+    except sqlite3.Error:
+        return []
+    try:
+        known = [(row['year'], row['file_url']) for row in ledger.get_report_urls(library)]
+        # 建立索引之前的下载记录中也保存了地址
+        known += [(row['year'], row['url']) for row in ledger.get_downloaded_urls(library)]
+        return known
+    except sqlite3.Error:
+        return []
+    finally:
+        ledger.close()
+
+
+def predict_urls(library, year, known=None):
+    """根据往年的年报地址生成指定年份可能的地址（去重，近的年份优先）"""
+    if known is None:
+        known = _load_known_urls(library)
+    candidates = []
+    for known_year, url in sorted(known, key=lambda item: str(item[0]), reverse=True):
+        if not url or str(known_year) == str(year):
+            continue
+        pattern = url_pattern(url, known_year)
+        if not pattern:
+            continue
+        candidate = expand_pattern(pattern, year)
+        if candidate not in candidates:
+            candidates.append(candidate)
+    return candidates
+
+
+def is_pdf_url(session, url, timeout=10):
+    """检查地址是否能访问且内容是PDF（只读取开头几个字节）"""
+    try:
+        with session.get(url, headers=_HEADERS, timeout=timeout, verify=False,
+                         stream=True, allow_redirects=True) as response:
+            if response.status_code != 200:
+                return False
+            if 'pdf' in response.headers.get('Content-Type', '').lower():
+                return True
+            head = next(response.iter_content(chunk_size=1024), b'')
+            return head.lstrip().startswith(b'%PDF')
+    except requests.RequestException:
+        return False
+
+
+def predict_report_url(report, year, page_url=None):
+    """
+    按往年的地址规律查找年报，命中时返回 (url, 年份)，否则返回None
+
+    参数:
+        report: common/result.py 的 RunReport，记录年报页面地址和是否为预测命中
+        page_url: 年报所在的页面（记录到索引中，便于以后人工查看）
+    """
+    report.page = page_url
+    if not predict_enabled():
+        return None
+    candidates = predict_urls(report.library, year)
+    if not candidates:
+        return None
+
+    print(f"按往年的地址规律尝试 {len(candidates)} 个可能的地址...")
+    with get_session() as session:
+        for url in candidates:
+            if is_pdf_url(session, url):
+                print(f"✓ 预测的地址有效，跳过页面查找: {url}")
+                report.predicted = True
+                return (url, str(year))
+            print(f"  未命中: {url}")
+    print("预测的地址都无效，按原方式查找...")
+    return None
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+内蒙古图书馆.py 的 main()：未找到年报时返回 not_found 结果
+
+运行: python -m pytest tests  （或 python -m unittest discover tests）
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+import 内蒙古图书馆 as library
+from common.result import RESULT_FILE_ENV, STATUS_NOT_FOUND
+
+
+class MainNotFoundTest(unittest.TestCase):
+
+    def test_not_found_returns_result(self):
+        target_year = str(int(time.strftime('%Y')) - 1)
+        with mock.patch.dict(os.environ, {}, clear=False), \
+                mock.patch.object(library, 'load_config', return_value={'output_folder': 'out'}), \
+                mock.patch.object(library, 'predict_report_url', return_value=None), \
+                mock.patch.object(library, 'find_last_year_report', return_value=None):
+            os.environ.pop(RESULT_FILE_ENV, None)
+            result = library.main()
+
+        self.assertEqual(result['library'], '内蒙古图书馆')
+        self.assertEqual(result['status'], STATUS_NOT_FOUND)
+        self.assertEqual(result['year'], target_year)
+        self.assertIsNone(result['url'])
+        self.assertIn('find', result['phases'])
+
+
+if __name__ == '__main__':
+    unittest.main()
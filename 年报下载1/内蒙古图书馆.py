@@ -11,6 +11,16 @@ import re
 import urllib3
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
+from common.result import begin_report, STATUS_SUCCESS, STATUS_FAILED, STATUS_NOT_FOUND, STATUS_CONFIG_ERROR
+from common.html_links import detect_encoding, extract_links
+from common.sessions import get_session
+from common.http_cache import cached_get, open_download, save_response
+from common.browser_pool import lease_driver
+from common.page_ready import PageReadiness
+from common.print_pdf import print_page_to_pdf
+from common.url_index import predict_report_url
+from common.library_utils import (get_headers, clean_filename, extract_year_from_text,
+                                  extract_year_from_url_params, load_config, download_pdf)
 
 # Selenium相关导入
 try:
@@ -18,7 +28,6 @@ try:
     from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
-    from selenium.webdriver.chrome.options import Options
     from selenium.common.exceptions import TimeoutException, NoSuchElementException
     SELENIUM_AVAILABLE = True
 except ImportError:
@@ -29,37 +38,6 @@ except ImportError:
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def get_headers():
-    """获取模拟浏览器的请求头"""
-    return {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/pdf',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
-
-def clean_filename(filename):
-    """清理文件名，移除Windows不允许的字符"""
-    invalid_chars = r'[<>:"/\\|?*]'
-    cleaned = re.sub(invalid_chars, '_', filename)
-    cleaned = cleaned.strip(' .')
-    if not cleaned:
-        cleaned = "unnamed_file"
-    return cleaned
-
-def extract_year_from_text(text):
-    """从文本中提取年份，优先提取完整的年份（如2023、2024）"""
-    if not text:
-        return None
-    # 优先匹配完整的4位年份（2000-2099）
-    year_match = re.search(r'(20[0-3]\d)', text)
-    if year_match:
-        return year_match.group(1)
-    return None
-
 def verify_year_in_text(text, target_year):
     """严格验证文本中是否包含目标年份（避免误匹配）"""
     if not text or not target_year:
@@ -69,78 +47,14 @@ def verify_year_in_text(text, target_year):
     # 检查是否包含目标年份
     return target_year in years
 
-def extract_year_from_url_params(url):
-    """从URL参数中提取年份（特别是从filename参数）"""
-    try:
-        from urllib.parse import urlparse, parse_qs
-        parsed = urlparse(url)
-        params = parse_qs(parsed.query)
-        # 检查filename参数
-        if 'filename' in params:
-            filename = params['filename'][0]
-            year = extract_year_from_text(filename)
-            if year:
-                return year
-    except:
-        pass
-    return None
-
-def load_config(config_path="config.txt"):
-    """读取配置文件"""
-    config = {}
-    try:
-        if not os.path.exists(config_path):
-            # 如果配置文件不存在，创建默认配置
-            default_config = """# 配置文件
-# 格式：key=value
-# 支持使用 # 开头添加注释
-# 支持空行
-
-# 输出文件夹路径（必填）
-# 示例：output_folder=D:\\Desktop\\图书馆年报
-output_folder=D:\\Desktop\\图书馆年报
-"""
-            with open(config_path, 'w', encoding='utf-8') as f:
-                f.write(default_config)
-            print(f"✓ 已创建默认配置文件: {config_path}")
-            print("  请编辑配置文件设置输出路径后重新运行")
-            return None
-        
-        with open(config_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    if value.startswith('"') and value.endswith('"'):
-                        value = value[1:-1]
-                    elif value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    config[key] = value
-    except Exception as e:
-        print(f"✗ 读取配置文件失败: {e}")
-        return None
-    
-    return config
-
 def setup_selenium_driver():
     """设置Selenium WebDriver"""
     if not SELENIUM_AVAILABLE:
         return None
     
     try:
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')  # 无头模式
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        driver = webdriver.Chrome(options=chrome_options)
+        # 从浏览器池租用预热的无头浏览器（driver.quit() 时归还，供下一个图书馆使用）
+        driver = lease_driver()
         return driver
     except Exception as e:
         print(f"✗ 启动浏览器失败: {e}")
@@ -168,25 +82,17 @@ def find_last_year_report_selenium(url, base_url):
         if not driver:
             return None
         
+        ready = PageReadiness(driver, '内蒙古图书馆')
+        
         # 第一步：访问年报页面
         print(f"正在访问页面: {url}")
         driver.get(url)
         
-        # 等待页面加载
+        # 等待页面加载、网络空闲、JavaScript渲染完成（DOM不再变化）
         print("等待页面加载...")
-        time.sleep(5)  # 等待JavaScript执行
-        
-        # 尝试等待页面元素加载
-        try:
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-        except TimeoutException:
+        if not ready.settled(timeout=20):
             print("  页面加载超时，继续尝试...")
         
-        # 再次等待，确保JavaScript内容加载完成
-        time.sleep(3)
-        
         # 第二步：查找并点击"决算"链接/按钮
         print("查找'决算'链接...")
         report_entry_keywords = ['决算']  # 只查找"决算"
@@ -268,7 +174,7 @@ def find_last_year_report_selenium(url, base_url):
                 
                 # 滚动到元素可见
                 driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});", entry_elem)
-                time.sleep(1)
+                ready.element_stable(entry_elem)
                 
                 # 确保元素在视口中
                 try:
@@ -306,8 +212,8 @@ def find_last_year_report_selenium(url, base_url):
                     print(f"    无法点击该元素，跳过")
                     continue
                 
-                # 等待页面响应
-                time.sleep(3)
+                # 等待页面响应（URL变化或打开新窗口）
+                ready.navigation(url_before, window_handles_before, timeout=3)
                 
                 # 检查URL是否变化
                 url_after = driver.current_url
@@ -350,21 +256,10 @@ def find_last_year_report_selenium(url, base_url):
         # 第四步：等待年报页面完全加载，然后保存为PDF
         print(f"年报页面已打开，等待页面完全加载...")
         
-        # 等待页面完全加载
-        try:
-            WebDriverWait(driver, 30).until(
-                lambda d: d.execute_script("return document.readyState") == "complete"
-            )
-            # 额外等待图片和资源加载
-            time.sleep(5)
-            
-            # 滚动页面确保所有内容加载
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(1)
-        except:
+        # 等待页面完全加载（加载完成、网络空闲、DOM静止），再等待图片加载
+        if not (ready.settled(timeout=30) and ready.images_loaded(timeout=10)):
             print("  页面加载超时，继续保存...")
+        ready.print_summary()
         
         # 返回特殊标记，表示需要保存当前页面为PDF
         # 返回格式：(url, year, driver, 'save_as_pdf')
@@ -397,8 +292,7 @@ def find_last_year_report(url, base_url):
     
     # 使用requests方式直接查找
     print("正在使用requests访问页面查找年报...")
-    session = requests.Session()
-    session.headers.update(get_headers())
+    session = get_session(get_headers())
     
     try:
         # 处理哈希路由URL（SPA应用）
@@ -412,14 +306,14 @@ def find_last_year_report(url, base_url):
             
             # 先尝试访问基础URL
             try:
-                response = session.get(base_url_part, timeout=30, verify=False)
+                response = cached_get(session, base_url_part, timeout=30, verify=False)
                 response.raise_for_status()
                 url = base_url_part  # 使用基础URL
             except requests.exceptions.RequestException:
                 # 如果基础URL失败，尝试完整URL
                 print(f"基础URL访问失败，尝试完整URL: {original_url}")
                 try:
-                    response = session.get(original_url, timeout=30, verify=False)
+                    response = cached_get(session, original_url, timeout=30, verify=False)
                     response.raise_for_status()
                     url = original_url
                 except requests.exceptions.RequestException:
@@ -428,7 +322,7 @@ def find_last_year_report(url, base_url):
             # 尝试访问页面，如果http失败则尝试https
             print(f"正在访问页面: {url}")
             try:
-                response = session.get(url, timeout=30, verify=False)
+                response = cached_get(session, url, timeout=30, verify=False)
                 response.raise_for_status()
             except requests.exceptions.RequestException:
                 # 如果http失败，尝试https
@@ -436,7 +330,7 @@ def find_last_year_report(url, base_url):
                     https_url = url.replace('http://', 'https://', 1)
                     print(f"HTTP访问失败，尝试HTTPS: {https_url}")
                     try:
-                        response = session.get(https_url, timeout=30, verify=False)
+                        response = cached_get(session, https_url, timeout=30, verify=False)
                         response.raise_for_status()
                         url = https_url  # 更新url为https版本
                     except requests.exceptions.RequestException as e2:
@@ -445,17 +339,17 @@ def find_last_year_report(url, base_url):
                 else:
                     raise
         
-        response.encoding = response.apparent_encoding or 'utf-8'
+        response.encoding = detect_encoding(response)
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        page_links = extract_links(response.text)
         
         print(f"查找 {last_year} 年的年报...")
         
         # 查找所有链接
         all_links = []
-        for link in soup.find_all('a', href=True):
-            href = link.get('href')
-            text = link.get_text().strip()
+        for link in page_links:
+            href = link.href
+            text = link.text
             
             if not href:
                 continue
@@ -573,9 +467,9 @@ def find_last_year_report(url, base_url):
                     juesuan_url = link_info['url']
                     print(f"  URL: {juesuan_url}")
                     try:
-                        link_response = session.get(juesuan_url, timeout=30, verify=False)
+                        link_response = cached_get(session, juesuan_url, timeout=30, verify=False)
                         link_response.raise_for_status()
-                        link_response.encoding = link_response.apparent_encoding or 'utf-8'
+                        link_response.encoding = detect_encoding(link_response)
                         link_soup = BeautifulSoup(link_response.text, 'html.parser')
                         
                         # 在这个页面中查找文档链接（PDF/DOCX/DOC）
@@ -721,19 +615,19 @@ def find_last_year_report(url, base_url):
                     if not link_info['url'].lower().endswith(('.docx', '.doc', '.pdf')):
                         print(f"访问链接页面: {link_info['url']}")
                         try:
-                            link_response = session.get(link_info['url'], timeout=30, verify=False)
+                            link_response = cached_get(session, link_info['url'], timeout=30, verify=False)
                             link_response.raise_for_status()
-                            link_response.encoding = link_response.apparent_encoding or 'utf-8'
-                            link_soup = BeautifulSoup(link_response.text, 'html.parser')
+                            link_response.encoding = detect_encoding(link_response)
+                            sub_links = extract_links(link_response.text)
                             
                             # 在这个页面中查找文档链接
-                            for doc_link in link_soup.find_all('a', href=True):
-                                doc_href = doc_link.get('href')
+                            for doc_link in sub_links:
+                                doc_href = doc_link.href
                                 if doc_href and (doc_href.lower().endswith(('.pdf', '.docx', '.doc'))):
                                     doc_full_url = urljoin(link_info['url'], doc_href)
                                     # 检查是否包含年份
-                                    if last_year_str in doc_full_url or last_year_str in doc_link.get_text():
-                                        print(f"✓ 在链接页面找到文档: {doc_link.get_text().strip()}")
+                                    if last_year_str in doc_full_url or last_year_str in doc_link.text:
+                                        print(f"✓ 在链接页面找到文档: {doc_link.text}")
                                         print(f"  URL: {doc_full_url}")
                                         return doc_full_url, last_year_str
                         except Exception as e:
@@ -768,208 +662,56 @@ def find_last_year_report(url, base_url):
     finally:
         session.close()
 
+def click_load_more_buttons(driver, ready, keywords):
+    """点击"加载更多"、"查看更多"等按钮，每次点击后等待新内容渲染完成，返回是否点击过"""
+    clicked_any = False
+    for keyword in keywords:
+        try:
+            buttons = driver.find_elements(By.XPATH, f"//*[contains(text(), '{keyword}')]")
+            for btn in buttons:
+                try:
+                    if btn.is_displayed() and btn.is_enabled():
+                        print(f"  找到并点击'{keyword}'按钮")
+                        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", btn)
+                        driver.execute_script("arguments[0].click();", btn)
+                        ready.dom_quiet(timeout=5)
+                        clicked_any = True
+                except:
+                    continue
+        except:
+            pass
+    return clicked_any
+
 def save_page_as_pdf(driver, url, filename, save_dir):
     """使用Selenium将网页保存为PDF"""
     try:
         print(f"正在将网页保存为PDF: {url}")
         
+        ready = PageReadiness(driver, '内蒙古图书馆')
+        
         # 第一步：滚动页面加载所有内容
         print("  正在滚动页面加载所有内容...")
         
         # 等待页面初始加载
-        try:
-            WebDriverWait(driver, 30).until(
-                lambda d: d.execute_script("return document.readyState") == "complete"
-            )
-        except:
-            pass
-        
-        time.sleep(2)
+        ready.settled(timeout=30)
         
         # 获取页面总高度
         last_height = driver.execute_script("return document.body.scrollHeight")
         print(f"  页面初始高度: {last_height}px")
         
-        # 滚动到顶部
-        driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(1)
-        
         # 检查并点击"加载更多"、"查看更多"等按钮
-        print("  检查是否有'加载更多'按钮...")
-        load_more_keywords = ['加载更多', '查看更多', '显示更多', '展开', '更多']
-        for keyword in load_more_keywords:
-            try:
-                buttons = driver.find_elements(By.XPATH, f"//*[contains(text(), '{keyword}')]")
-                for btn in buttons:
-                    try:
-                        if btn.is_displayed() and btn.is_enabled():
-                            print(f"  找到并点击'{keyword}'按钮")
-                            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", btn)
-                            time.sleep(1)
-                            driver.execute_script("arguments[0].click();", btn)
-                            time.sleep(2)
-                    except:
-                        continue
-            except:
-                pass
-        
-        # 更彻底的滚动策略：多次完整滚动，确保所有内容加载
-        print("  开始第一次完整滚动...")
-        
-        # 第一次：快速滚动到底部
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(3)
-        height_after_first = driver.execute_script("return document.body.scrollHeight")
-        print(f"  第一次滚动后页面高度: {height_after_first}px")
-        
-        # 第二次：逐步滚动，更细致地加载
-        print("  开始第二次逐步滚动...")
-        scroll_step = 300  # 减小步长，更细致
-        current_position = 0
-        no_change_count = 0
-        max_no_change = 5  # 连续5次高度不变才停止
-        
-        while no_change_count < max_no_change:
-            # 滚动到当前位置
-            driver.execute_script(f"window.scrollTo(0, {current_position});")
-            time.sleep(1)  # 增加等待时间
-            
-            # 更新当前位置
-            current_position += scroll_step
-            
-            # 获取新的页面高度
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            
-            # 如果已经滚动到底部
-            if current_position >= new_height:
-                # 滚动到底部
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(3)  # 增加等待时间
-                
-                # 再次检查页面高度
-                final_height = driver.execute_script("return document.body.scrollHeight")
-                if final_height > new_height:
-                    print(f"  检测到新内容加载，页面高度: {final_height}px")
-                    current_position = new_height
-                    new_height = final_height
-                    no_change_count = 0  # 重置计数器
-                else:
-                    no_change_count += 1
-                    if no_change_count < max_no_change:
-                        # 还没到最大次数，继续尝试
-                        current_position = 0  # 重新从顶部开始
-                        print(f"  重新从顶部开始滚动（第{no_change_count+1}次）...")
-                        time.sleep(1)
-                    else:
-                        break
-            else:
-                # 检查高度是否变化
-                if new_height > last_height:
-                    last_height = new_height
-                    no_change_count = 0
-                else:
-                    no_change_count += 1
-            
-            # 显示进度
-            if current_position % 3000 == 0 or current_position >= new_height:
-                print(f"  已滚动到: {min(current_position, new_height)}px / {new_height}px")
-        
-        # 第三次：非常慢速的完整滚动，确保所有内容都被触发加载
-        print("  开始第三次慢速完整滚动...")
-        driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(1)
-        
-        final_height = driver.execute_script("return document.body.scrollHeight")
-        scroll_increment = 100  # 更小的步长，更细致
-        print(f"  使用步长 {scroll_increment}px 进行细致滚动...")
-        
-        # 从0滚动到最终高度+额外空间
-        for pos in range(0, final_height + 2000, scroll_increment):
-            driver.execute_script(f"window.scrollTo(0, {pos});")
-            time.sleep(0.5)  # 增加等待时间，确保内容加载
-            
-            # 每滚动1000px检查一次页面高度
-            if pos % 1000 == 0:
-                current_height = driver.execute_script("return document.body.scrollHeight")
-                if current_height > final_height:
-                    print(f"  检测到页面高度增加到: {current_height}px")
-                    final_height = current_height
-        
-        # 最后滚动到底部
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(4)  # 增加等待时间
-        
-        # 再次检查最终高度
-        ultimate_height = driver.execute_script("return document.body.scrollHeight")
-        if ultimate_height > final_height:
-            print(f"  最终检测到新内容，页面高度: {ultimate_height}px")
-            # 再完整滚动一次
-            print("  进行第四次完整滚动...")
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(1)
-            for pos in range(0, ultimate_height + 2000, scroll_increment):
-                driver.execute_script(f"window.scrollTo(0, {pos});")
-                time.sleep(0.4)
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(4)
-            
-            # 再次检查
-            final_ultimate_height = driver.execute_script("return document.body.scrollHeight")
-            if final_ultimate_height > ultimate_height:
-                print(f"  再次检测到新内容，页面高度: {final_ultimate_height}px")
-                ultimate_height = final_ultimate_height
+        click_load_more_buttons(driver, ready, ['加载更多', '查看更多', '显示更多', '展开', '更多'])
         
-        final_page_height = driver.execute_script("return document.body.scrollHeight")
+        # 逐屏滚动整个页面触发懒加载，每屏等待DOM静止，页面高度不再增加时停止
+        final_page_height = ready.scroll_through()
         print(f"  最终页面高度: {final_page_height}px")
         
-        # 检查并点击"加载更多"、"查看更多"等按钮
-        print("  检查是否有'加载更多'按钮...")
-        load_more_keywords = ['加载更多', '查看更多', '显示更多', '展开', '更多', 'Load More', 'Show More']
-        clicked_any = False
-        for keyword in load_more_keywords:
-            try:
-                buttons = driver.find_elements(By.XPATH, f"//*[contains(text(), '{keyword}')]")
-                for btn in buttons:
-                    try:
-                        if btn.is_displayed() and btn.is_enabled():
-                            print(f"  找到并点击'{keyword}'按钮")
-                            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", btn)
-                            time.sleep(1)
-                            driver.execute_script("arguments[0].click();", btn)
-                            time.sleep(3)
-                            clicked_any = True
-                            # 点击后再次滚动到底部
-                            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                            time.sleep(2)
-                            # 检查高度是否增加
-                            new_height = driver.execute_script("return document.body.scrollHeight")
-                            if new_height > final_page_height:
-                                print(f"  点击后页面高度增加到: {new_height}px")
-                                final_page_height = new_height
-                    except:
-                        continue
-            except:
-                pass
-        
-        # 如果点击了按钮，再次完整滚动
-        if clicked_any:
+        # 滚动后可能出现新的"加载更多"按钮
+        if click_load_more_buttons(driver, ready, ['加载更多', '查看更多', '显示更多', '展开', '更多', 'Load More', 'Show More']):
             print("  检测到新内容，再次完整滚动...")
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(1)
-            scroll_increment = 200
-            for pos in range(0, final_page_height + 500, scroll_increment):
-                driver.execute_script(f"window.scrollTo(0, {pos});")
-                time.sleep(0.2)
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(3)
-            final_page_height = driver.execute_script("return document.body.scrollHeight")
+            final_page_height = ready.scroll_through()
             print(f"  再次滚动后页面高度: {final_page_height}px")
         
-        # 滚动回顶部，确保PDF从顶部开始
-        print("  滚动回顶部...")
-        driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(2)
-        
         # 处理iframe中的内容（如果有）
         print("  检查是否有iframe需要处理...")
         try:
@@ -983,7 +725,7 @@ def save_page_as_pdf(driver, url, filename, save_dir):
                         print(f"  iframe {i+1} 高度: {iframe_height}px")
                         # 滚动iframe内容
                         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                        time.sleep(2)
+                        ready.dom_quiet(timeout=2, quiet=0.3)
                         driver.switch_to.default_content()
                     except:
                         driver.switch_to.default_content()
@@ -993,60 +735,14 @@ def save_page_as_pdf(driver, url, filename, save_dir):
         
         # 等待所有图片和资源加载完成
         print("  等待所有资源加载完成...")
-        try:
-            # 等待所有图片加载
-            driver.execute_script("""
-                var images = document.getElementsByTagName('img');
-                var promises = [];
-                for (var i = 0; i < images.length; i++) {
-                    if (!images[i].complete) {
-                        var promise = new Promise(function(resolve) {
-                            images[i].onload = resolve;
-                            images[i].onerror = resolve;
-                        });
-                        promises.push(promise);
-                    }
-                }
-                return Promise.all(promises);
-            """)
-            time.sleep(5)  # 增加等待时间
-        except:
-            pass
-        
-        # 最后一次完整滚动，确保所有内容都在视口中被渲染
-        print("  进行最后一次完整滚动以确保所有内容被渲染...")
-        final_height_before_save = driver.execute_script("return document.body.scrollHeight")
-        print(f"  保存前页面高度: {final_height_before_save}px")
-        
-        driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(1)
-        
-        # 非常慢速地滚动，确保每个部分都被渲染
-        scroll_step_final = 50  # 非常小的步长
-        for pos in range(0, final_height_before_save + 1000, scroll_step_final):
-            driver.execute_script(f"window.scrollTo(0, {pos});")
-            time.sleep(0.1)  # 短暂等待，让浏览器渲染
+        if not (ready.images_loaded(timeout=15) and ready.network_idle(timeout=10)):
+            print("  部分资源加载超时，继续保存...")
         
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(3)
+        # 滚动回顶部，确保PDF从顶部开始
+        print("  滚动回顶部...")
         driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(2)
-        
-        # 最终等待，确保所有内容都加载完成
-        print("  最终等待所有内容加载...")
-        time.sleep(8)  # 增加最终等待时间
-        
-        # 最后一次检查页面高度
-        final_check_height = driver.execute_script("return document.body.scrollHeight")
-        print(f"  最终检查页面高度: {final_check_height}px")
-        
-        # 如果高度又增加了，再滚动一次
-        if final_check_height > final_page_height:
-            print(f"  检测到最终高度增加，再次滚动...")
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(3)
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(2)
+        ready.dom_quiet(timeout=3)
+        ready.print_summary()
         
         # 确保文件名是PDF
         filename = clean_filename(filename)
@@ -1092,15 +788,8 @@ def save_page_as_pdf(driver, url, filename, save_dir):
             'preferCSSPageSize': False,  # 不使用CSS页面大小
         }
         
-        # 执行打印命令
-        result = driver.execute_cdp_cmd('Page.printToPDF', print_options)
-        
-        # 保存PDF
-        import base64
-        pdf_data = base64.b64decode(result['data'])
-        
-        with open(file_path, 'wb') as f:
-            f.write(pdf_data)
+        # 执行打印命令（流式读取，分块写入文件）
+        print_page_to_pdf(driver, file_path, print_options)
         
         # 验证文件
         if not os.path.exists(file_path):
@@ -1126,97 +815,10 @@ def save_page_as_pdf(driver, url, filename, save_dir):
         traceback.print_exc()
         return False
 
-def download_pdf(url, filename, save_dir):
-    """下载文件（支持PDF、DOCX、DOC等格式）"""
-    try:
-        session = requests.Session()
-        session.headers.update(get_headers())
-        
-        print(f"正在下载: {url}")
-        response = session.get(url, stream=True, timeout=60, verify=False)
-        response.raise_for_status()
-        
-        # 检查内容类型和文件扩展名
-        content_type = response.headers.get('Content-Type', '').lower()
-        url_lower = url.lower()
-        
-        # 检查是否是HTML文件，如果是则拒绝下载
-        if 'text/html' in content_type or url_lower.endswith(('.htm', '.html')):
-            print(f"✗ 错误: URL指向的是HTML页面，不是文档文件")
-            print(f"  请检查页面中是否有PDF/DOCX/DOC文档链接")
-            return False
-        
-        # 根据URL确定文件扩展名
-        if url_lower.endswith('.docx'):
-            file_ext = '.docx'
-        elif url_lower.endswith('.doc'):
-            file_ext = '.doc'
-        elif url_lower.endswith('.pdf'):
-            file_ext = '.pdf'
-        else:
-            # 根据Content-Type判断
-            if 'word' in content_type or 'document' in content_type:
-                if 'openxml' in content_type or 'docx' in content_type:
-                    file_ext = '.docx'
-                else:
-                    file_ext = '.doc'
-            elif 'pdf' in content_type:
-                file_ext = '.pdf'
-            else:
-                file_ext = '.pdf'  # 默认使用pdf
-        
-        # 确保文件名有正确的扩展名
-        if not filename.lower().endswith(('.pdf', '.docx', '.doc')):
-            filename = filename + file_ext
-        elif not filename.lower().endswith(file_ext):
-            # 如果扩展名不匹配，替换为正确的扩展名
-            filename = os.path.splitext(filename)[0] + file_ext
-        
-        # 清理文件名
-        filename = clean_filename(filename)
-        
-        # 创建保存目录
-        os.makedirs(save_dir, exist_ok=True)
-        file_path = os.path.join(save_dir, filename)
-        
-        # 如果文件已存在，先删除
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"  已删除已存在的文件: {filename}")
-            except:
-                pass
-        
-        # 保存文件
-        file_size = 0
-        with open(file_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-                    file_size += len(chunk)
-        
-        # 验证文件是否成功保存
-        if not os.path.exists(file_path):
-            print(f"✗ 文件保存失败: {file_path}")
-            return False
-        
-        actual_size = os.path.getsize(file_path)
-        print(f"✓ 下载成功: {filename}")
-        print(f"  文件大小: {actual_size:,} 字节 ({actual_size/1024/1024:.2f} MB)")
-        print(f"  保存路径: {file_path}")
-        
-        session.close()
-        return True
-        
-    except requests.exceptions.RequestException as e:
-        print(f"✗ 下载失败: {e}")
-        return False
-    except Exception as e:
-        print(f"✗ 发生错误: {e}")
-        return False
-
 def main():
     """主函数"""
+    report = begin_report("内蒙古图书馆")
+    
     print("=" * 60)
     print("内蒙古图书馆年报下载工具")
     print("=" * 60)
@@ -1228,14 +830,14 @@ def main():
     # 读取配置文件
     config = load_config(config_path)
     if config is None:
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='配置文件不可用')
     
     # 获取输出路径
     output_folder = config.get("output_folder", "").strip()
     if not output_folder:
         print("✗ 错误: 配置文件中未设置 output_folder")
         print("  请在配置文件中设置输出路径")
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='未设置 output_folder')
     
     # 获取去年的年份（动态计算）
     current_year = int(time.strftime('%Y'))
@@ -1251,11 +853,14 @@ def main():
     print("-" * 60)
     
     # 查找年报链接
-    result = find_last_year_report(report_page_url, base_url)
+    with report.phase('find'):
+        # 先按往年的年报地址规律预测，未命中时再完整查找
+        result = (predict_report_url(report, target_year, report_page_url)
+                  or find_last_year_report(report_page_url, base_url))
     
     if not result:
         print(f"\n✗ 未找到 {target_year} 年的年报链接，下载失败")
-        return
+        return report.finish(STATUS_NOT_FOUND, year=target_year)
     
     # 处理返回值：可能是(url, year)元组、(url, year, driver, 'save_as_pdf')或只有url
     driver_to_close = None
@@ -1269,7 +874,7 @@ def main():
                 print(f"  为了确保年份准确，拒绝下载")
                 if driver_to_close:
                     driver_to_close.quit()
-                return
+                return report.finish(STATUS_NOT_FOUND, year=target_year, url=file_url, error=f'年份不符: {actual_year}')
             year_for_filename = target_year
             
             # 生成文件名
@@ -1280,7 +885,8 @@ def main():
             print("-" * 60)
             
             # 保存页面为PDF
-            success = save_page_as_pdf(driver_to_close, file_url, filename, output_folder)
+            with report.phase('download'):
+                success = save_page_as_pdf(driver_to_close, file_url, filename, output_folder)
             
             # 关闭driver
             if driver_to_close:
@@ -1295,7 +901,12 @@ def main():
                 print("\n" + "=" * 60)
                 print("✗ 保存失败")
                 print("=" * 60)
-            return
+            return report.finish(
+                STATUS_SUCCESS if success else STATUS_FAILED,
+                year=year_for_filename,
+                url=file_url,
+                path=os.path.join(output_folder, filename),
+            )
         else:
             # 普通的(url, year)元组
             file_url, actual_year = result
@@ -1303,7 +914,7 @@ def main():
             if actual_year != target_year:
                 print(f"✗ 错误：找到的是 {actual_year} 年的年报，不是 {target_year} 年的")
                 print(f"  为了确保年份准确，拒绝下载")
-                return
+                return report.finish(STATUS_NOT_FOUND, year=target_year, url=file_url, error=f'年份不符: {actual_year}')
             year_for_filename = target_year
     else:
         file_url = result
@@ -1311,7 +922,7 @@ def main():
         if target_year not in file_url:
             print(f"✗ 错误：URL中不包含 {target_year} 年，拒绝下载")
             print(f"  URL: {file_url}")
-            return
+            return report.finish(STATUS_NOT_FOUND, year=target_year, url=file_url, error='URL中不包含目标年份')
         year_for_filename = target_year
     
     # 生成文件名，使用实际找到的年份
@@ -1332,7 +943,8 @@ def main():
     print("-" * 60)
     
     # 下载文件
-    success = download_pdf(file_url, filename, output_folder)
+    with report.phase('download'):
+        success = download_pdf(file_url, filename, output_folder)
     
     if success:
         print("\n" + "=" * 60)
@@ -1343,6 +955,13 @@ def main():
         print("\n" + "=" * 60)
         print("✗ 下载失败")
         print("=" * 60)
+    
+    return report.finish(
+        STATUS_SUCCESS if success else STATUS_FAILED,
+        year=year_for_filename,
+        url=file_url,
+        path=os.path.join(output_folder, filename),
+    )
 
 if __name__ == "__main__":
     main()
@@ -9,9 +9,17 @@ import os
 import time
 import re
 import urllib3
-import base64
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
+from common.result import begin_report, STATUS_SUCCESS, STATUS_FAILED, STATUS_NOT_FOUND, STATUS_CONFIG_ERROR
+from common.html_links import detect_encoding
+from common.sessions import get_session
+from common.http_cache import cached_get, open_download, save_response
+from common.browser_pool import lease_driver
+from common.print_pdf import print_page_to_pdf
+from common.url_index import predict_report_url
+from common.library_utils import (get_headers, clean_filename, extract_year_from_text,
+                                  extract_year_from_url_params, load_config)
 
 # Selenium相关导入
 try:
@@ -19,7 +27,6 @@ try:
     from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
-    from selenium.webdriver.chrome.options import Options
     from selenium.common.exceptions import TimeoutException
     SELENIUM_AVAILABLE = True
 except ImportError:
@@ -30,109 +37,14 @@ except ImportError:
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def get_headers():
-    """获取模拟浏览器的请求头"""
-    return {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/pdf',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
-
-def clean_filename(filename):
-    """清理文件名，移除Windows不允许的字符"""
-    invalid_chars = r'[<>:"/\\|?*]'
-    cleaned = re.sub(invalid_chars, '_', filename)
-    cleaned = cleaned.strip(' .')
-    if not cleaned:
-        cleaned = "unnamed_file"
-    return cleaned
-
-def extract_year_from_text(text):
-    """从文本中提取年份，优先提取完整的年份（如2023、2024）"""
-    if not text:
-        return None
-    # 优先匹配完整的4位年份（2000-2099）
-    year_match = re.search(r'(20[0-3]\d)', text)
-    if year_match:
-        return year_match.group(1)
-    return None
-
-def extract_year_from_url_params(url):
-    """从URL参数中提取年份（特别是从filename参数）"""
-    try:
-        from urllib.parse import urlparse, parse_qs
-        parsed = urlparse(url)
-        params = parse_qs(parsed.query)
-        # 检查filename参数
-        if 'filename' in params:
-            filename = params['filename'][0]
-            year = extract_year_from_text(filename)
-            if year:
-                return year
-    except:
-        pass
-    return None
-
-def load_config(config_path="config.txt"):
-    """读取配置文件"""
-    config = {}
-    try:
-        if not os.path.exists(config_path):
-            # 如果配置文件不存在，创建默认配置
-            default_config = """# 配置文件
-# 格式：key=value
-# 支持使用 # 开头添加注释
-# 支持空行
-
-# 输出文件夹路径（必填）
-# 示例：output_folder=D:\\Desktop\\图书馆年报
-output_folder=D:\\Desktop\\图书馆年报
-"""
-            with open(config_path, 'w', encoding='utf-8') as f:
-                f.write(default_config)
-            print(f"✓ 已创建默认配置文件: {config_path}")
-            print("  请编辑配置文件设置输出路径后重新运行")
-            return None
-        
-        with open(config_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    if value.startswith('"') and value.endswith('"'):
-                        value = value[1:-1]
-                    elif value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    config[key] = value
-    except Exception as e:
-        print(f"✗ 读取配置文件失败: {e}")
-        return None
-    
-    return config
-
 def setup_driver():
     """设置Selenium WebDriver"""
     if not SELENIUM_AVAILABLE:
         return None
     
     try:
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')  # 无头模式
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        driver = webdriver.Chrome(options=chrome_options)
+        # 从浏览器池租用预热的无头浏览器（driver.quit() 时归还，供下一个图书馆使用）
+        driver = lease_driver()
         return driver
     except Exception as e:
         print(f"✗ 启动浏览器失败: {e}")
@@ -204,14 +116,8 @@ def save_html_as_pdf(url, filename, save_dir):
             'marginRight': 0.4,
         }
         
-        # 执行打印命令
-        result = driver.execute_cdp_cmd('Page.printToPDF', print_options)
-        
-        # 保存PDF
-        pdf_data = base64.b64decode(result['data'])
-        
-        with open(file_path, 'wb') as f:
-            f.write(pdf_data)
+        # 执行打印命令（流式读取，分块写入文件）
+        print_page_to_pdf(driver, file_path, print_options)
         
         # 验证文件
         if not os.path.exists(file_path):
@@ -252,20 +158,19 @@ def find_last_year_report(url, base_url):
     
     # 使用requests方式直接查找
     print("正在访问页面查找年报...")
-    session = requests.Session()
-    session.headers.update(get_headers())
+    session = get_session(get_headers())
     
     try:
         # 尝试访问页面
         print(f"正在访问页面: {url}")
         try:
-            response = session.get(url, timeout=30, verify=False)
+            response = cached_get(session, url, timeout=30, verify=False)
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             print(f"访问页面失败: {e}")
             raise
         
-        response.encoding = response.apparent_encoding or 'utf-8'
+        response.encoding = detect_encoding(response)
         
         # 显示页面基本信息
         print(f"\n页面访问成功")
@@ -409,8 +314,7 @@ def find_last_year_report(url, base_url):
 def download_pdf(url, filename, save_dir):
     """下载文件（支持PDF、DOCX、DOC、HTML等格式）"""
     try:
-        session = requests.Session()
-        session.headers.update(get_headers())
+        session = get_session(get_headers())
         
         print(f"正在下载: {url}")
         
@@ -424,7 +328,7 @@ def download_pdf(url, filename, save_dir):
             session.close()
             return save_html_as_pdf(url, filename, save_dir)
         
-        response = session.get(url, stream=True, timeout=60, verify=False)
+        response = open_download(session, url, timeout=60, verify=False)
         response.raise_for_status()
         
         # 检查内容类型和文件扩展名
@@ -477,21 +381,8 @@ def download_pdf(url, filename, save_dir):
         os.makedirs(save_dir, exist_ok=True)
         file_path = os.path.join(save_dir, filename)
         
-        # 如果文件已存在，先删除
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"  已删除已存在的文件: {filename}")
-            except:
-                pass
-        
-        # 保存文件
-        file_size = 0
-        with open(file_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-                    file_size += len(chunk)
+        # 保存文件（先写入.part，校验后重命名；内容未变化时不重新下载）
+        file_size = save_response(response, file_path)
         
         # 验证文件是否成功保存
         if not os.path.exists(file_path):
@@ -517,6 +408,8 @@ def download_pdf(url, filename, save_dir):
 
 def main():
     """主函数"""
+    report = begin_report("大连图书馆")
+    
     print("=" * 60)
     print("大连图书馆年报下载工具")
     print("=" * 60)
@@ -528,14 +421,14 @@ def main():
     # 读取配置文件
     config = load_config(config_path)
     if config is None:
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='配置文件不可用')
     
     # 获取输出路径
     output_folder = config.get("output_folder", "").strip()
     if not output_folder:
         print("✗ 错误: 配置文件中未设置 output_folder")
         print("  请在配置文件中设置输出路径")
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='未设置 output_folder')
     
     # 获取去年的年份
     current_year = int(time.strftime('%Y'))
@@ -553,11 +446,14 @@ def main():
     print("-" * 60)
     
     # 查找年报链接
-    result = find_last_year_report(report_page_url, base_url)
+    with report.phase('find'):
+        # 先按往年的年报地址规律预测，未命中时再完整查找
+        result = (predict_report_url(report, last_year_str, report_page_url)
+                  or find_last_year_report(report_page_url, base_url))
     
     if not result:
         print("\n✗ 未找到年报链接，下载失败")
-        return
+        return report.finish(STATUS_NOT_FOUND, year=last_year_str)
     
     # 处理返回值：可能是(url, year)元组或只有url
     if isinstance(result, tuple):
@@ -592,7 +488,8 @@ def main():
     print("-" * 60)
     
     # 下载文件
-    success = download_pdf(file_url, filename, output_folder)
+    with report.phase('download'):
+        success = download_pdf(file_url, filename, output_folder)
     
     if success:
         print("\n" + "=" * 60)
@@ -603,6 +500,13 @@ def main():
         print("\n" + "=" * 60)
         print("✗ 下载失败")
         print("=" * 60)
+    
+    return report.finish(
+        STATUS_SUCCESS if success else STATUS_FAILED,
+        year=year_for_filename,
+        url=file_url,
+        path=os.path.join(output_folder, filename),
+    )
 
 if __name__ == "__main__":
     main()
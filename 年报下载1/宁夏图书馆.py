@@ -18,6 +18,11 @@ import re
 import urllib3
 from urllib.parse import urljoin, urlparse
 import random
+from common.result import begin_report, STATUS_SUCCESS, STATUS_FAILED, STATUS_CONFIG_ERROR
+from common.sessions import get_session
+from common.http_cache import open_download, save_response
+from common.browser_pool import lease_driver
+from common.library_utils import get_headers, clean_filename, extract_year_from_text, load_config
 
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -72,49 +77,18 @@ def setup_selenium_driver(download_dir=None):
         }
         chrome_options.add_experimental_option("prefs", prefs)
     
-    driver = webdriver.Chrome(options=chrome_options)
+    # 按启动参数从浏览器池租用（driver.quit() 时归还）
+    driver = lease_driver(chrome_options)
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
     return driver
 
-def clean_filename(filename):
-    """清理文件名，移除Windows不允许的字符"""
-    invalid_chars = r'[<>:"/\\|?*]'
-    cleaned = re.sub(invalid_chars, '_', filename)
-    cleaned = cleaned.strip(' .')
-    if not cleaned:
-        cleaned = "unnamed_file"
-    return cleaned
-
-def extract_year_from_text(text):
-    """从文本中提取年份，优先提取完整的年份（如2023、2024）"""
-    if not text:
-        return None
-    # 优先匹配完整的4位年份（2000-2099）
-    year_match = re.search(r'(20[0-3]\d)', text)
-    if year_match:
-        return year_match.group(1)
-    return None
-
-def get_headers():
-    """获取模拟浏览器的请求头"""
-    return {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/pdf',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
-
 def download_pdf(url, filename, save_dir):
     """下载PDF文件"""
     try:
-        session = requests.Session()
-        session.headers.update(get_headers())
+        session = get_session(get_headers())
         
         print(f"正在下载: {url}")
-        response = session.get(url, stream=True, timeout=60, verify=False)
+        response = open_download(session, url, timeout=60, verify=False)
         response.raise_for_status()
         
         # 检查内容类型
@@ -133,21 +107,8 @@ def download_pdf(url, filename, save_dir):
         os.makedirs(save_dir, exist_ok=True)
         file_path = os.path.join(save_dir, filename)
         
-        # 如果文件已存在，先删除
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"  已删除已存在的文件: {filename}")
-            except:
-                pass
-        
-        # 保存文件
-        file_size = 0
-        with open(file_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-                    file_size += len(chunk)
+        # 保存文件（先写入.part，校验后重命名；内容未变化时不重新下载）
+        file_size = save_response(response, file_path)
         
         # 验证文件是否成功保存
         if not os.path.exists(file_path):
@@ -169,47 +130,6 @@ def download_pdf(url, filename, save_dir):
         print(f"✗ 发生错误: {e}")
         return False
 
-def load_config(config_path="config.txt"):
-    """读取配置文件"""
-    config = {}
-    try:
-        if not os.path.exists(config_path):
-            # 如果配置文件不存在，创建默认配置
-            default_config = """# 配置文件
-# 格式：key=value
-# 支持使用 # 开头添加注释
-# 支持空行
-
-# 输出文件夹路径（必填）
-# 示例：output_folder=D:\\Desktop\\图书馆年报
-output_folder=D:\\Desktop\\图书馆年报
-"""
-            with open(config_path, 'w', encoding='utf-8') as f:
-                f.write(default_config)
-            print(f"✓ 已创建默认配置文件: {config_path}")
-            print("  请编辑配置文件设置输出路径后重新运行")
-            return None
-        
-        with open(config_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    if value.startswith('"') and value.endswith('"'):
-                        value = value[1:-1]
-                    elif value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    config[key] = value
-    except Exception as e:
-        print(f"✗ 读取配置文件失败: {e}")
-        return None
-    
-    return config
-
 def find_and_download_report(url, base_url, save_dir, last_year_str):
     """查找并下载宁夏图书馆决算报告"""
     driver = None
@@ -440,6 +360,8 @@ def find_and_download_report(url, base_url, save_dir, last_year_str):
 
 def main():
     """主函数"""
+    report = begin_report("宁夏图书馆")
+    
     print("=" * 60)
     print("宁夏图书馆年报下载工具")
     print("=" * 60)
@@ -451,14 +373,14 @@ def main():
     # 读取配置文件
     config = load_config(config_path)
     if config is None:
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='配置文件不可用')
     
     # 获取输出路径
     output_folder = config.get("output_folder", "").strip()
     if not output_folder:
         print("✗ 错误: 配置文件中未设置 output_folder")
         print("  请在配置文件中设置输出路径")
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='未设置 output_folder')
     
     # 获取去年的年份
     current_year = int(time.strftime('%Y'))
@@ -473,8 +395,9 @@ def main():
     print(f"输出路径: {output_folder}")
     print("-" * 60)
     
-    # 查找并下载年报
-    result = find_and_download_report(report_page_url, base_url, output_folder, last_year_str)
+    # 查找并下载年报（查找和下载在同一个浏览器会话中完成）
+    with report.phase('find_and_download'):
+        result = find_and_download_report(report_page_url, base_url, output_folder, last_year_str)
     
     if result:
         print("\n" + "=" * 60)
@@ -485,6 +408,12 @@ def main():
         print("\n" + "=" * 60)
         print("✗ 下载失败")
         print("=" * 60)
+    
+    return report.finish(
+        STATUS_SUCCESS if result else STATUS_FAILED,
+        year=result or last_year_str,
+        url=report_page_url,
+    )
 
 if __name__ == "__main__":
     main()
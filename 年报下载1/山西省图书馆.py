@@ -11,98 +11,18 @@ import re
 import urllib3
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
+from common.result import begin_report, STATUS_SUCCESS, STATUS_FAILED, STATUS_NOT_FOUND, STATUS_CONFIG_ERROR
+from common.html_links import detect_encoding, extract_links
+from common.sessions import get_session
+from common.http_cache import cached_get, open_download, save_response
+from common.async_engine import run_first_match
+from common.url_index import predict_report_url
+from common.library_utils import (get_headers, clean_filename, extract_year_from_text,
+                                  extract_year_from_url_params, load_config, download_pdf)
 
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def get_headers():
-    """获取模拟浏览器的请求头"""
-    return {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/pdf',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
-
-def clean_filename(filename):
-    """清理文件名，移除Windows不允许的字符"""
-    invalid_chars = r'[<>:"/\\|?*]'
-    cleaned = re.sub(invalid_chars, '_', filename)
-    cleaned = cleaned.strip(' .')
-    if not cleaned:
-        cleaned = "unnamed_file"
-    return cleaned
-
-def extract_year_from_text(text):
-    """从文本中提取年份，优先提取完整的年份（如2023、2024）"""
-    if not text:
-        return None
-    # 优先匹配完整的4位年份（2000-2099）
-    year_match = re.search(r'(20[0-3]\d)', text)
-    if year_match:
-        return year_match.group(1)
-    return None
-
-def extract_year_from_url_params(url):
-    """从URL参数中提取年份（特别是从filename参数）"""
-    try:
-        from urllib.parse import urlparse, parse_qs
-        parsed = urlparse(url)
-        params = parse_qs(parsed.query)
-        # 检查filename参数
-        if 'filename' in params:
-            filename = params['filename'][0]
-            year = extract_year_from_text(filename)
-            if year:
-                return year
-    except:
-        pass
-    return None
-
-def load_config(config_path="config.txt"):
-    """读取配置文件"""
-    config = {}
-    try:
-        if not os.path.exists(config_path):
-            # 如果配置文件不存在，创建默认配置
-            default_config = """# 配置文件
-# 格式：key=value
-# 支持使用 # 开头添加注释
-# 支持空行
-
-# 输出文件夹路径（必填）
-# 示例：output_folder=D:\\Desktop\\图书馆年报
-output_folder=D:\\Desktop\\图书馆年报
-"""
-            with open(config_path, 'w', encoding='utf-8') as f:
-                f.write(default_config)
-            print(f"✓ 已创建默认配置文件: {config_path}")
-            print("  请编辑配置文件设置输出路径后重新运行")
-            return None
-        
-        with open(config_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    if value.startswith('"') and value.endswith('"'):
-                        value = value[1:-1]
-                    elif value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    config[key] = value
-    except Exception as e:
-        print(f"✗ 读取配置文件失败: {e}")
-        return None
-    
-    return config
-
 def find_last_year_report(url, base_url):
     """在页面中查找去年的年报链接"""
     # 获取去年的年份
@@ -112,14 +32,13 @@ def find_last_year_report(url, base_url):
     
     # 使用requests方式直接查找
     print("正在访问页面查找年报...")
-    session = requests.Session()
-    session.headers.update(get_headers())
+    session = get_session(get_headers())
     
     try:
         # 尝试访问页面，如果http失败则尝试https
         print(f"正在访问页面: {url}")
         try:
-            response = session.get(url, timeout=30, verify=False)
+            response = cached_get(session, url, timeout=30, verify=False)
             response.raise_for_status()
         except requests.exceptions.RequestException:
             # 如果http失败，尝试https
@@ -127,7 +46,7 @@ def find_last_year_report(url, base_url):
                 https_url = url.replace('http://', 'https://', 1)
                 print(f"HTTP访问失败，尝试HTTPS: {https_url}")
                 try:
-                    response = session.get(https_url, timeout=30, verify=False)
+                    response = cached_get(session, https_url, timeout=30, verify=False)
                     response.raise_for_status()
                     url = https_url  # 更新url为https版本
                 except requests.exceptions.RequestException as e2:
@@ -136,7 +55,7 @@ def find_last_year_report(url, base_url):
             else:
                 raise
         
-        response.encoding = response.apparent_encoding or 'utf-8'
+        response.encoding = detect_encoding(response)
         
         soup = BeautifulSoup(response.text, 'html.parser')
         
@@ -247,14 +166,15 @@ def find_last_year_report(url, base_url):
             juesuan_links = [link for link in last_year_links if link.get('is_juesuan', False)]
             if juesuan_links:
                 print(f"找到 {len(juesuan_links)} 个去年的单位决算链接，正在进入页面查找年报文档...")
-                for link_info in juesuan_links:
+                # 并发访问各候选页面（按原顺序取第一个找到的结果）
+                def check_juesuan_page(link_info):
                     print(f"访问单位决算页面: {link_info['text']}")
                     juesuan_url = link_info['url']
                     print(f"  URL: {juesuan_url}")
                     try:
-                        link_response = session.get(juesuan_url, timeout=30, verify=False)
+                        link_response = cached_get(session, juesuan_url, timeout=30, verify=False)
                         link_response.raise_for_status()
-                        link_response.encoding = link_response.apparent_encoding or 'utf-8'
+                        link_response.encoding = detect_encoding(link_response)
                         link_soup = BeautifulSoup(link_response.text, 'html.parser')
                         
                         # 在这个页面中查找文档链接（PDF/DOCX/DOC）
@@ -351,7 +271,12 @@ def find_last_year_report(url, base_url):
                             print(f"  在单位决算页面未找到文档链接")
                     except Exception as e:
                         print(f"  访问单位决算页面失败: {e}")
-                        continue
+                        return None
+                    return None
+                
+                found = run_first_match(juesuan_links, check_juesuan_page)
+                if found:
+                    return found
             
             # 如果没有找到直接的文档链接，尝试根据年份构建URL
             possible_formats = [
@@ -364,60 +289,72 @@ def find_last_year_report(url, base_url):
             ]
             
             print(f"未找到直接的文档链接，尝试构建可能的URL...")
-            for doc_filename in possible_formats:
+            # 并发探测各候选URL（按原顺序取第一个找到的结果）
+            async def probe_possible_url(engine, doc_filename):
                 possible_doc_url = f"{base_url}/{doc_filename}"
                 print(f"尝试访问可能的文档链接: {possible_doc_url}")
                 try:
-                    test_response = session.head(possible_doc_url, timeout=10, verify=False, allow_redirects=True)
+                    test_response = await engine.head(possible_doc_url, headers=dict(session.headers), timeout=10)
                     if test_response.status_code == 200:
                         content_type = test_response.headers.get('Content-Type', '').lower()
                         if 'pdf' in content_type or 'word' in content_type or 'document' in content_type or possible_doc_url.lower().endswith(('.pdf', '.docx', '.doc')):
                             print(f"✓ 找到去年的年报文档链接 (年份: {last_year_str})")
                             print(f"  URL: {possible_doc_url}")
                             return possible_doc_url, last_year_str
-                except:
+                except Exception:
                     try:
-                        test_response = session.get(possible_doc_url, timeout=10, verify=False, allow_redirects=True, stream=True)
+                        test_response = await engine.get(possible_doc_url, headers=dict(session.headers), timeout=10, read_body=False)
                         if test_response.status_code == 200:
                             content_type = test_response.headers.get('Content-Type', '').lower()
                             if 'pdf' in content_type or 'word' in content_type or 'document' in content_type:
                                 print(f"✓ 找到去年的年报文档链接 (年份: {last_year_str})")
                                 print(f"  URL: {possible_doc_url}")
                                 return possible_doc_url, last_year_str
-                    except:
+                    except Exception:
                         pass
+                return None
+            
+            found = run_first_match(possible_formats, probe_possible_url)
+            if found:
+                return found
             
             # 如果构建URL失败，尝试访问找到的链接，看看是否能找到文档
             # 注意：单位决算链接已经在前面处理过了，这里只处理其他链接
             print(f"构建URL失败，尝试访问找到的其他链接页面查找文档...")
-            for link_info in last_year_links:
+            # 并发访问各候选页面（按原顺序取第一个找到的结果）
+            def check_link_page(link_info):
                 # 跳过已经处理过的单位决算链接
                 if link_info.get('is_juesuan', False):
-                    continue
+                    return None
                     
                 if '年报' in link_info['text'] or '年度报告' in link_info['text']:
                     # 如果链接不是文档格式，访问这个链接看看
                     if not link_info['url'].lower().endswith(('.docx', '.doc', '.pdf')):
                         print(f"访问链接页面: {link_info['url']}")
                         try:
-                            link_response = session.get(link_info['url'], timeout=30, verify=False)
+                            link_response = cached_get(session, link_info['url'], timeout=30, verify=False)
                             link_response.raise_for_status()
-                            link_response.encoding = link_response.apparent_encoding or 'utf-8'
-                            link_soup = BeautifulSoup(link_response.text, 'html.parser')
+                            link_response.encoding = detect_encoding(link_response)
+                            sub_links = extract_links(link_response.text)
                             
                             # 在这个页面中查找文档链接
-                            for doc_link in link_soup.find_all('a', href=True):
-                                doc_href = doc_link.get('href')
+                            for doc_link in sub_links:
+                                doc_href = doc_link.href
                                 if doc_href and (doc_href.lower().endswith(('.pdf', '.docx', '.doc'))):
                                     doc_full_url = urljoin(link_info['url'], doc_href)
                                     # 检查是否包含年份
-                                    if last_year_str in doc_full_url or last_year_str in doc_link.get_text():
-                                        print(f"✓ 在链接页面找到文档: {doc_link.get_text().strip()}")
+                                    if last_year_str in doc_full_url or last_year_str in doc_link.text:
+                                        print(f"✓ 在链接页面找到文档: {doc_link.text}")
                                         print(f"  URL: {doc_full_url}")
                                         return doc_full_url, last_year_str
                         except Exception as e:
                             print(f"  访问链接页面失败: {e}")
-                            continue
+                            return None
+                return None
+            
+            found = run_first_match(last_year_links, check_link_page)
+            if found:
+                return found
             
             # 如果还是没有找到，返回第一个有效的去年的文档链接（必须是文档文件，不能是HTML页面）
             valid_doc_links = [link for link in last_year_links 
@@ -447,97 +384,10 @@ def find_last_year_report(url, base_url):
     finally:
         session.close()
 
-def download_pdf(url, filename, save_dir):
-    """下载文件（支持PDF、DOCX、DOC等格式）"""
-    try:
-        session = requests.Session()
-        session.headers.update(get_headers())
-        
-        print(f"正在下载: {url}")
-        response = session.get(url, stream=True, timeout=60, verify=False)
-        response.raise_for_status()
-        
-        # 检查内容类型和文件扩展名
-        content_type = response.headers.get('Content-Type', '').lower()
-        url_lower = url.lower()
-        
-        # 检查是否是HTML文件，如果是则拒绝下载
-        if 'text/html' in content_type or url_lower.endswith(('.htm', '.html')):
-            print(f"✗ 错误: URL指向的是HTML页面，不是文档文件")
-            print(f"  请检查页面中是否有PDF/DOCX/DOC文档链接")
-            return False
-        
-        # 根据URL确定文件扩展名
-        if url_lower.endswith('.docx'):
-            file_ext = '.docx'
-        elif url_lower.endswith('.doc'):
-            file_ext = '.doc'
-        elif url_lower.endswith('.pdf'):
-            file_ext = '.pdf'
-        else:
-            # 根据Content-Type判断
-            if 'word' in content_type or 'document' in content_type:
-                if 'openxml' in content_type or 'docx' in content_type:
-                    file_ext = '.docx'
-                else:
-                    file_ext = '.doc'
-            elif 'pdf' in content_type:
-                file_ext = '.pdf'
-            else:
-                file_ext = '.pdf'  # 默认使用pdf
-        
-        # 确保文件名有正确的扩展名
-        if not filename.lower().endswith(('.pdf', '.docx', '.doc')):
-            filename = filename + file_ext
-        elif not filename.lower().endswith(file_ext):
-            # 如果扩展名不匹配，替换为正确的扩展名
-            filename = os.path.splitext(filename)[0] + file_ext
-        
-        # 清理文件名
-        filename = clean_filename(filename)
-        
-        # 创建保存目录
-        os.makedirs(save_dir, exist_ok=True)
-        file_path = os.path.join(save_dir, filename)
-        
-        # 如果文件已存在，先删除
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"  已删除已存在的文件: {filename}")
-            except:
-                pass
-        
-        # 保存文件
-        file_size = 0
-        with open(file_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-                    file_size += len(chunk)
-        
-        # 验证文件是否成功保存
-        if not os.path.exists(file_path):
-            print(f"✗ 文件保存失败: {file_path}")
-            return False
-        
-        actual_size = os.path.getsize(file_path)
-        print(f"✓ 下载成功: {filename}")
-        print(f"  文件大小: {actual_size:,} 字节 ({actual_size/1024/1024:.2f} MB)")
-        print(f"  保存路径: {file_path}")
-        
-        session.close()
-        return True
-        
-    except requests.exceptions.RequestException as e:
-        print(f"✗ 下载失败: {e}")
-        return False
-    except Exception as e:
-        print(f"✗ 发生错误: {e}")
-        return False
-
 def main():
     """主函数"""
+    report = begin_report("山西省图书馆")
+    
     print("=" * 60)
     print("山西省图书馆年报下载工具")
     print("=" * 60)
@@ -549,14 +399,14 @@ def main():
     # 读取配置文件
     config = load_config(config_path)
     if config is None:
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='配置文件不可用')
     
     # 获取输出路径
     output_folder = config.get("output_folder", "").strip()
     if not output_folder:
         print("✗ 错误: 配置文件中未设置 output_folder")
         print("  请在配置文件中设置输出路径")
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='未设置 output_folder')
     
     # 获取去年的年份
     current_year = int(time.strftime('%Y'))
@@ -572,11 +422,14 @@ def main():
     print("-" * 60)
     
     # 查找年报链接
-    result = find_last_year_report(report_page_url, base_url)
+    with report.phase('find'):
+        # 先按往年的年报地址规律预测，未命中时再完整查找
+        result = (predict_report_url(report, last_year_str, report_page_url)
+                  or find_last_year_report(report_page_url, base_url))
     
     if not result:
         print("\n✗ 未找到年报链接，下载失败")
-        return
+        return report.finish(STATUS_NOT_FOUND, year=last_year_str)
     
     # 处理返回值：可能是(url, year)元组或只有url
     if isinstance(result, tuple):
@@ -615,7 +468,8 @@ def main():
     print("-" * 60)
     
     # 下载文件
-    success = download_pdf(file_url, filename, output_folder)
+    with report.phase('download'):
+        success = download_pdf(file_url, filename, output_folder)
     
     if success:
         print("\n" + "=" * 60)
@@ -626,6 +480,13 @@ def main():
         print("\n" + "=" * 60)
         print("✗ 下载失败")
         print("=" * 60)
+    
+    return report.finish(
+        STATUS_SUCCESS if success else STATUS_FAILED,
+        year=year_for_filename,
+        url=file_url,
+        path=os.path.join(output_folder, filename),
+    )
 
 if __name__ == "__main__":
     main()
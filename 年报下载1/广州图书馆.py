@@ -9,6 +9,11 @@ import re
 import time
 import requests
 from urllib.parse import urljoin, urlparse
+from common.result import begin_report, STATUS_SUCCESS, STATUS_FAILED, STATUS_NOT_FOUND, STATUS_CONFIG_ERROR
+from common.sessions import get_session
+from common.http_cache import open_download, save_response
+from common.browser_pool import lease_driver
+from common.url_index import predict_report_url
 
 # 尝试导入Selenium相关模块
 SELENIUM_AVAILABLE = False
@@ -90,17 +95,8 @@ def setup_driver():
         return None
     
     try:
-        from selenium.webdriver.chrome.options import Options
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--log-level=3')
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        
-        driver = webdriver.Chrome(options=chrome_options)
+        # 从浏览器池租用预热的无头浏览器（driver.quit() 时归还，供下一个图书馆使用）
+        driver = lease_driver()
         return driver
     except Exception as e:
         print(f"✗ 启动浏览器失败: {e}")
@@ -271,11 +267,10 @@ def find_last_year_report(url, base_url):
 def download_pdf(url, filename, save_dir):
     """下载文件（支持PDF、DOCX、DOC等格式）"""
     try:
-        session = requests.Session()
-        session.headers.update(get_headers())
+        session = get_session(get_headers())
         
         print(f"正在下载: {url}")
-        response = session.get(url, stream=True, timeout=60, verify=False)
+        response = open_download(session, url, timeout=60, verify=False)
         response.raise_for_status()
         
         # 检查内容类型和文件扩展名
@@ -321,21 +316,8 @@ def download_pdf(url, filename, save_dir):
         os.makedirs(save_dir, exist_ok=True)
         file_path = os.path.join(save_dir, filename)
         
-        # 如果文件已存在，先删除
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"  已删除已存在的文件: {filename}")
-            except:
-                pass
-        
-        # 保存文件
-        file_size = 0
-        with open(file_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-                    file_size += len(chunk)
+        # 保存文件（先写入.part，校验后重命名；内容未变化时不重新下载）
+        file_size = save_response(response, file_path)
         
         # 验证文件是否成功保存
         if not os.path.exists(file_path):
@@ -359,6 +341,8 @@ def download_pdf(url, filename, save_dir):
 
 def main():
     """主函数"""
+    report = begin_report("广州图书馆")
+    
     print("=" * 60)
     print("广州图书馆年报下载工具")
     print("=" * 60)
@@ -370,14 +354,14 @@ def main():
     # 读取配置文件
     config = load_config(config_path)
     if config is None:
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='配置文件不可用')
     
     # 获取输出路径
     output_folder = config.get("output_folder", "").strip()
     if not output_folder:
         print("✗ 错误: 配置文件中未设置 output_folder")
         print("  请在配置文件中设置输出路径")
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='未设置 output_folder')
     
     # 获取去年的年份
     current_year = int(time.strftime('%Y'))
@@ -394,11 +378,14 @@ def main():
     print("-" * 60)
     
     # 查找年报下载链接
-    result = find_last_year_report(report_page_url, base_url)
+    with report.phase('find'):
+        # 先按往年的年报地址规律预测，未命中时再完整查找
+        result = (predict_report_url(report, last_year_str, report_page_url)
+                  or find_last_year_report(report_page_url, base_url))
     
     if not result:
         print("\n✗ 未找到年报下载链接，下载失败")
-        return
+        return report.finish(STATUS_NOT_FOUND, year=last_year_str)
     
     # 处理返回值：可能是(url, year)元组或只有url
     if isinstance(result, tuple):
@@ -429,7 +416,8 @@ def main():
     print("-" * 60)
     
     # 下载文件
-    success = download_pdf(file_url, filename, output_folder)
+    with report.phase('download'):
+        success = download_pdf(file_url, filename, output_folder)
     
     if success:
         print("\n" + "=" * 60)
@@ -440,6 +428,13 @@ def main():
         print("\n" + "=" * 60)
         print("✗ 下载失败")
         print("=" * 60)
+    
+    return report.finish(
+        STATUS_SUCCESS if success else STATUS_FAILED,
+        year=year_for_filename,
+        url=file_url,
+        path=os.path.join(output_folder, filename),
+    )
 
 if __name__ == "__main__":
     main()
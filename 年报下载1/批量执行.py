@@ -2,19 +2,43 @@
 """
 批量执行图书馆年报下载脚本
 功能：
-1. 读取Excel文件，检查是否已下载
+1. 从下载台账（下载台账.db）检查是否已下载，Excel中的人工修改会先导入台账
 2. 如果未下载，执行对应的图书馆脚本
-3. 下载成功后，更新Excel中的"是否下载"状态为"是"
+3. 下载成功后，更新台账，并把"是否下载"状态导出到Excel（--export-excel 只导出不执行）
+4. 支持并发调度模式（--parallel），按主机限制并发数并按优先级排序
+5. 支持插件模式（--plugin），在常驻工作进程中导入图书馆脚本运行，避免每次启动新的解释器
+6. 根据脚本返回的结构化结果（common/result.py）判断是否成功，不再解析脚本输出
+7. 支持异步模式（--async），所有图书馆在同一个事件循环中运行，共用连接池并发探测候选链接
+8. 使用浏览器的脚本从浏览器池（common/browser_pool.py）租用预热的Chrome，插件模式和异步模式下多个图书馆共用
+9. 支持多年份补齐（--backfill=2019-2023），每个年报页面只请求一次，按年份分类链接后并发下载缺少的年份
+10. 支持校验已下载的年报（--verify），在进程池中检查输出文件夹中不完整、伪装成年报的网页等文件
 """
 
 import os
 import sys
 import subprocess
-import pandas as pd
+import tempfile
 import time
 from pathlib import Path
 from datetime import datetime
 import logging
+import threading
+import multiprocessing
+
+from common.scheduler import get_script_host, parse_priority_list, get_priority, run_scheduled
+from common.plugin_runner import PluginPool
+from common.result import RESULT_FILE_ENV, read_result_file, is_success
+from common.ledger import open_ledger, LEDGER_PATH_ENV
+from common.url_index import URL_PREDICT_ENV
+from common.http_cache import HTTP_CACHE_ENV
+from common.browser_pool import BROWSER_POOL_ENV, warm_up, shutdown_pool
+from common.print_pdf import PDF_CAPTURE_ENV
+from common.sessions import HOST_INTERVAL_ENV
+from common.metrics import run_record, append_record
+from common.metrics_report import METRICS_FILE, write_reports
+
+# 同目录下不属于图书馆脚本的文件
+NON_LIBRARY_SCRIPTS = ['批量执行.py', '整理.py', 'build_exe.py']
 
 # 全局日志对象
 logger = None
@@ -79,8 +103,35 @@ def log_print(*args, **kwargs):
     else:
         print(*args, **kwargs)
 
+def load_config(config_path):
+    """读取配置文件（key=value格式），文件不存在时返回空字典"""
+    config = {}
+    try:
+        if not os.path.exists(config_path):
+            return config
+        with open(config_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if '=' in line:
+                    key, value = line.split('=', 1)
+                    config[key.strip()] = value.strip()
+    except Exception as e:
+        log_print(f"⚠️  读取配置文件失败: {e}")
+    return config
+
+def get_int_option(config, key, default):
+    """从配置中读取整数选项"""
+    try:
+        return int(config.get(key, '') or default)
+    except ValueError:
+        log_print(f"⚠️  配置项 {key} 不是有效的整数，使用默认值 {default}")
+        return default
+
 def load_excel(excel_path):
     """读取Excel文件"""
+    import pandas as pd  # 只在读写Excel时导入，缩短启动时间（插件工作进程不需要pandas）
     try:
         df = pd.read_excel(excel_path)
         return df
@@ -182,9 +233,41 @@ def update_download_status(df, idx, download_column, status='是'):
         return True
     return False
 
-def execute_script(script_path):
-    """执行Python脚本"""
+def log_script_output(stdout_text, stderr_text):
+    """记录脚本的输出"""
+    if stdout_text:
+        log_print(stdout_text)
+    
+    if stderr_text and stderr_text.strip():  # 只打印非空的错误信息
+        if logger:
+            logger.error(stderr_text)
+        else:
+            print(stderr_text, file=sys.stderr)
+
+def format_result(result):
+    """把脚本返回的结构化结果格式化为一行摘要"""
+    if not result:
+        return "无结果"
+    parts = [f"状态: {result.get('status')}"]
+    if result.get('year'):
+        parts.append(f"年份: {result['year']}")
+    if result.get('bytes') is not None:
+        parts.append(f"大小: {result['bytes'] / 1024 / 1024:.2f} MB")
+    phases = result.get('phases') or {}
+    if phases:
+        parts.append("耗时: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in phases.items()))
+    mb_per_s = (result.get('metrics') or {}).get('mb_per_s')
+    if mb_per_s:
+        parts.append(f"速度: {mb_per_s:.2f} MB/s")
+    if result.get('error'):
+        parts.append(f"错误: {result['error']}")
+    return " | ".join(parts)
+
+def execute_script(script_path, timeout=600):
+    """执行Python脚本（子进程模式），返回脚本的结构化结果，失败时返回None"""
     script_name = os.path.basename(script_path)
+    library_name = get_library_name_from_script(script_name)
+    result_file = None
     try:
         # 获取脚本所在目录
         script_dir = os.path.dirname(script_path)
@@ -200,79 +283,36 @@ def execute_script(script_path):
         if sys.platform == 'win32':
             env['PYTHONUTF8'] = '1'
         
+        # 脚本结束时把结构化结果写入该文件
+        fd, result_file = tempfile.mkstemp(prefix='nianbao_', suffix='.json')
+        os.close(fd)
+        os.remove(result_file)
+        env[RESULT_FILE_ENV] = result_file
+        
         # 切换到脚本所在目录执行
-        # 不使用text=True，而是手动处理编码，避免编码错误
-        result = subprocess.run(
+        completed = subprocess.run(
             [sys.executable, script_path],
             cwd=script_dir,
             capture_output=True,
             env=env,
-            timeout=600  # 10分钟超时
+            timeout=timeout
         )
         
-        # 尝试多种编码方式解码输出
-        stdout_text = ''
-        stderr_text = ''
+        # 子进程已强制使用UTF-8输出
+        stdout_text = completed.stdout.decode('utf-8', errors='replace') if completed.stdout else ''
+        stderr_text = completed.stderr.decode('utf-8', errors='replace') if completed.stderr else ''
+        log_script_output(stdout_text, stderr_text)
         
-        if result.stdout:
-            # 尝试多种编码
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'cp936']:
-                try:
-                    stdout_text = result.stdout.decode(encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            else:
-                # 如果所有编码都失败，使用errors='replace'忽略错误字符
-                stdout_text = result.stdout.decode('utf-8', errors='replace')
-            
-            log_print(stdout_text)
-        
-        if result.stderr:
-            # 尝试多种编码
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'cp936']:
-                try:
-                    stderr_text = result.stderr.decode(encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            else:
-                # 如果所有编码都失败，使用errors='replace'忽略错误字符
-                stderr_text = result.stderr.decode('utf-8', errors='replace')
-            
-            if stderr_text.strip():  # 只打印非空的错误信息
-                if logger:
-                    logger.error(stderr_text)
-                else:
-                    print(stderr_text, file=sys.stderr)
-        
-        # 检查是否成功
-        output_text = stdout_text.lower() if stdout_text else ''
-        error_text = stderr_text.lower() if stderr_text else ''
-        combined_text = output_text + ' ' + error_text
-        
-        # 检查输出中是否包含成功信息
-        success_keywords = ['下载完成', '下载成功', 'success', '完成', '✓ 下载完成']
-        failure_keywords = ['下载失败', '失败', 'error', '✗', '未找到', '找不到']
-        
-        has_success = any(keyword in combined_text for keyword in success_keywords)
-        has_failure = any(keyword in combined_text for keyword in failure_keywords)
-        
-        # 如果明确有成功信息，返回True
-        if has_success and not has_failure:
-            return True
-        # 如果明确有失败信息，返回False
-        elif has_failure:
-            return False
-        # 如果返回码为0且没有明确的失败信息，认为成功
-        elif result.returncode == 0:
-            return True
-        else:
-            return False
+        result = read_result_file(result_file)
+        if result is None:
+            log_print(f"✗ 脚本未返回结构化结果: {script_name} (返回码: {completed.returncode})")
+            return {'library': library_name, 'status': 'error', 'error': f'返回码 {completed.returncode}'}
+        log_print(f"  结果: {format_result(result)}")
+        return result
             
     except subprocess.TimeoutExpired:
         log_print(f"✗ 执行超时: {script_name}")
-        return False
+        return {'library': library_name, 'status': 'timeout'}
     except Exception as e:
         log_print(f"✗ 执行脚本失败: {e}")
         import traceback
@@ -281,17 +321,194 @@ def execute_script(script_path):
             logger.error(error_trace)
         else:
             traceback.print_exc()
+        return {'library': library_name, 'status': 'error', 'error': str(e)}
+    finally:
+        if result_file and os.path.exists(result_file):
+            try:
+                os.remove(result_file)
+            except OSError:
+                pass
+
+def execute_plugin(pool, script_path, timeout=600):
+    """执行Python脚本（插件模式：在常驻工作进程或线程中导入并调用），返回脚本的结构化结果"""
+    script_name = os.path.basename(script_path)
+    library_name = get_library_name_from_script(script_name)
+    log_print(f"\n{'='*60}")
+    log_print(f"正在执行(插件模式): {script_name}")
+    log_print(f"{'='*60}")
+    
+    try:
+        run = pool.run(script_path, timeout=timeout)
+    except Exception as e:
+        log_print(f"✗ 执行脚本失败: {e}")
+        return {'library': library_name, 'status': 'error', 'error': str(e)}
+    
+    return get_plugin_result(script_path, run)
+
+def get_plugin_result(script_path, run):
+    """记录插件模式/异步模式的脚本输出，返回脚本的结构化结果"""
+    script_name = os.path.basename(script_path)
+    library_name = get_library_name_from_script(script_name)
+    if run.get('timeout'):
+        log_print(f"✗ 执行超时: {script_name}")
+        return {'library': library_name, 'status': 'timeout'}
+    
+    log_script_output(run.get('output', ''), (run.get('stderr') or '') + (run.get('error') or ''))
+    
+    # main()/run() 的返回值就是结构化结果
+    result = run.get('returned')
+    if not isinstance(result, dict) or 'status' not in result:
+        log_print(f"✗ 脚本未返回结构化结果: {script_name}")
+        return {'library': library_name, 'status': 'error', 'error': run.get('error')}
+    log_print(f"  结果: {format_result(result)}")
+    return result
+
+def script_uses_browser(script_path):
+    """检查图书馆脚本是否使用浏览器（从浏览器池租用Chrome，或站点配置中设置了 browser=True）"""
+    try:
+        with open(script_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        return 'lease_driver(' in source or 'browser=True' in source
+    except OSError:
         return False
 
 def get_all_library_scripts(script_dir):
     """获取所有图书馆脚本"""
     scripts = []
     for file in os.listdir(script_dir):
-        if file.endswith('.py') and file not in ['批量执行.py', '整理.py']:
+        if file.endswith('.py') and file not in NON_LIBRARY_SCRIPTS:
             scripts.append(file)
     return sorted(scripts)
 
-def main(no_console=False):
+def add_downloaded_record(df, library_name):
+    """Excel中没有对应记录时，添加新记录并标记为已下载，返回(df, 是否添加成功)"""
+    import pandas as pd
+    try:
+        # 获取图书馆列名
+        _, library_column = find_script_name_in_excel(library_name, df)
+        # 获取下载状态列名
+        download_column = None
+        for col in df.columns:
+            if '下载' in str(col) or col in ['是否下载', '下载状态', '状态']:
+                download_column = col
+                break
+        
+        if download_column:
+            # 添加新行
+            new_row = {library_column: library_name}
+            for col in df.columns:
+                if col not in new_row:
+                    new_row[col] = ''
+            new_row[download_column] = '是'
+            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+            log_print(f"  ✓ 已在Excel中添加新记录并标记为已下载")
+            return df, True
+        else:
+            log_print(f"  ⚠️  Excel中未找到对应记录，且无法确定下载状态列，无法更新")
+    except Exception as e:
+        log_print(f"  ⚠️  添加Excel记录失败: {e}")
+    return df, False
+
+def get_target_year():
+    """获取目标年份（去年）"""
+    return str(datetime.now().year - 1)
+
+def sync_ledger_from_excel(ledger, excel_path, library_names, year):
+    """
+    把Excel中的下载状态导入台账（Excel未修改时跳过）
+    
+    工作人员在Excel中手动修改的状态以Excel为准；Excel修改之后台账中新增的下载记录保留
+    """
+    excel_mtime = os.path.getmtime(excel_path)
+    if (ledger.get_meta('excel_mtime') == str(excel_mtime)
+            and ledger.get_meta('excel_year') == year):
+        log_print(f"✓ Excel文件未修改，直接使用台账")
+        return True
+    
+    log_print(f"\n正在从Excel导入下载状态: {excel_path}")
+    df = load_excel(excel_path)
+    if df is None:
+        return False
+    
+    log_print(f"✓ Excel文件读取成功")
+    log_print(f"  总行数: {len(df)}")
+    log_print(f"  列名: {', '.join(df.columns.tolist())}")
+    
+    changed_before = datetime.fromtimestamp(excel_mtime).strftime('%Y-%m-%d %H:%M:%S')
+    for library_name in library_names:
+        idx, library_column = find_script_name_in_excel(library_name, df)
+        excel_name = None if idx is None else str(df.at[idx, library_column]).strip()
+        ledger.set_library(library_name, excel_name)
+        if idx is None:
+            continue
+        is_downloaded, _, _ = check_if_downloaded(library_name, df)
+        if is_downloaded:
+            ledger.set_downloaded(library_name, year)
+        else:
+            ledger.clear_downloaded(library_name, year, updated_before=changed_before)
+    
+    ledger.set_meta('excel_mtime', excel_mtime)
+    ledger.set_meta('excel_year', year)
+    log_print(f"✓ 已导入 {len(library_names)} 个图书馆的下载状态")
+    return True
+
+def export_ledger_to_excel(ledger, excel_path, library_names, year):
+    """把台账中的已下载状态导出到Excel（保持原有表格结构，只把已下载的行标记为"是"）"""
+    import pandas as pd
+    if os.path.exists(excel_path):
+        df = load_excel(excel_path)
+        if df is None:
+            return False
+    else:
+        df = pd.DataFrame(columns=['图书馆', '是否下载'])
+    
+    downloaded = ledger.downloaded_libraries(year)
+    need_save = False
+    for library_name in library_names:
+        if library_name not in downloaded:
+            continue
+        is_downloaded, idx, download_column = check_if_downloaded(library_name, df)
+        if is_downloaded:
+            continue
+        if idx is not None and download_column is not None:
+            if update_download_status(df, idx, download_column, '是'):
+                need_save = True
+        elif idx is None:
+            df, added = add_downloaded_record(df, library_name)
+            need_save = need_save or added
+    
+    if not need_save:
+        log_print(f"✓ Excel已是最新状态，无需导出")
+        return True
+    
+    log_print(f"\n正在保存Excel文件...")
+    if save_excel(df, excel_path):
+        # 记录导出后的修改时间，避免下次把自己导出的内容当作人工修改重新导入
+        ledger.set_meta('excel_mtime', os.path.getmtime(excel_path))
+        ledger.set_meta('excel_year', year)
+        log_print(f"✓ Excel文件已保存")
+        return True
+    log_print(f"✗ Excel文件保存失败")
+    return False
+
+def verify_output_folder(script_dir, config):
+    """校验输出文件夹中的所有年报文件，报告写入 logs/校验报告_<时间>.csv"""
+    output_folder = config.get('output_folder', '').strip()
+    if not output_folder or not os.path.isdir(output_folder):
+        log_print(f"✗ 输出文件夹不存在: {output_folder or '（未设置 output_folder）'}")
+        return
+    log_print(f"\n校验年报文件: {output_folder}")
+    log_print("-" * 60)
+    from common.pdf_verify import verify_folder, write_report, print_problems
+    start = time.time()
+    results = verify_folder(output_folder)
+    print_problems(results, output_folder, log=log_print)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_path = write_report(results, os.path.join(script_dir, 'logs', f'校验报告_{timestamp}.csv'), output_folder)
+    log_print(f"耗时 {time.time() - start:.1f} 秒，校验报告: {report_path}")
+
+def main(no_console=False, parallel=None, max_workers=None, plugin_mode=None, export_only=False, async_mode=None,
+         backfill_years=None, verify_only=False):
     """主函数"""
     # 设置日志
     script_dir = get_script_dir()
@@ -302,27 +519,105 @@ def main(no_console=False):
     log_print("=" * 60)
     
     excel_path = os.path.join(script_dir, '是否下载.xlsx')
+    config = load_config(os.path.join(script_dir, 'config.txt'))
     
-    # 检查Excel文件是否存在
-    if not os.path.exists(excel_path):
-        log_print(f"✗ Excel文件不存在: {excel_path}")
-        log_print("  请确保'是否下载.xlsx'文件存在于脚本目录中")
+    if verify_only:
+        verify_output_folder(script_dir, config)
         return
     
-    # 读取Excel文件
-    log_print(f"\n正在读取Excel文件: {excel_path}")
-    df = load_excel(excel_path)
-    if df is None:
-        return
-    
-    log_print(f"✓ Excel文件读取成功")
-    log_print(f"  总行数: {len(df)}")
-    log_print(f"  列名: {', '.join(df.columns.tolist())}")
-    
     # 获取所有图书馆脚本
     scripts = get_all_library_scripts(script_dir)
+    library_names = [get_library_name_from_script(script_name) for script_name in scripts]
+    
+    # 打开下载台账，并导入Excel中的人工修改
+    target_year = get_target_year()
+    ledger = open_ledger(script_dir, config.get('ledger_path', '').strip() or None)
+    # 图书馆脚本按往年的年报地址预测时读取同一个台账
+    os.environ[LEDGER_PATH_ENV] = os.path.abspath(ledger.db_path)
+    log_print(f"\n下载台账: {ledger.db_path}")
+    log_print(f"目标年份: {target_year}年")
+    if os.path.exists(excel_path):
+        if not sync_ledger_from_excel(ledger, excel_path, library_names, target_year):
+            ledger.close()
+            return
+    else:
+        log_print(f"⚠️  Excel文件不存在: {excel_path}，仅使用台账中的下载状态")
+    
+    if export_only:
+        export_ledger_to_excel(ledger, excel_path, library_names, target_year)
+        ledger.close()
+        return
+    
     log_print(f"\n找到 {len(scripts)} 个图书馆脚本")
     
+    # 运行模式：命令行参数优先，其次是配置文件
+    run_mode = config.get('run_mode', '').strip().lower()
+    if async_mode is None:
+        async_mode = run_mode in ('async', '异步')
+    if parallel is None:
+        parallel = run_mode in ('parallel', '并发')
+    if max_workers is None:
+        max_workers = get_int_option(config, 'max_workers', 4)
+    per_host_limit = get_int_option(config, 'per_host_limit', 1)
+    priority_list = parse_priority_list(config.get('priority_libraries'))
+    script_timeout = get_int_option(config, 'script_timeout', 600)
+    async_per_host_limit = get_int_option(config, 'async_per_host_limit', 4)
+    
+    # 插件模式：off 子进程执行；process 常驻工作进程；thread 当前进程内线程
+    if plugin_mode is None:
+        plugin_mode = config.get('plugin_mode', '').strip().lower() or 'off'
+    if getattr(sys, 'frozen', False) and plugin_mode == 'off':
+        # 打包后的exe无法用sys.executable运行.py脚本，只能使用插件模式
+        plugin_mode = 'process'
+    if plugin_mode not in ('off', 'process', 'thread'):
+        log_print(f"⚠️  未知的插件模式: {plugin_mode}，使用子进程模式")
+        plugin_mode = 'off'
+    
+    # HTTP条件请求缓存：通过环境变量传给图书馆脚本（子进程和工作进程都会继承）
+    http_cache = config.get('http_cache', '').strip()
+    if http_cache:
+        os.environ[HTTP_CACHE_ENV] = http_cache
+    
+    # 浏览器池：每个进程保留的空闲浏览器数，同样通过环境变量传给工作进程
+    browser_pool_size = config.get('browser_pool_size', '').strip()
+    if browser_pool_size:
+        os.environ[BROWSER_POOL_ENV] = browser_pool_size
+    
+    # 按往年的年报地址规律预测今年的地址（默认开启）
+    url_predict = config.get('url_predict', '').strip()
+    if url_predict:
+        os.environ[URL_PREDICT_ENV] = url_predict
+    
+    # 网页保存为PDF的方式：print 由Chrome打印（默认），screenshot 截图拼接
+    pdf_capture = config.get('pdf_capture', '').strip()
+    if pdf_capture:
+        os.environ[PDF_CAPTURE_ENV] = pdf_capture
+    
+    # 同一网站两次请求之间的最小间隔（秒），图书馆脚本共用的连接池按此限速
+    host_interval = config.get('host_interval', '').strip()
+    if host_interval:
+        os.environ[HOST_INTERVAL_ENV] = host_interval
+    
+    # 多年份补齐：不执行图书馆脚本，直接按年份分类年报页面中的链接并下载缺少的年份
+    if backfill_years:
+        output_folder = config.get('output_folder', '').strip()
+        if not output_folder:
+            log_print("✗ 错误: 配置文件中未设置 output_folder")
+            ledger.close()
+            return
+        from common.backfill import run_backfill
+        log_print(f"\n多年份补齐: {', '.join(backfill_years)}")
+        log_print("-" * 60)
+        stats = run_backfill(script_dir, scripts, backfill_years, ledger, output_folder,
+                             max_workers=max_workers, log=log_print)
+        log_print("\n" + "=" * 60)
+        log_print(f"补齐完成: 成功 {stats['success']}，失败 {stats['failed']}，"
+                  f"未找到 {stats['not_found']}，已下载跳过 {stats['skipped']}")
+        if stats['success'] and target_year in backfill_years and os.path.exists(excel_path):
+            export_ledger_to_excel(ledger, excel_path, library_names, target_year)
+        ledger.close()
+        return
+    
     # 统计信息
     total_scripts = len(scripts)
     skipped_count = 0
@@ -330,80 +625,148 @@ def main(no_console=False):
     failed_count = 0
     not_found_count = 0
     
-    # 需要保存Excel的标记
-    need_save = False
+    # 本次运行是否有新的下载记录
+    need_export = False
     
-    # 遍历所有脚本
+    # 按台账状态筛选需要执行的脚本
     log_print(f"\n开始批量执行...")
     log_print("-" * 60)
     
+    tasks = []
     for i, script_name in enumerate(scripts, 1):
         library_name = get_library_name_from_script(script_name)
         script_path = os.path.join(script_dir, script_name)
         
         log_print(f"\n[{i}/{total_scripts}] 处理: {library_name}")
         
-        # 检查是否已下载
-        is_downloaded, idx, download_column = check_if_downloaded(library_name, df)
-        
-        if is_downloaded:
+        # 检查是否已下载（台账按主键索引查询）
+        if ledger.is_downloaded(library_name, target_year):
             log_print(f"  ✓ 已下载，跳过")
             skipped_count += 1
             continue
         
-        if idx is None:
+        if ledger.get_excel_name(library_name) is None:
             log_print(f"  ⚠️  在Excel中未找到对应记录，将执行脚本")
             not_found_count += 1
         
-        # 执行脚本
-        success = execute_script(script_path)
+        tasks.append({
+            'name': library_name,
+            'script_path': script_path,
+            'host': get_script_host(script_path),
+            'priority': get_priority(library_name, priority_list),
+        })
+    
+    # 每个图书馆的耗时追加到 logs/metrics.jsonl，运行结束后生成耗时汇总
+    run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    metrics_path = os.path.join(script_dir, 'logs', METRICS_FILE)
+    if async_mode:
+        metrics_mode = 'async'
+    else:
+        metrics_mode = 'parallel' if parallel and len(tasks) > 1 else 'sequential'
+        if plugin_mode != 'off':
+            metrics_mode += f'-plugin-{plugin_mode}'
+    
+    def handle_result(task, result):
+        """处理单个脚本的结构化执行结果（在主线程中调用）"""
+        nonlocal need_export, success_count, failed_count
+        library_name = task['name']
+        
+        # 每个结果单独提交一个事务
+        try:
+            ledger.record_attempt(library_name, target_year, result)
+        except Exception as e:
+            log_print(f"  ⚠️  写入台账失败: {e}")
         
-        if success:
-            log_print(f"  ✓ 执行成功")
+        try:
+            wall = time.time() - task['started'] if task.get('started') else None
+            record = run_record(run_id, metrics_mode, result, wall)
+            record['library'] = library_name
+            append_record(metrics_path, record)
+        except Exception as e:
+            log_print(f"  ⚠️  写入耗时记录失败: {e}")
+        
+        if is_success(result):
+            log_print(f"  ✓ 执行成功: {library_name}")
             success_count += 1
-            
-            # 更新Excel中的下载状态
-            if idx is not None and download_column is not None:
-                if update_download_status(df, idx, download_column, '是'):
-                    need_save = True
-                    log_print(f"  ✓ 已更新Excel中的下载状态")
-            elif idx is None:
-                # 如果Excel中没有对应记录，尝试添加新记录
-                try:
-                    # 获取图书馆列名
-                    _, library_column = find_script_name_in_excel(library_name, df)
-                    # 获取下载状态列名
-                    download_column = None
-                    for col in df.columns:
-                        if '下载' in str(col) or col in ['是否下载', '下载状态', '状态']:
-                            download_column = col
-                            break
-                    
-                    if download_column:
-                        # 添加新行
-                        new_row = {library_column: library_name}
-                        for col in df.columns:
-                            if col not in new_row:
-                                new_row[col] = ''
-                        new_row[download_column] = '是'
-                        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                        need_save = True
-                        log_print(f"  ✓ 已在Excel中添加新记录并标记为已下载")
-                    else:
-                        log_print(f"  ⚠️  Excel中未找到对应记录，且无法确定下载状态列，无法更新")
-                except Exception as e:
-                    log_print(f"  ⚠️  添加Excel记录失败: {e}")
+            need_export = True
+            log_print(f"  ✓ 已更新台账中的下载状态")
         else:
-            log_print(f"  ✗ 执行失败")
+            log_print(f"  ✗ 执行失败: {library_name}")
             failed_count += 1
     
-    # 保存Excel文件
-    if need_save:
-        log_print(f"\n正在保存Excel文件...")
-        if save_excel(df, excel_path):
-            log_print(f"✓ Excel文件已保存")
+    # 执行脚本
+    use_parallel = parallel and len(tasks) > 1
+    pool = None
+    # 异步模式在当前进程中运行所有脚本，不使用插件池
+    if plugin_mode != 'off' and tasks and not async_mode:
+        pool_size = min(max_workers, len(tasks)) if use_parallel else 1
+        log_print(f"\n插件模式: {plugin_mode}，工作{'进程' if plugin_mode == 'process' else '线程'}数 {pool_size}")
+        pool = PluginPool(script_dir, size=pool_size, mode=plugin_mode)
+    
+    # 线程模式和异步模式下脚本在当前进程运行，提前在后台启动浏览器，与不需要浏览器的脚本同时进行
+    browser_tasks = [task for task in tasks if script_uses_browser(task['script_path'])]
+    if browser_tasks and (async_mode or plugin_mode == 'thread'):
+        warm_count = min(len(browser_tasks), max_workers if (async_mode or use_parallel) else 1)
+        threading.Thread(target=warm_up, args=(warm_count,), daemon=True).start()
+    
+    def run_task(task):
+        task['started'] = time.time()
+        if pool is not None:
+            return execute_plugin(pool, task['script_path'], timeout=script_timeout)
+        return execute_script(task['script_path'], timeout=script_timeout)
+    
+    def handle_async_result(task, run):
+        log_print(f"\n{'='*60}")
+        log_print(f"执行完成(异步模式): {os.path.basename(task['script_path'])}")
+        log_print(f"{'='*60}")
+        handle_result(task, get_plugin_result(task['script_path'], run))
+    
+    try:
+        if async_mode and tasks:
+            import asyncio
+            from common.async_engine import run_libraries_async
+            log_print(f"\n异步模式: 同时运行 {max_workers} 个图书馆，每个主机最多 {async_per_host_limit} 个并发请求")
+            log_print(f"优先执行: {', '.join(priority_list) if priority_list else '无'}")
+            asyncio.run(run_libraries_async(
+                tasks,
+                handle_async_result,
+                max_workers=max_workers,
+                per_host_limit=async_per_host_limit,
+                timeout=script_timeout,
+                log=log_print,
+            ))
+        elif use_parallel:
+            log_print(f"\n并发调度模式: 最大并发 {max_workers}，每个主机最多 {per_host_limit} 个")
+            log_print(f"优先执行: {', '.join(priority_list) if priority_list else '无'}")
+            run_scheduled(
+                tasks,
+                run_task,
+                max_workers=max_workers,
+                per_host_limit=per_host_limit,
+                on_done=handle_result,
+                log=log_print,
+            )
+        else:
+            for task in tasks:
+                handle_result(task, run_task(task))
+    finally:
+        if pool is not None:
+            pool.close()
+        shutdown_pool()
+    
+    # 导出到Excel，方便工作人员查看和修改
+    if need_export:
+        if config.get('excel_auto_export', 'true').strip().lower() in ('true', '1', 'yes', '是'):
+            export_ledger_to_excel(ledger, excel_path, library_names, target_year)
         else:
-            log_print(f"✗ Excel文件保存失败")
+            log_print(f"\n台账已更新，如需同步到Excel请运行: 批量执行.py --export-excel")
+    ledger.close()
+    
+    if tasks:
+        try:
+            write_reports(metrics_path, log=log_print)
+        except Exception as e:
+            log_print(f"⚠️  生成耗时汇总失败: {e}")
     
     # 显示统计结果
     log_print(f"\n" + "=" * 60)
@@ -423,6 +786,9 @@ def main(no_console=False):
         log_file_handler.close()
 
 if __name__ == "__main__":
+    # 打包后的exe使用插件进程模式时需要
+    multiprocessing.freeze_support()
+    
     # 检查是否是无控制台模式
     # 如果是打包后的exe（使用--windowed打包），默认无控制台
     no_console = False
@@ -438,8 +804,46 @@ if __name__ == "__main__":
         elif '--console' in sys.argv:
             no_console = False
     
+    # 并发调度模式：--parallel 启用，--sequential 强制顺序执行，--workers=N 指定并发数
+    parallel = None
+    max_workers = None
+    if '--parallel' in sys.argv:
+        parallel = True
+    elif '--sequential' in sys.argv:
+        parallel = False
+    for arg in sys.argv[1:]:
+        if arg.startswith('--workers='):
+            try:
+                max_workers = int(arg.split('=', 1)[1])
+                parallel = True if parallel is None else parallel
+            except ValueError:
+                pass
+    
+    # 插件模式：--plugin 或 --plugin=process 使用常驻工作进程，--plugin=thread 使用线程
+    plugin_mode = None
+    for arg in sys.argv[1:]:
+        if arg == '--plugin':
+            plugin_mode = 'process'
+        elif arg.startswith('--plugin='):
+            plugin_mode = arg.split('=', 1)[1].strip().lower()
+    
+    # 异步模式：--async 所有图书馆在同一个事件循环中运行，共用连接池
+    async_mode = True if '--async' in sys.argv else None
+    
+    # 多年份补齐：--backfill=2019-2023 或 --backfill=2019,2021
+    backfill_years = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--backfill='):
+            from common.backfill import parse_year_range
+            try:
+                backfill_years = parse_year_range(arg.split('=', 1)[1])
+            except ValueError:
+                print(f"⚠️  无法识别的年份范围: {arg}")
+    
     try:
-        main(no_console=no_console)
+        main(no_console=no_console, parallel=parallel, max_workers=max_workers, plugin_mode=plugin_mode,
+             export_only='--export-excel' in sys.argv, async_mode=async_mode, backfill_years=backfill_years,
+             verify_only='--verify' in sys.argv)
     except KeyboardInterrupt:
         if logger:
             logger.warning("\n\n⚠️  用户中断操作")
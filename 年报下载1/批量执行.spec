@@ -1,15 +1,22 @@
 # -*- mode: python ; coding: utf-8 -*-
+# 单目录打包（与 python build_exe.py 相同）：dist/批量执行/ 中的 批量执行.exe 和 _internal 运行时文件夹
+# 启动时直接从文件夹导入，不需要解压；插件模式的工作进程共用同一个运行时文件夹
+
+import os
+from PyInstaller.utils.hooks import collect_submodules
 
 
 block_cipher = None
 
 
 a = Analysis(
-    ['D:\\Desktop\\demo\\年报下载1\\批量执行.py'],
-    pathex=[],
+    [os.path.join(SPECPATH, '批量执行.py')],
+    pathex=[SPECPATH],
     binaries=[],
     datas=[],
-    hiddenimports=['pandas', 'openpyxl', 'xlrd', 'xlsxwriter'],
+    # pandas、selenium 等在函数中按需导入；图书馆脚本在运行时才导入 common 中的模块
+    hiddenimports=['pandas', 'openpyxl', 'xlrd', 'xlsxwriter', 'requests', 'urllib3', 'bs4', 'lxml.html', 'selenium', 'PIL']
+    + collect_submodules('common'),
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -24,17 +31,13 @@ pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='批量执行',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
     upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -42,3 +45,13 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    name='批量执行',
+)
@@ -3,12 +3,15 @@
 文件夹内容移动脚本
 功能：将一个文件夹的所有内容移动到另一个文件夹
 配置：从config.txt读取源文件夹和目标文件夹路径
+organize_mode=verified 时使用 common/organizer.py：先生成移动计划，跨磁盘并行复制并校验哈希后再删除源文件，
+相同内容的年报用硬链接只保存一份，整理清单让再次运行时跳过已整理的文件
 """
 
 import os
 import shutil
 import time
-from pathlib import Path
+
+from common.organizer import organize, DEFAULT_WORKERS
 
 def load_config(config_path="config.txt"):
     """从配置文件加载设置"""
@@ -223,11 +226,18 @@ def main():
     # 检查是否覆盖模式
     overwrite = config.get('overwrite', 'false').strip().lower() in ('true', '1', 'yes', '是')
     
+    # 整理方式：move 逐项移动（默认）；verified 校验哈希后移动，相同内容使用硬链接
+    organize_mode = config.get('organize_mode', 'move').strip().lower()
+    if organize_mode not in ('move', 'verified'):
+        print(f"⚠️  未知的整理方式: {organize_mode}，使用 move")
+        organize_mode = 'move'
+    
     # 确认操作
     print(f"\n准备移动文件夹内容:")
     print(f"  源文件夹: {source_dir}")
     print(f"  目标文件夹: {target_dir}")
     print(f"  覆盖模式: {'是' if overwrite else '否'}")
+    print(f"  整理方式: {organize_mode}")
     
     # 统计源文件夹中的内容数量
     if os.path.exists(source_dir):
@@ -241,6 +251,27 @@ def main():
     print("\n开始移动...")
     start_time = time.time()
     
+    if organize_mode == 'verified':
+        try:
+            workers = int(config.get('organize_workers', '').strip() or DEFAULT_WORKERS)
+        except ValueError:
+            workers = DEFAULT_WORKERS
+        dedupe = config.get('hardlink_dedupe', 'true').strip().lower() in ('true', '1', 'yes', '是')
+        stats = organize(source_dir, target_dir, overwrite=overwrite, max_workers=workers, dedupe=dedupe)
+        print("\n" + "=" * 60)
+        print("整理完成!")
+        print("=" * 60)
+        print(f"移动: {stats['moved']} 个")
+        print(f"硬链接（内容相同）: {stats['linked']} 个")
+        print(f"已整理过: {stats['organized']} 个")
+        print(f"失败: {stats['failed']} 个")
+        print(f"跳过: {stats['skipped']} 个")
+        seconds = stats['seconds'] or 1e-9
+        print(f"耗时: {seconds:.2f} 秒（{stats['bytes'] / 1024 / 1024 / seconds:.1f} MB/s）")
+        if stats['failed'] > 0:
+            print("\n⚠️  有文件移动失败，源文件已保留，请检查错误信息")
+        return
+    
     if overwrite:
         success, fail, skip = move_folder_contents_with_overwrite(source_dir, target_dir, overwrite=True)
     else:
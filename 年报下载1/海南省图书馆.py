@@ -10,6 +10,8 @@ import time
 import glob
 import requests
 from urllib.parse import urljoin, urlparse
+from common.result import begin_report, STATUS_SUCCESS, STATUS_FAILED, STATUS_CONFIG_ERROR
+from common.browser_pool import lease_driver
 
 # 尝试导入Selenium相关模块
 SELENIUM_AVAILABLE = False
@@ -113,7 +115,8 @@ def setup_driver_with_download(save_dir):
         chrome_options.add_argument('--log-level=3')
         chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
         
-        driver = webdriver.Chrome(options=chrome_options)
+        # 按启动参数从浏览器池租用（driver.quit() 时归还）
+        driver = lease_driver(chrome_options)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         driver.implicitly_wait(10)
         return driver
@@ -455,6 +458,8 @@ def download_report_by_clicking(list_url, save_dir, filename):
 
 def main():
     """主函数"""
+    report = begin_report("海南省图书馆")
+    
     print("=" * 60)
     print("海南省图书馆决算报告下载工具")
     print("=" * 60)
@@ -466,14 +471,14 @@ def main():
     # 读取配置文件
     config = load_config(config_path)
     if config is None:
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='配置文件不可用')
     
     # 获取输出路径
     output_folder = config.get("output_folder", "").strip()
     if not output_folder:
         print("✗ 错误: 配置文件中未设置 output_folder")
         print("  请在配置文件中设置输出路径")
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='未设置 output_folder')
     
     # 获取去年的年份
     current_year = int(time.strftime('%Y'))
@@ -496,7 +501,8 @@ def main():
     print("-" * 60)
     
     # 通过模拟点击下载
-    success = download_report_by_clicking(list_url, output_folder, filename)
+    with report.phase('find_and_download'):
+        success = download_report_by_clicking(list_url, output_folder, filename)
     
     if success:
         print("\n" + "=" * 60)
@@ -507,6 +513,13 @@ def main():
         print("\n" + "=" * 60)
         print("✗ 下载失败")
         print("=" * 60)
+    
+    return report.finish(
+        STATUS_SUCCESS if success else STATUS_FAILED,
+        year=last_year_str,
+        url=list_url,
+        path=os.path.join(output_folder, filename),
+    )
 
 if __name__ == "__main__":
     main()
@@ -12,6 +12,12 @@ import urllib3
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 from io import BytesIO
+from common.result import begin_report, STATUS_SUCCESS, STATUS_FAILED, STATUS_NOT_FOUND, STATUS_CONFIG_ERROR
+from common.browser_pool import lease_driver
+from common.page_ready import PageReadiness
+from common.print_pdf import print_enabled, print_page_to_pdf
+from common.url_index import predict_report_url
+from common.library_utils import get_headers, clean_filename, extract_year_from_text, load_config
 
 # 用于将截图转换为PDF
 try:
@@ -28,7 +34,6 @@ try:
     from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
-    from selenium.webdriver.chrome.options import Options
     from selenium.common.exceptions import TimeoutException, NoSuchElementException
     SELENIUM_AVAILABLE = True
 except ImportError:
@@ -39,96 +44,14 @@ except ImportError:
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def get_headers():
-    """获取模拟浏览器的请求头"""
-    return {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/pdf',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
-
-def clean_filename(filename):
-    """清理文件名，移除Windows不允许的字符"""
-    invalid_chars = r'[<>:"/\\|?*]'
-    cleaned = re.sub(invalid_chars, '_', filename)
-    cleaned = cleaned.strip(' .')
-    if not cleaned:
-        cleaned = "unnamed_file"
-    return cleaned
-
-def extract_year_from_text(text):
-    """从文本中提取年份，优先提取完整的年份（如2023、2024）"""
-    if not text:
-        return None
-    # 优先匹配完整的4位年份（2000-2099）
-    year_match = re.search(r'(20[0-3]\d)', text)
-    if year_match:
-        return year_match.group(1)
-    return None
-
-def load_config(config_path="config.txt"):
-    """读取配置文件"""
-    config = {}
-    try:
-        if not os.path.exists(config_path):
-            # 如果配置文件不存在，创建默认配置
-            default_config = """# 配置文件
-# 格式：key=value
-# 支持使用 # 开头添加注释
-# 支持空行
-
-# 输出文件夹路径（必填）
-# 示例：output_folder=D:\\Desktop\\图书馆年报
-output_folder=D:\\Desktop\\图书馆年报
-"""
-            with open(config_path, 'w', encoding='utf-8') as f:
-                f.write(default_config)
-            print(f"✓ 已创建默认配置文件: {config_path}")
-            print("  请编辑配置文件设置输出路径后重新运行")
-            return None
-        
-        with open(config_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    if value.startswith('"') and value.endswith('"'):
-                        value = value[1:-1]
-                    elif value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    config[key] = value
-    except Exception as e:
-        print(f"✗ 读取配置文件失败: {e}")
-        return None
-    
-    return config
-
 def setup_driver():
     """设置Selenium WebDriver"""
     if not SELENIUM_AVAILABLE:
         return None
     
     try:
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')  # 无头模式
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        # 抑制DNS和其他警告
-        chrome_options.add_argument('--log-level=3')
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        
-        driver = webdriver.Chrome(options=chrome_options)
+        # 从浏览器池租用预热的无头浏览器（driver.quit() 时归还，供下一个图书馆使用）
+        driver = lease_driver()
         return driver
     except Exception as e:
         print(f"✗ 启动浏览器失败: {e}")
@@ -136,7 +59,24 @@ def setup_driver():
         return None
 
 def save_page_as_pdf(driver, save_path):
-    """将页面截图保存为PDF"""
+    """将页面保存为PDF（优先由Chrome直接打印为矢量PDF，失败时改用截图拼接）"""
+    if print_enabled():
+        try:
+            print("  正在打印页面为PDF...")
+            # 逐屏滚动触发懒加载，等待图片加载完成后再打印
+            ready = PageReadiness(driver, '青岛市图书馆')
+            ready.scroll_through()
+            ready.images_loaded(timeout=10)
+            driver.execute_script("window.scrollTo(0, 0);")
+            file_size = print_page_to_pdf(driver, save_path)
+            print(f"✓ 页面已保存为PDF: {save_path}（{file_size:,} 字节）")
+            return True
+        except Exception as e:
+            print(f"  ⚠️  打印为PDF失败: {e}，改用截图拼接")
+    return save_screenshots_as_pdf(driver, save_path)
+
+def save_screenshots_as_pdf(driver, save_path):
+    """将页面逐屏截图拼接后保存为PDF（打印为PDF失败时使用）"""
     try:
         if not PIL_AVAILABLE:
             print("✗ 无法保存为PDF：未安装Pillow库")
@@ -382,6 +322,8 @@ def find_last_year_report(url, base_url):
 
 def main():
     """主函数"""
+    report = begin_report("青岛市图书馆")
+    
     print("=" * 60)
     print("青岛市图书馆年报下载工具")
     print("=" * 60)
@@ -393,14 +335,14 @@ def main():
     # 读取配置文件
     config = load_config(config_path)
     if config is None:
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='配置文件不可用')
     
     # 获取输出路径
     output_folder = config.get("output_folder", "").strip()
     if not output_folder:
         print("✗ 错误: 配置文件中未设置 output_folder")
         print("  请在配置文件中设置输出路径")
-        return
+        return report.finish(STATUS_CONFIG_ERROR, error='未设置 output_folder')
     
     # 获取去年的年份
     current_year = int(time.strftime('%Y'))
@@ -416,11 +358,14 @@ def main():
     print("-" * 60)
     
     # 查找年报链接
-    result = find_last_year_report(report_page_url, base_url)
+    with report.phase('find'):
+        # 先按往年的年报地址规律预测，未命中时再完整查找
+        result = (predict_report_url(report, last_year_str, report_page_url)
+                  or find_last_year_report(report_page_url, base_url))
     
     if not result:
         print("\n✗ 未找到年报链接，下载失败")
-        return
+        return report.finish(STATUS_NOT_FOUND, year=last_year_str)
     
     # 处理返回值：应该是('SCREENSHOT', detail_url, year)元组
     if isinstance(result, tuple) and len(result) == 3 and result[0] == 'SCREENSHOT':
@@ -444,11 +389,12 @@ def main():
         
         # 打开浏览器访问详情页并截图
         driver = None
+        success = False
         try:
             driver = setup_driver()
             if not driver:
                 print("✗ 无法启动浏览器进行截图")
-                return
+                return report.finish(STATUS_FAILED, year=year_for_filename, url=detail_url, error='无法启动浏览器')
             
             print(f"正在访问详情页进行截图: {detail_url}")
             driver.get(detail_url)
@@ -492,7 +438,8 @@ def main():
             time.sleep(1)
             
             # 截图保存为PDF
-            success = save_page_as_pdf(driver, file_path)
+            with report.phase('download'):
+                success = save_page_as_pdf(driver, file_path)
             
             if success:
                 actual_size = os.path.getsize(file_path)
@@ -516,9 +463,17 @@ def main():
                     driver.quit()
                 except:
                     pass
+        
+        return report.finish(
+            STATUS_SUCCESS if success else STATUS_FAILED,
+            year=year_for_filename,
+            url=detail_url,
+            path=file_path,
+        )
     else:
         print("\n✗ 未找到年报详情页链接")
         print("=" * 60)
+        return report.finish(STATUS_NOT_FOUND, year=last_year_str)
 
 if __name__ == "__main__":
     main()
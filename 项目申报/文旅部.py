@@ -18,10 +18,29 @@ except ImportError:
     DOCX_AVAILABLE = False
     print("⚠️ 未安装python-docx库，Word保存功能将不可用。请运行: pip install python-docx")
 
+# 页面就绪检查：安装MutationObserver记录最后一次DOM变化的时间，
+# 返回页面加载完成后DOM已静止的毫秒数（页面未加载完成时返回-1）
+PAGE_QUIET_JS = """
+if (!window.__mctMutation) {
+    window.__mctMutation = {last: performance.now()};
+    new MutationObserver(function() {
+        window.__mctMutation.last = performance.now();
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+if (document.readyState !== 'complete') { return -1; }
+return performance.now() - window.__mctMutation.last;
+"""
+
 class MCTScraper:
     def __init__(self):
         self.driver = None
         self.articles_data = []
+        # 页面等待预算（秒）和实际等待统计
+        self.wait_budget = 180
+        self.wait_spent = 0.0
+        self.wait_count = 0
+        self.wait_timeouts = 0
+        self.last_request_time = 0
     
     def parse_date(self, date_str):
         """解析日期字符串，返回datetime对象"""
@@ -123,7 +142,8 @@ class MCTScraper:
             'days': 7,  # 默认7天
             'start_date': None,
             'end_date': None,
-            'output_dir': '项目申报文章'  # 默认输出目录
+            'output_dir': '项目申报文章',  # 默认输出目录
+            'wait_budget': 180  # 页面等待总预算（秒）
         }
         
         try:
@@ -153,6 +173,11 @@ class MCTScraper:
                                 config['end_date'] = value
                             elif key == 'output_dir':
                                 config['output_dir'] = value
+                            elif key == 'wait_budget':
+                                try:
+                                    config['wait_budget'] = int(value)
+                                except:
+                                    pass
         except Exception as e:
             print(f"⚠️ 读取配置文件失败: {e}，使用默认设置（最近7天）")
         
@@ -176,13 +201,44 @@ class MCTScraper:
             print(f"浏览器启动失败: {e}")
             return False
 
+    def wait_page_ready(self, timeout=15, quiet=0.5):
+        """等待页面加载完成且DOM在quiet秒内没有变化（代替固定时间等待），超出等待预算后不再等待"""
+        limit = min(timeout, max(0, self.wait_budget - self.wait_spent))
+        start = time.time()
+        ready = False
+        while True:
+            try:
+                ready = self.driver.execute_script(PAGE_QUIET_JS) >= quiet * 1000
+            except Exception:
+                ready = False
+            if ready or time.time() - start >= limit:
+                break
+            time.sleep(0.1)
+        self.wait_spent += time.time() - start
+        self.wait_count += 1
+        if not ready:
+            self.wait_timeouts += 1
+        return ready
+
+    def throttle(self, min_interval=2):
+        """两次访问文章之间至少间隔min_interval秒（只等待不足的部分），避免请求过快"""
+        remaining = self.last_request_time + min_interval - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+        self.last_request_time = time.time()
+
+    def print_wait_report(self):
+        """输出页面等待统计（实际等待时间与预算）"""
+        print(f"⏱️ 页面等待: {self.wait_count} 次，共 {self.wait_spent:.1f} 秒 / 预算 {self.wait_budget} 秒"
+              + (f"，超时 {self.wait_timeouts} 次" if self.wait_timeouts else ""))
+
     def search_articles_by_keyword(self, keyword="项目申报"):
         """搜索包含关键词的文章"""
         articles = []
         
         try:
             # 等待页面加载
-            time.sleep(3)
+            self.wait_page_ready()
             
             # 方法1: 查找所有链接，筛选包含关键词的标题
             all_links = self.driver.find_elements(By.TAG_NAME, "a")
@@ -339,9 +395,10 @@ class MCTScraper:
         """访问文章链接并提取文章内容和发布日期"""
         try:
             print(f"  📄 正在访问文章: {article_url}")
+            self.throttle()
             self.driver.get(article_url)
-            # 增加等待时间，确保页面完全加载
-            time.sleep(5)
+            # 等待页面完全加载（DOM不再变化）
+            self.wait_page_ready()
             
             content = ""
             publish_date = ""
@@ -437,7 +494,6 @@ class MCTScraper:
                         headers[i].style.display = 'none';
                     }
                 """)
-                time.sleep(1)
             except:
                 pass
             
@@ -529,7 +585,7 @@ class MCTScraper:
         try:
             print(f"🌐 正在访问: {url}")
             self.driver.get(url)
-            time.sleep(5)  # 等待页面加载
+            self.wait_page_ready(timeout=20)  # 等待页面加载
             
             print(f"🔍 正在搜索包含'{keyword}'的文章...")
             articles = self.search_articles_by_keyword(keyword)
@@ -559,7 +615,6 @@ class MCTScraper:
                             print(f"  ✅ 成功提取内容（{len(content)} 字符）")
                         else:
                             print(f"  ⚠️ 未能提取到内容")
-                        time.sleep(2)  # 避免请求过快
             
             self.articles_data = articles
             return articles
@@ -684,6 +739,7 @@ def main():
         # 读取配置文件
         scraper = MCTScraper()
         config = scraper.load_config("config.txt")
+        scraper.wait_budget = config['wait_budget']
         
         print("📋 配置信息:")
         if config.get('start_date') and config.get('end_date'):
@@ -747,7 +803,6 @@ def main():
                             print(f"  ✅ 成功提取内容（{len(content)} 字符）")
                         else:
                             print(f"  ⚠️ 未能提取到内容")
-                        time.sleep(2)  # 避免请求过快
 
         if articles:
             print(f"\n✅ 成功抓取到 {len(articles)} 篇包含'{keyword}'的文章")
@@ -772,6 +827,8 @@ def main():
         else:
             print(f"❌ 没有找到包含'{keyword}'的文章")
         
+        scraper.print_wait_report()
+        
         # 所有操作完成后，关闭浏览器
         if scraper.driver:
             print("\n⏳ 浏览器将保持打开5秒，您可以查看结果...")